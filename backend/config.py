@@ -9,6 +9,7 @@ import logging
 import os
 import logging
 import ujson
+import logging.config
 import logging.handlers
 from collections import OrderedDict
 
@@ -90,8 +91,33 @@ class SettingsApp(SettingsBase):
     demo: int = 0
     internal: Dict = {}
     delete_record_after_days = 2
+    clean_concurrency = 4
+    clean_batch_size = 1000
     refresh_setting_hours = 24
     session_expire_hours = 12
+    session_flush_seconds = 5
+    session_flush_batch = 500
+    bulk_chunk_size = 1000
+    index_reconcile_lock_seconds = 3600
+    # list_order values reserved by worker for single inserts, above 1 the
+    # inserts of different workers interleave in list_order
+    sequence_block_size = 1
+    count_cache_seconds = 60
+    menu_cache_seconds = 3600
+    cache_coder = "pickle"
+    cache_l1_size = 2048
+    cache_l1_ttl = 5
+    remote_data_stale_seconds = 600
+    remote_max_connections = 20
+    remote_max_keepalive_connections = 10
+    remote_connect_timeout = 5.0
+    remote_read_timeout = 15.0
+    remote_total_timeout = 30.0
+    remote_retries = 2
+    remote_backoff = 0.2
+    remote_max_bytes = 10485760
+    remote_breaker_failures = 5
+    remote_breaker_reset_seconds = 30.0
     upload_folder = ""
     admin_username = "admin"
     api_user_key = ""
@@ -211,6 +211,22 @@ async def default_layout(
     return await service.service_get_layout(name)
 
 
+@app.get("/page_bundle", tags=["Structural Data"])
+async def page_bundle(
+        request: Request,
+        page_path: str,
+        apitoken: str = Header(None)
+):
+    """
+    session, content, layout and embedded tables of the page in page_path,
+    other query params are the params of the page
+    """
+    params = dict(request.query_params)
+    params.pop("page_path")
+    service = ServiceMain.new(request=request)
+    return await service.service_get_page_bundle(page_path, params)
+
+
 @app.get("/dashboard", tags=["Structural Data"])
 async def dashboard(
         request: Request,
@@ -374,7 +390,8 @@ async def clean_records(
         apitoken: str = Header(None)
 ):
     """
-    Remove all recerds in all collections with 'deleted' timestam grater than now.
+    Remove all recerds in all collections with 'deleted' timestam grater than now,
+    the records with a TTL date are already removed by Mongo.
     """
     session = request.scope['ozon'].session
     # session.app['save_session'] = False
@@ -386,6 +403,75 @@ async def clean_records(
     return res
 
 
+@app.get("/clean/report", tags=["Core"])
+async def clean_report(
+        request: Request,
+        apitoken: str = Header(None)
+):
+    """
+    Return by collection the records to delete, the TTL indexes and the result of the last clean.
+    """
+    session = request.scope['ozon'].session
+    service = ServiceMain.new(request=request)
+    if session.is_admin:
+        res = await service.clean_report()
+    else:
+        res = {"status": "err"}
+    return res
+
+
+@app.get("/indexes/ledger", tags=["Core"])
+async def indexes_ledger(
+        request: Request,
+        reconcile: Optional[bool] = False,
+        apitoken: str = Header(None)
+):
+    """
+    Return the indexes ensured for each collection, with reconcile reload them from db and create the missing ones.
+    """
+    session = request.scope['ozon'].session
+    service = ServiceMain.new(request=request)
+    if session.is_admin:
+        res = await service.index_ledger(reconcile=reconcile)
+    else:
+        res = {"status": "err"}
+    return res
+
+
+@app.get("/cache/stats", tags=["Core"])
+async def cache_stats(
+        request: Request,
+        apitoken: str = Header(None)
+):
+    """
+    Return the hits and misses of the cache by namespace.
+    """
+    session = request.scope['ozon'].session
+    service = ServiceMain.new(request=request)
+    if session.is_admin:
+        res = await service.cache_stats()
+    else:
+        res = {"status": "err"}
+    return res
+
+
+@app.get("/remote/stats", tags=["Core"])
+async def remote_stats(
+        request: Request,
+        apitoken: str = Header(None)
+):
+    """
+    Return requests, errors, retries and circuit state of the outbound requests by upstream host.
+    """
+    session = request.scope['ozon'].session
+    service = ServiceMain.new(request=request)
+    if session.is_admin:
+        res = await service.remote_stats()
+    else:
+        res = {"status": "err"}
+    return res
+
+
 @app.post("/data/table/{action_name}", tags=["Table Data"])
 async def post_table_data(
         request: Request,
@@ -460,6 +546,24 @@ async def get_export_data(
     return res
 
 
+@app.post("/export_data/stream/{model}", tags=["Component Remote Data and Model for export file"])
+async def get_export_data_stream(
+        request: Request,
+        model: str,
+        parent: Optional[str] = "",
+        apitoken: str = Header(None)
+):
+    session = request.scope['ozon'].session
+    service = ServiceMain.new(request=request)
+    dataj = await request.json()
+    if isinstance(dataj, dict):
+        data = dataj.copy()
+    elif isinstance(dataj, str):
+        data = ujson.loads(dataj)
+    return StreamingResponse(
+        service.export_data_stream(model, data, parent_name=parent), media_type="application/x-ndjson")
+
+
 @app.post("/attachment/trash/{model}/{rec_name}", tags=["Attachments"])
 async def attachment_to_trash(
         request: Request,
@@ -538,6 +642,8 @@ async def get_mail_server(
         data = dataj.copy()
     elif isinstance(dataj, str):
         data = ujson.loads(dataj)
+    elif isinstance(dataj, list):
+        return await service.import_raw_data_list(model, dataj)
     res = await service.import_raw_data(model, data)
     return res
 
@@ -20,6 +20,9 @@ from starlette.middleware import Middleware
 
 from .core.database.mongodb.mongodb_utils import close_mongo_connection, connect_to_mongo
 from .core.database.cache.cache_utils import init_cache, stop_cache
+from .core.database.model_registry import init_model_registry, stop_model_registry
+from .core.database.cache.session_store import init_session_store, stop_session_store
+from .core.remote_client import init_remote_client, stop_remote_client
 from .core.Ozon import Ozon
 from .core.OzonRawMiddleware import OzonRawMiddleware
 from .core.ServiceMain import ServiceMain
@@ -61,7 +64,13 @@ app = FastAPI(
 
 app.add_event_handler("startup", connect_to_mongo)
 app.add_event_handler("startup", init_cache)
+app.add_event_handler("startup", init_model_registry)
+app.add_event_handler("startup", init_session_store)
+app.add_event_handler("startup", init_remote_client)
 
+app.add_event_handler("shutdown", stop_session_store)
+app.add_event_handler("shutdown", stop_remote_client)
+app.add_event_handler("shutdown", stop_model_registry)
 app.add_event_handler("shutdown", close_mongo_connection)
 app.add_event_handler("shutdown", stop_cache)
 
@@ -191,3 +200,4 @@ async def startup_event():
     ozon = Ozon.new(pwd_context=pwd_context)
     if get_settings().init_db:
         await ozon.init_apps(get_settings().dict())
+    await ozon.mdata.reconcile_indexes_once()
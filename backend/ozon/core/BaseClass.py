@@ -2,8 +2,8 @@
 # See LICENSE file for full licensing details.
 
 import ujson
-import httpx
 import logging
+from .remote_client import remote_client, UpstreamError
 
 logger = logging.getLogger(__name__)
 
@@ -71,15 +71,16 @@ class BaseClass(dict):
         return ujson.dumps(self, escape_forward_slashes=False, ensure_ascii=False)
 
     async def get_remote_object_json(self, url, key, headers={}, params={}, cookies={}):
-        async with httpx.AsyncClient(timeout=None) as client:
-            headers.update({"authtoken": key})
-            req = await client.get(
-                url=url, params=params, headers=headers, cookies=cookies
-            )
-            if req.status_code == 200:
-                return proxy.json()
-            else:
-                err_msg = f"response {proxy.statuscode} for url {url}"
-                logger.error(f"{err_msg} params {params} headers {headers} cookies {headers}")
-                return ujson.dumps(
-                    {"error": err_msg, "cose": req.status_code}, escape_forward_slashes=False, ensure_ascii=False)
+        headers = {**headers, "authtoken": key}
+        try:
+            req = await remote_client.get(url, params=params, headers=headers, cookies=cookies)
+        except UpstreamError as e:
+            logger.error(f"remote error {e} for url {url}")
+            return ujson.dumps({"error": str(e), "cose": 503}, escape_forward_slashes=False, ensure_ascii=False)
+        if req.status_code == 200:
+            return req.json()
+        else:
+            err_msg = f"response {req.status_code} for url {url}"
+            logger.error(f"{err_msg} params {params} headers {headers} cookies {cookies}")
+            return ujson.dumps(
+                {"error": err_msg, "cose": req.status_code}, escape_forward_slashes=False, ensure_ascii=False)
@@ -2,6 +2,9 @@
 # See LICENSE file for full licensing details.
 import sys
 import os
+import time
+import uuid
+import asyncio
 import logging
 import pymongo
 import ujson
@@ -9,6 +12,12 @@ import pydantic
 from .database.mongo_core import *
 from .BaseClass import PluginBase
 from .QueryEngine import QueryEngine
+from ozon.settings import get_settings
+from .database.cache.menu_cache import menu_cache
+from .database.cache.count_cache import count_cache
+from .database.cache.cache_tags import cache_tags
+from .database.cache.session_store import session_store
+from .database.cache.cache import get_cache, get_redis, TieredCache
 from fastapi.exceptions import HTTPException
 
 logger = logging.getLogger(__name__)
@@ -69,18 +78,68 @@ class ModelDataBase(ModelData):
         if model_name in self.system_model:
             model = self.system_model.get(model_name)
         else:
-            component = await search_by_name(Component, model_name)
-            if component:
-                mm = ModelMaker(
-                    model_name, component.components)
-                for field in mm.unique_fields:
-                    await set_unique(mm.model, field)
-                self.no_clone_field_keys = mm.no_clone_field_keys
-                self.computed_fields = mm.computed_fields
-                self.create_task_action = mm.create_task_action
-                model = mm.model
+            compiled = model_registry.get(model_name)
+            if not compiled:
+                component = await search_by_name(Component, model_name)
+                if component:
+                    mm = ModelMaker(
+                        model_name, component.components)
+                    await ensure_model_indexes(mm.model.str_name(), mm.unique_fields)
+                    compiled = model_registry.add(model_name, component, mm)
+            if compiled:
+                self.no_clone_field_keys = compiled.no_clone_field_keys.copy()
+                self.computed_fields = compiled.computed_fields.copy()
+                self.create_task_action = compiled.create_task_action.copy()
+                model = compiled.model
         return model
 
+    async def invalidate_model(self, model_name, version=""):
+        await model_registry.publish_invalidate(model_name, version)
+
+    async def reconcile_indexes(self):
+        logger.info("reconcile collections indexes")
+        c_names = await self.get_collections_names(
+            query={"name": {"$regex": r"^(?!system\.)"}, "type": "collection"})
+        for name in c_names:
+            if name in self.system_model:
+                await ensure_model_indexes(name)
+            else:
+                # on registry miss gen_model ensure the model indexes
+                await self.gen_model(name)
+        return index_ledger.get_ledger()
+
+    async def reconcile_indexes_once(self):
+        """
+        Reconcile at startup in one worker at a time, the lock is released when done
+        and expires after index_reconcile_lock_seconds if the worker dies.
+        """
+        # Redis is shared by the services, one lock by database
+        lock_key = f"index_reconcile:{get_settings().mongo_db}"
+        token = uuid.uuid4().hex
+        try:
+            redis = await get_redis()
+            locked = await redis.set(lock_key, token, nx=True, ex=get_settings().index_reconcile_lock_seconds)
+        except Exception as e:
+            logger.error(f"index reconcile lock error: {e}")
+            return {}
+        if not locked:
+            logger.info("indexes reconciled by an other worker")
+            return {}
+        try:
+            return await self.reconcile_indexes()
+        finally:
+            try:
+                await redis.eval(TieredCache.release_lua, 1, lock_key, token)
+            except Exception as e:
+                logger.error(f"index reconcile unlock error: {e}")
+
+    async def get_index_ledger(self, reconcile=False):
+        if reconcile:
+            index_ledger.clear()
+            model_registry.clear()
+            return await self.reconcile_indexes()
+        return index_ledger.get_ledger()
+
     def clean_data_to_clone(self, data: dict):
         for k, v in self.no_clone_field_keys.items():
             if k in data and not k == "rec_name":
@@ -154,7 +213,7 @@ class ModelDataBase(ModelData):
 
     async def search_base(
             self, data_model: Type[ModelType], query={}, parent="", sort=[],
-            limit=0, skip=0, use_aggregate=False):
+            limit=0, skip=0, use_aggregate=False, projection=None, json_ready=False):
         """
             
         """
@@ -173,7 +232,8 @@ class ModelDataBase(ModelData):
             )
         else:
             list_data = await search_by_filter(
-                data_model, query, sort=sort, limit=limit, skip=skip
+                data_model, query, sort=sort, limit=limit, skip=skip, projection=projection,
+                json_ready=json_ready
             )
 
         return list_data
@@ -181,7 +241,7 @@ class ModelDataBase(ModelData):
     async def get_list_base(
             self, data_model: Type[ModelType], fields=[], query={}, sort=[], limit=0, skip=0, model_type="",
             parent="", merge_field="", row_action="", additional_key=[],
-            use_aggregate=False
+            use_aggregate=False, projection=None
     ):
         """
         additional_key handle formio id name (workaroud):
@@ -203,7 +263,7 @@ class ModelDataBase(ModelData):
         return await self.search(
             data_model, fields=fields, query=query, sort=sort, limit=limit, skip=skip,
             merge_field=merge_field, row_action=row_action, parent=parent, additional_key=additional_key,
-            use_aggregate=use_aggregate
+            use_aggregate=use_aggregate, projection=projection
         )
 
     async def count_by_filter(self, data_model, query: Optional[Dict] = {}) -> int:
@@ -212,16 +272,84 @@ class ModelDataBase(ModelData):
             model = data_model.str_name()
         return await count_by_filter(model, domain=query)
 
+    async def count_cached(self, data_model, query: Optional[Dict] = {}) -> dict:
+        """
+        count and datetime it was computed at
+        """
+        model = data_model
+        if not isinstance(data_model, str):
+            model = data_model.str_name()
+        return await count_cache.get_count(model, query, lambda: count_by_filter(model, domain=query))
+
+    async def count_list(self, data_model, query: Optional[Dict] = {}, count_mode="exact") -> int:
+        """
+        count_mode:
+          - exact: count_documents on query
+          - estimated: count from the collection metadata, the query is ignored
+          - cached: exact count kept in cache until the model changes or count_cache_seconds
+        """
+        model = data_model
+        if not isinstance(data_model, str):
+            model = data_model.str_name()
+        if count_mode == "estimated":
+            return await estimated_count(model)
+        if not count_mode == "cached":
+            return await count_by_filter(model, domain=query)
+        res = await self.count_cached(model, query)
+        return res['count']
+
+    async def get_list_page(
+            self, data_model: Type[ModelType], fields=[], query={}, sort=[], limit=0, cursor="",
+            merge_field="", row_action="", additional_key=[], projection=None):
+        """
+        Keyset pagination, the page starts after the record encoded in cursor.
+        Return the rows and the cursor of the next page, empty on the last page.
+        """
+        if fields:
+            fields = fields + default_list_metadata
+        sort = keyset_sort(sort or [("list_order", 1), ("rec_name", -1)])
+        values = decode_cursor(sort, cursor) if cursor else []
+        if values:
+            query = {"$and": [query, make_keyset_query(sort, values)]}
+        if projection is None:
+            projection = make_projection(
+                fields=fields, merge_field=merge_field, row_action=row_action, additional_key=additional_key)
+        sort_keys = [key for key, direction in sort]
+        # the next cursor is read from the sort keys of the last record
+        if projection and 1 in projection.values():
+            projection = path_projection(list(projection.keys()) + sort_keys)
+        elif projection:
+            projection = {k: v for k, v in projection.items() if k not in sort_keys} or None
+        list_data = await search_by_filter(
+            data_model, query, sort=sort, limit=limit, projection=projection, json_ready=True)
+        next_cursor = ""
+        if limit and len(list_data) == limit:
+            next_cursor = encode_cursor(sort, list_data[-1])
+        return get_data_list(
+            list_data, fields=fields, merge_field=merge_field,
+            row_action=row_action, additional_key=additional_key), next_cursor
+
+    async def aggregate_raw(self, data_model, pipeline: list) -> list:
+        model = data_model
+        if not isinstance(data_model, str):
+            model = data_model.str_name()
+        return data_helper(await raw_aggregate(model, pipeline, json_ready=True))
+
     async def search(
             self, data_model: Type[ModelType], fields=[], query={}, sort=[], limit=0, skip=0,
-            merge_field="", row_action="", parent="", additional_key=[], remove_keys=[], use_aggregate=False):
+            merge_field="", row_action="", parent="", additional_key=[], remove_keys=[], use_aggregate=False,
+            projection=None):
 
         if fields:
             fields = fields + default_list_metadata
+        if projection is None:
+            projection = make_projection(
+                fields=fields, merge_field=merge_field, row_action=row_action,
+                additional_key=additional_key, remove_keys=remove_keys)
 
         list_data = await self.search_base(
             data_model, query=query, parent=parent, sort=sort, limit=limit, skip=skip,
-            use_aggregate=use_aggregate
+            use_aggregate=use_aggregate, projection=projection, json_ready=True
         )
         return get_data_list(
             list_data, fields=fields, merge_field=merge_field,
@@ -237,13 +365,40 @@ class ModelDataBase(ModelData):
 
         list_data = await self.search_base(
             data_model, query=query, parent=parent, sort=sort, limit=limit, skip=skip,
-            use_aggregate=use_aggregate
+            use_aggregate=use_aggregate, projection=make_projection(
+                fields=fields, merge_field=merge_field, additional_key=additional_key, remove_keys=remove_keys),
+            json_ready=True
         )
 
         return get_data_list(
             list_data, fields=fields, merge_field=merge_field,
             remove_keys=remove_keys, additional_key=additional_key)
 
+    async def iter_export(
+            self, data_model: Type[ModelType], fields=[], query={}, sort=[],
+            merge_field="", additional_key=[], remove_keys=[], chunk_size=500):
+        """
+        search_export reading the cursor, yields lists of at most chunk_size rows
+        """
+        if fields:
+            fields = fields + export_list_metadata
+        projection = make_projection(
+            fields=fields, merge_field=merge_field, additional_key=additional_key, remove_keys=remove_keys)
+        chunk = []
+        async for document in iter_by_filter(
+                data_model.str_name(), query, sort=sort, projection=projection, batch_size=chunk_size,
+                json_ready=True):
+            chunk.append(document)
+            if len(chunk) >= chunk_size:
+                yield get_data_list(
+                    chunk, fields=fields, merge_field=merge_field,
+                    remove_keys=remove_keys, additional_key=additional_key)
+                chunk = []
+        if chunk:
+            yield get_data_list(
+                chunk, fields=fields, merge_field=merge_field,
+                remove_keys=remove_keys, additional_key=additional_key)
+
     async def make_action_task_for_model(
             self, session, model_name, component_schema, act_config={}):
         logger.info(f" make_default_action_model {model_name}")
@@ -259,7 +414,6 @@ class ModelDataBase(ModelData):
             {"list_query": "{}"}]}
 
         action_model = await self.gen_model("action")
-        model = await self.gen_model(model_name)
         list_data = await search_by_filter(
             action_model, q, sort=sort, limit=0, skip=0
         )
@@ -269,8 +423,7 @@ class ModelDataBase(ModelData):
             action = action_model(**src)
             action.sys = component_schema.sys
             action.model = model_name
-            action.list_order = await self.count_by_filter(
-                model, query={"deleted": 0})
+            action.list_order = await next_sequence(action_model.str_name())
             action.data_value['model'] = component_schema.title
             action.admin = act_config.get("admin", False)
             if not action.admin:
@@ -310,7 +463,6 @@ class ModelDataBase(ModelData):
 
         action_model = await self.gen_model("action")
         menu_group_model = await self.gen_model("menu_group")
-        model = await self.gen_model(model_name)
         list_data = await search_by_filter(
             action_model, q, sort=sort, limit=0, skip=0
         )
@@ -353,7 +505,7 @@ class ModelDataBase(ModelData):
             action = action_model(**data)
             action.sys = component_schema.sys
             action.model = model_name
-            action.list_order = await self.count_by_filter(model, query={"deleted": 0})
+            action.list_order = await next_sequence(action_model.str_name())
             action.data_value['model'] = component_schema.title
             action.admin = component_schema.sys
             if not action.admin:
@@ -380,11 +532,23 @@ class ModelDataBase(ModelData):
             action.next_action_name = action.next_action_name.replace("_action", f"_{model_name}")
             await self.save_object(session, action, model_name="action", model=action_model)
 
+    async def model_changed(self, data_model):
+        model_name = data_model
+        if not isinstance(data_model, str):
+            model_name = data_model.str_name()
+        await menu_cache.model_changed(model_name)
+        await count_cache.model_changed(model_name)
+        await cache_tags.model_changed(model_name)
+
     async def save_record(self, schema, remove_meta=True):
         await save_record(schema, remove_meta=remove_meta)
+        await self.model_changed(type(schema))
 
     async def save_all(self, schema, remove_meta=True):
-        return await save_all(schema, remove_meta=remove_meta)
+        res = await save_all(schema, remove_meta=remove_meta)
+        if schema:
+            await self.model_changed(type(schema[0]))
+        return res
 
     async def set_user_data(self, record):
         record.owner_uid = self.session.user.get('uid')
@@ -440,41 +604,17 @@ class ModelDataBase(ModelData):
         source = await self.by_name(model, object_o.rec_name)
         if source:
             rec_name = object_o.rec_name
-        if rec_name:
-            if not source:
-                source = await self.by_name(model, rec_name)
-            if not copy:
-                to_pop = default_fields[:]
-                object_o = update_model(source, object_o, pop_form_newobject=to_pop)
-            if session.user:
-                object_o.update_uid = session.user.get('uid')
-
-        object_o.update_datetime = datetime.now()
-
+        if rec_name and not source:
+            source = await self.by_name(model, rec_name)
+        list_order = None
         if not rec_name or copy:
-            object_o.list_order = await self.count_by_filter(model, query={"deleted": 0})
-            object_o.data_value['list_order'] = object_o.list_order
-            object_o.create_datetime = datetime.now()
-            if create_add_user:
-                object_o = await self.set_user_data(object_o)
-            if model_name == "user":
-                pw_hash = self.get_password_hash(object_o.password)
-                object_o.password = pw_hash
-
-        if copy:
-            if hasattr(object_o, "title"):
-                object_o.title = f"{object_o.title} Copy()"
-            if (
-                    hasattr(object_o, "rec_name") and
-                    object_o.rec_name and model_name not in object_o.rec_name
-            ):
-                object_o.rec_name = f"{object_o.rec_name}_copy"
-                if hasattr(object_o, "data_value"):
-                    object_o.data_value['rec_name'] = object_o.rec_name
-            else:
-                object_o.rec_name = f"{model_name}.{object_o.id}"
+            list_order = await next_sequence(model.str_name())
+        object_o = await self.prepare_object(
+            session, object_o, source, model_name=model_name, copy=copy,
+            list_order=list_order, create_add_user=create_add_user)
         try:
             rec = await save_record(object_o)
+            await self.model_changed(model)
         except pymongo.errors.DuplicateKeyError as e:
             logger.error(f" Duplicate {e.details['errmsg']}")
             field = e.details['keyValue']
@@ -494,13 +634,156 @@ class ModelDataBase(ModelData):
             }
         return rec
 
+    async def prepare_object(
+            self, session, object_o, source, model_name="", copy=False, list_order=None, create_add_user=True):
+        """
+        Merge object_o on the stored source, list_order is given for a new object or a copy.
+        """
+        if source:
+            if not copy:
+                to_pop = default_fields[:]
+                object_o = update_model(source, object_o, pop_form_newobject=to_pop)
+            if session.user:
+                object_o.update_uid = session.user.get('uid')
+
+        object_o.update_datetime = datetime.now()
+
+        if list_order is not None:
+            object_o = await self.init_new_object(object_o, model_name, list_order, create_add_user)
+
+        if copy:
+            if hasattr(object_o, "title"):
+                object_o.title = f"{object_o.title} Copy()"
+            if (
+                    hasattr(object_o, "rec_name") and
+                    object_o.rec_name and model_name not in object_o.rec_name
+            ):
+                object_o.rec_name = f"{object_o.rec_name}_copy"
+                if hasattr(object_o, "data_value"):
+                    object_o.data_value['rec_name'] = object_o.rec_name
+            else:
+                object_o.rec_name = f"{model_name}.{object_o.id}"
+        return object_o
+
+    async def init_new_object(self, object_o, model_name, list_order: int, create_add_user=True):
+        object_o.list_order = list_order
+        object_o.data_value['list_order'] = object_o.list_order
+        object_o.create_datetime = datetime.now()
+        if create_add_user:
+            object_o = await self.set_user_data(object_o)
+        if model_name == "user":
+            pw_hash = self.get_password_hash(object_o.password)
+            object_o.password = pw_hash
+        return object_o
+
+    def validate_records(self, model, records: list):
+        objects = []
+        rows = []
+        errors = []
+        for row, record in enumerate(records):
+            if isinstance(record, BasicModel):
+                objects.append(record)
+                rows.append(row)
+                continue
+            try:
+                objects.append(model(**record))
+                rows.append(row)
+            except pydantic.error_wrappers.ValidationError as e:
+                logger.error(f" Validation {e}")
+                errors.append({
+                    "row": row, "rec_name": record.get("rec_name", ""), "message": f"Errore validazione {e}"})
+        return objects, rows, errors
+
+    async def write_bulk(self, objects: list, rows: list, errors: list, mode="upsert", remove_meta=True) -> dict:
+        res = await bulk_save_records(
+            objects, mode=mode, remove_meta=remove_meta, chunk_size=get_settings().bulk_chunk_size)
+        if objects:
+            await self.model_changed(type(objects[0]))
+        for index, err in res['errors'].items():
+            message = err.get('errmsg', "")
+            if err.get('code') == 11000 and err.get('keyValue'):
+                key = list(err['keyValue'].keys())[0]
+                message = f"Errore Duplicato {key}: {err['keyValue'][key]}"
+            errors.append({"row": rows[index], "rec_name": objects[index].rec_name, "message": message})
+        errors.sort(key=lambda x: x['row'])
+        return {
+            "status": "error" if errors else "ok",
+            "saved": res['saved'],
+            "errors": errors
+        }
+
+    async def bulk_save(
+            self, data_model, records: list, mode="upsert", remove_meta=True, list_order=False) -> dict:
+        """
+        Validate records (dict or model instance) with the generated model and save them
+        with bulk_write in chunks, mode is one of upsert, insert, replace.
+        If list_order a range of the model sequence is reserved for the records.
+        """
+        model = data_model
+        if isinstance(data_model, str):
+            model = await self.gen_model(data_model)
+        objects, rows, errors = self.validate_records(model, records)
+        if list_order and objects:
+            start = await reserve_sequence(model.str_name(), len(objects))
+            for i, object_o in enumerate(objects):
+                object_o.list_order = start + i
+        return await self.write_bulk(objects, rows, errors, mode=mode, remove_meta=remove_meta)
+
+    async def bulk_save_object(
+            self, session, records: list, model_name="", model=False, create_add_user=True) -> dict:
+        """
+        save_object for a list of records, existing sources are read with one query
+        and new records get a single list_order range.
+        """
+        if not model:
+            model = await self.gen_model(model_name)
+        objects, rows, errors = self.validate_records(model, records)
+        names = [object_o.rec_name for object_o in objects if object_o.rec_name]
+        sources = {}
+        if names:
+            for data in await search_by_filter(model, {"rec_name": {"$in": names}}):
+                sources[data['rec_name']] = model(**data)
+        news = len([object_o for object_o in objects if object_o.rec_name not in sources])
+        list_order = 0
+        if news:
+            list_order = await reserve_sequence(model.str_name(), news)
+        to_save = []
+        for object_o in objects:
+            source = sources.get(object_o.rec_name)
+            object_o = await self.prepare_object(
+                session, object_o, source, model_name=model_name,
+                list_order=None if source else list_order, create_add_user=create_add_user)
+            if not source:
+                list_order += 1
+            to_save.append(object_o)
+        return await self.write_bulk(to_save, rows, errors)
+
+    async def bulk_update(self, data_model, updates: dict) -> dict:
+        """
+        updates: {rec_name: {field: value}}, applied with bulk_write in chunks
+        """
+        model = data_model
+        if not isinstance(data_model, str):
+            model = data_model.str_name()
+        res = await bulk_update_records(model, updates, chunk_size=get_settings().bulk_chunk_size)
+        await self.model_changed(model)
+        return res
+
     async def set_to_delete_record(self, data_model: Type[ModelType], record):
         logger.info(f" data_model: {data_model}, record: {record.rec_name}")
-        return await set_to_delete_record(data_model, record)
+        res = await set_to_delete_record(data_model, record)
+        if self.is_session(data_model):
+            await session_store.evict([record.token])
+        await self.model_changed(data_model)
+        return res
 
     async def set_to_delete_records(self, data_model: Type[ModelType], query={}):
         logger.info(f" data_model: {data_model}, query: {query}")
-        return await set_to_delete_records(data_model, query=query)
+        if self.is_session(data_model):
+            await session_store.evict_query(query)
+        res = await set_to_delete_records(data_model, query=query)
+        await self.model_changed(data_model)
+        return res
 
     async def clean_action_and_menu_group(self, model_name_to_clean):
         menu_group_model = await self.gen_model("menu_group")
@@ -508,11 +791,20 @@ class ModelDataBase(ModelData):
         await self.delete_records(action_model, query={"$and": [{"model": model_name_to_clean}]})
         await self.delete_records(menu_group_model, query={"$and": [{"rec_name": model_name_to_clean}]})
 
+    def is_session(self, data_model) -> bool:
+        if not isinstance(data_model, str):
+            data_model = data_model.str_name()
+        return data_model == Session.str_name()
+
     async def delete_records(self, data_model, query={}):
         logger.info(f" delete_records data_model: {data_model}, query: {query}")
         cont = await self.count_by_filter(data_model, query)
         if cont > 0:
-            return await delete_records(data_model, query=query)
+            if self.is_session(data_model):
+                await session_store.evict_query(query)
+            res = await delete_records(data_model, query=query)
+            await self.model_changed(data_model)
+            return res
         return True
 
     async def get_collections_names(self, query={}):
@@ -520,19 +812,75 @@ class ModelDataBase(ModelData):
         return collections_names
 
     async def clean_expired_to_delete_record(self):
+        """
+        The TTL indexes remove the expired sessions and the soft deleted records,
+        the records without the TTL date are removed by batches here.
+        """
         logger.info(f" clean expired to delete record ")
-        c_names = await self.get_collections_names()
-        for name in c_names:
-            data_model = await self.gen_model(name)
-            logger.info(f" clean {name} ")
-            if data_model:
-                if name == "session":
-                    res = await clean_session(datetime.now().isoformat())
-                    logger.info(f" clean to delete {name}  {res}")
-                else:
-                    res = await erese_all_to_delete_record(data_model)
-                    logger.info(f" clean to delete {name}  {res}")
-        return {"status": "done"}
+        settings = get_settings()
+        start = time.monotonic()
+        c_names = await self.get_collections_names(
+            query={"name": {"$regex": r"^(?!system\.)"}, "type": "collection"})
+        limit = asyncio.Semaphore(settings.clean_concurrency)
+        collections = {}
+
+        async def clean(name):
+            async with limit:
+                try:
+                    await ensure_ttl_indexes(name)
+                    if name == "session":
+                        res = {"removed": await session_store.clean(
+                            datetime.now().isoformat(), batch_size=settings.clean_batch_size)}
+                    else:
+                        res = {
+                            "purge_at_set": await set_purge_at(name, batch_size=settings.clean_batch_size),
+                            "removed": await erese_all_to_delete_record(name, batch_size=settings.clean_batch_size)
+                        }
+                    # the TTL index removes records without model_changed, soft deleted ones may be gone
+                    if res["removed"] or res.get("purge_at_set") or await has_soft_deleted(name):
+                        await self.model_changed(name)
+                except pymongo.errors.PyMongoError as e:
+                    logger.error(f" clean to delete {name} error {e}")
+                    res = {"error": str(e)}
+                logger.info(f" clean to delete {name}  {res}")
+                collections[name] = res
+
+        await asyncio.gather(*[clean(name) for name in c_names])
+        report = {
+            "status": "done",
+            "datetime": datetime.now().isoformat(),
+            "seconds": round(time.monotonic() - start, 2),
+            "collections": collections
+        }
+        try:
+            cache = await get_cache()
+            await cache.set("clean", "last_run", report, expire=7 * 24 * 3600)
+        except Exception as e:
+            logger.error(f"clean report cache error: {e}")
+        return report
+
+    async def get_clean_report(self):
+        c_names = await self.get_collections_names(
+            query={"name": {"$regex": r"^(?!system\.)"}, "type": "collection"})
+        limit = asyncio.Semaphore(get_settings().clean_concurrency)
+        collections = {}
+
+        async def count(name):
+            async with limit:
+                res = await count_to_delete(name)
+                ledger = index_ledger.get_ledger().get(name) or await index_ledger.load(name)
+                index_names = [make_index_name(index['keys']) for index in make_ttl_indexes(name)]
+                res["ttl_indexes"] = {index_name: index_name in ledger for index_name in index_names}
+                collections[name] = res
+
+        await asyncio.gather(*[count(name) for name in c_names])
+        try:
+            cache = await get_cache()
+            last_run = await cache.get("clean", "last_run") or {}
+        except Exception as e:
+            logger.error(f"clean report cache error: {e}")
+            last_run = {}
+        return {"collections": collections, "last_run": last_run}
 
     def check_parse_json(self, str_test):
         try:
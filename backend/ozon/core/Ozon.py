@@ -19,6 +19,7 @@ from fastapi.responses import JSONResponse
 import logging
 from starlette.datastructures import MutableHeaders
 from .database.mongo_core import *
+from .database.cache.session_store import session_store
 from .ServiceMain import ServiceMain
 from datetime import datetime, timedelta
 import uuid
@@ -123,7 +124,7 @@ class OzonBase(Ozon):
         logger.info("save_session")
         self.session.last_update = datetime.now().timestamp()
         self.session.update_datetime = datetime.now().isoformat()
-        await self.mdata.save_record(self.session)
+        await session_store.save(self.session)
 
     async def home_page(self, request):
         self.session.app['mode'] = "list"
@@ -254,7 +255,7 @@ class OzonBase(Ozon):
             app = App(**rec_dict)
             app.owner_uid = get_settings().admin_username
             app.admins = app.admins + get_settings().admins
-            app.list_order = int(await self.mdata.count_by_filter(App, query={"deleted": 0}))
+            app.list_order = await next_sequence(App.str_name())
             try:
                 await self.mdata.save_record(app)
                 if is_app_admin:
@@ -328,11 +329,12 @@ class OzonBase(Ozon):
                             self.session, component, model_name="component", copy=False)
                     else:
                         component.owner_uid = get_settings().admin_username
-                        component.list_order = int(await self.mdata.count_by_filter(Component, query={"deleted": 0}))
+                        component.list_order = await next_sequence(Component.str_name())
                         try:
                             await self.mdata.save_record(component)
                         except pymongo.errors.DuplicateKeyError as e:
                             logger.warning(f" Duplicate {e.details['errmsg']} ignored")
+                    await self.mdata.invalidate_model(component.rec_name)
 
                 else:
                     is_update = True
@@ -365,21 +367,20 @@ class OzonBase(Ozon):
                 data_j = await jsonfile.read()
             datas = ujson.loads(data_j)
             model = await self.mdata.gen_model(model_name)
+            records = []
             for record_data in datas:
                 record = model(**record_data)
                 if model_name == "user":
                     pw_hash = self.get_password_hash(record.password)
                     record.password = pw_hash
                 record.owner_uid = get_settings().admin_username
-                record.list_order = int(await self.mdata.count_by_filter(model, query={"deleted": 0}))
-                if self.session:
-                    await self.mdata.save_object(
-                        self.session, record, model_name=model_name, copy=False)
-                else:
-                    try:
-                        await self.mdata.save_record(record)
-                    except pymongo.errors.DuplicateKeyError as e:
-                        logger.warning(f" Duplicate model {model_name} {e.details['errmsg']} ignored")
-                        pass
+                records.append(record)
+            if self.session:
+                res = await self.mdata.bulk_save_object(
+                    self.session, records, model_name=model_name, model=model)
+            else:
+                res = await self.mdata.bulk_save(model, records, list_order=True)
+            for err in res['errors']:
+                logger.warning(f" Error model {model_name} row {err['row']} {err['message']} ignored")
         else:
             logger.error(f"{data_file} not exist")
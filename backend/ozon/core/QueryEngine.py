@@ -9,6 +9,7 @@ from fastapi.exceptions import HTTPException
 from .DateEngine import DateEngine, datetime, date, time, DateTimeEncoder
 from .database.mongo_core import *
 import re
+from collections import OrderedDict
 
 # class JsonDatetime(datetime):
 #     def __json__(self):
@@ -19,6 +20,51 @@ import re
 
 logger = logging.getLogger(__name__)
 
+# compiled query templates by query shape, shared by the engines of the worker
+query_templates = OrderedDict()
+query_templates_size = 2048
+
+
+class QueryTemplate:
+    """
+    Shape of a query: the keys it contains and the paths of the values rendered
+    from session and dates, scanned as update() and check_key() walk the query.
+    """
+
+    def __init__(self, query: dict, is_placeholder):
+        self.keys = set()
+        self.paths = []
+        self.scan(query, (), is_placeholder)
+
+    def scan(self, data: dict, path: tuple, is_placeholder):
+        for k, v in data.items():
+            self.keys.add(k)
+            if isinstance(v, dict):
+                self.scan(v, path + (k,), is_placeholder)
+            elif isinstance(v, list):
+                for i, item in enumerate(v):
+                    if isinstance(item, dict):
+                        self.scan(item, path + (k, i), is_placeholder)
+                    elif is_placeholder(item):
+                        self.paths.append(path + (k, i))
+            elif is_placeholder(v):
+                self.paths.append(path + (k,))
+
+    def bind_path(self, data, path: tuple, render):
+        # copy on write, the source query is not modified
+        res = data.copy()
+        if len(path) == 1:
+            res[path[0]] = render(data[path[0]])
+        else:
+            res[path[0]] = self.bind_path(data[path[0]], path[1:], render)
+        return res
+
+    def bind(self, query: dict, render) -> dict:
+        res = query.copy()
+        for path in self.paths:
+            res = self.bind_path(res, path, render)
+        return res
+
 
 class QueryEngine(PluginBase):
     plugins = []
@@ -167,25 +213,62 @@ class QueryEngineBase(QueryEngine):
                 return False
         return str_test
 
+    def is_placeholder(self, obj_val):
+        return isinstance(obj_val, str) and (
+                "_date_" in obj_val or "_user_" in obj_val or self.isodate_regex.match(obj_val))
+
+    def render_value(self, obj_val):
+        # as the two update passes of the whole query
+        return self.update(self.update(obj_val))
+
+    def query_shape(self, data):
+        # the literals are replaced by a marker, the placeholders keep their position
+        if isinstance(data, dict):
+            return {k: self.query_shape(v) for k, v in data.items()}
+        if isinstance(data, list):
+            items = [self.query_shape(i) for i in data]
+            if all(i == "?" for i in items):
+                return "?"
+            return items
+        if self.is_placeholder(data):
+            return "$"
+        return "?"
+
+    def compile_query(self, query: dict) -> QueryTemplate:
+        try:
+            key = ujson.dumps(self.query_shape(query), sort_keys=True)
+        except (TypeError, OverflowError, ValueError):
+            return QueryTemplate(query, self.is_placeholder)
+        template = query_templates.get(key)
+        if template:
+            query_templates.move_to_end(key)
+            return template
+        template = QueryTemplate(query, self.is_placeholder)
+        query_templates[key] = template
+        if len(query_templates) > query_templates_size:
+            query_templates.popitem(last=False)
+        return template
+
     async def default_query(self, model: BasicModel, query: dict, parent="", model_type="") -> dict:
         # model_schema = model.schema()
         # fields = {k: model_schema['properties'][k]['type'] for k, v in model_schema['properties'].items()}
         if model.str_name().lower() in ["menu_group"] and self.app_code:
             query.update({"$or": [{'apps': {'$in': [self.app_code]}}, {'apps': []}]})
 
-        if not self.check_key(query, "deleted"):
+        template = self.compile_query(query)
+
+        if "deleted" not in template.keys:
             query.update({"deleted": 0})
 
-        if not self.check_key(query, "active"):
+        if "active" not in template.keys:
             query.update({"active": True})
 
-        if not self.check_key(query, "parent") and parent:
-            query.update({"parent": {"$eq": parent}})
+        if "parent" not in template.keys and parent:
+            query.update({"parent": self.render_value({"$eq": parent})})
 
-        if not self.check_key(query, "type") and model_type:
-            query.update({"type": {"$eq": model_type}})
+        if "type" not in template.keys and model_type:
+            query.update({"type": self.render_value({"$eq": model_type})})
 
-        q = self.update(query)
-        q = self.update(q.copy())
+        q = template.bind(query, self.render_value)
         logger.debug(f"result query: {q}")
         return q
@@ -348,6 +348,7 @@ class ActionMain(ServiceAction):
         merge_field = ""
         schema_sort = {}
         can_edit = False
+        projection = None
 
         if self.action.model == "component" and self.data_model == Component and not related_name:
             model_schema = await self.mdata.component_by_type(self.component_type)
@@ -383,6 +384,10 @@ class ActionMain(ServiceAction):
 
         limit = data.get("limit", 0)
         skip = data.get("skip", 0)
+        # pagination: offset | keyset, count_mode: exact | estimated | cached
+        pagination = data.get("pagination", "offset")
+        count_mode = data.get("count_mode", "exact")
+        next_cursor = ""
 
         query = self.prepare_list_query(data, data_model_name)
 
@@ -396,14 +401,22 @@ class ActionMain(ServiceAction):
             self.session.app['breadcrumb'][action_url] = self.action.title
         else:
             self.session.app['breadcrumb'] = {}
-        if self.execute:
+        # table requests send the columns, only those are read from the db
+        if not fields and data.get("fields"):
+            projection = make_columns_projection(data.get("fields"))
+        if self.execute and pagination == "keyset":
+            list_data, next_cursor = await self.mdata.get_list_page(
+                self.data_model, fields=fields,
+                query=query, sort=sort, limit=limit, cursor=data.get("cursor", ""),
+                row_action=act_path, merge_field=merge_field, projection=projection)
+        elif self.execute:
             list_data = await self.mdata.get_list_base(
                 self.data_model, fields=fields,
                 query=query, sort=sort, limit=limit, skip=skip,
                 model_type=self.component_type, parent=related_name,
-                row_action=act_path, merge_field=merge_field)
+                row_action=act_path, merge_field=merge_field, projection=projection)
 
-        recordsTotal = await self.mdata.count_by_filter(self.data_model, query=query)
+        recordsTotal = await self.mdata.count_list(self.data_model, query=query, count_mode=count_mode)
 
         can_edit = await self.eval_editable_and_context_button(schema, list_data)
 
@@ -424,6 +437,7 @@ class ActionMain(ServiceAction):
             "sort": sortstr,
             "recordsTotal": recordsTotal,
             "recordsFiltered": recordsTotal,
+            "cursor": next_cursor,
             "data": list_data[:],
             "schema": schema,
             "action_url": action_url,
@@ -597,6 +611,9 @@ class ActionMain(ServiceAction):
         to_save = self.data_model(**data)
         record = await self.mdata.save_object(
             self.session, to_save, rec_name=self.curr_ref, model_name="component", copy=copy)
+        if not isinstance(record, dict):
+            await self.mdata.invalidate_model(
+                record.rec_name, model_registry.make_version(record))
         return record
 
     async def before_save(self, record, rec_name="", model_name="", copy=False, partial_update=False):
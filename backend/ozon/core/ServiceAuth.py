@@ -8,6 +8,7 @@ from fastapi.responses import RedirectResponse, JSONResponse
 import ujson
 from ozon.settings import get_settings
 from .database.mongo_core import *
+from .database.cache.session_store import session_store
 from collections import OrderedDict
 from pathlib import Path
 from fastapi import Request
@@ -166,7 +167,7 @@ class ServiceAuthBase(ServiceAuth):
             self.session = await self.create_session_public_user()
         if self.session.expire_datetime < datetime.now():
             self.session.active = False
-            await self.mdata.save_record(self.session)
+            await session_store.save(self.session, flush=True)
             self.session = None
         return self.session
 
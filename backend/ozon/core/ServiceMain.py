@@ -2,6 +2,7 @@
 # See LICENSE file for full licensing details.
 import copy
 import sys
+import asyncio
 import os
 from os import listdir
 from os.path import isfile, join
@@ -9,9 +10,12 @@ import ujson
 from ozon.settings import get_settings
 from .database.mongo_core import *
 from .database.cache.cache import get_cache
+from .remote_client import remote_client, UpstreamError
 from collections import OrderedDict
 from pathlib import Path
+from urllib.parse import urlsplit, parse_qsl
 from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 from .ServiceSecurity import ServiceSecurity
 from .ServiceAction import ServiceAction
 from .ServiceActionTask import ActionTask
@@ -24,7 +28,6 @@ from pydantic import ValidationError
 import logging
 import pymongo
 import requests
-import httpx
 import uuid
 import traceback
 
@@ -46,15 +49,15 @@ class ServiceBase(ServiceMain):
 
     @classmethod
     def create(
-            cls, request
+            cls, request, session=None
     ):
         self = ServiceBase()
-        self.init(request)
+        self.init(request, session=session)
         return self
 
-    def init(self, request):
+    def init(self, request, session=None):
         self.request = request
-        self.session = request.scope['ozon'].session
+        self.session = session or request.scope['ozon'].session
         self.pwd_context = request.scope['ozon'].pwd_context
         self.action_service = None
         self.app_code = request.headers.get('app_code', "admin")
@@ -111,7 +114,7 @@ class ServiceBase(ServiceMain):
         if not name:
             name = self.session.app.get("layout")
         else:
-            session.app['layout'] = name
+            self.session.app['layout'] = name
 
         layout = await search_by_name(Component, rec_name=name)
 
@@ -137,6 +140,79 @@ class ServiceBase(ServiceMain):
             }
         }
 
+    async def service_get_page_content(self, path: str, params: dict = {}):
+        """
+        content of a web-client page path, the same of GET on the path
+        """
+        parts = [part for part in path.split("/") if part]
+        if parts and parts[0] == "action" and len(parts) in [2, 3]:
+            res = await self.service_handle_action(
+                action_name=parts[1], rec_name=parts[2] if len(parts) == 3 else "",
+                parent=params.get("parent", ""), iframe=params.get("iframe", ""),
+                container_act=params.get("container_act", ""))
+            res['breadcrumb'] = copy.deepcopy(self.session.app.get('breadcrumb', {}))
+            return res
+        if parts and parts[0] == "dashboard" and len(parts) < 3:
+            return await self.service_get_dashboard(parent=parts[1] if len(parts) == 2 else "")
+        return {}
+
+    def find_tables_action_url(self, components: list, urls: list):
+        for component in components:
+            if not isinstance(component, dict):
+                continue
+            if component.get("type") == "table" and component.get("properties", {}).get("action_url"):
+                urls.append(component['properties']['action_url'])
+            for key in ["components", "columns", "rows"]:
+                childs = component.get(key, [])
+                if childs and isinstance(childs[0], list):
+                    childs = [item for row in childs for item in row]
+                self.find_tables_action_url(childs, urls)
+        return urls
+
+    async def service_get_table_content(self, action_url: str, session=None):
+        url = urlsplit(action_url)
+        params = {**dict(parse_qsl(url.query)), "container_act": "y"}
+        service = ServiceMain.new(request=self.request, session=session)
+        return await service.service_get_page_content(url.path, params)
+
+    async def get_bundle_table(self, action_url: str, session):
+        try:
+            return await self.service_get_table_content(action_url, session=session)
+        except Exception as e:
+            logger.error(f"page bundle table {action_url} error: {e}")
+            return {"status": "error", "message": f"{getattr(e, 'detail', e)}"}
+
+    async def service_get_page_bundle(self, path: str, params: dict = {}):
+        """
+        session, page content, layout and embedded tables of a page in one response,
+        layout and tables are computed concurrently once the page content is known,
+        a table that fails is returned with its error
+        """
+        logger.info(f"service_get_page_bundle {path}")
+        self.session.server_settings = {}
+        session = copy.deepcopy(self.session.get_dict())
+        page = await self.service_get_page_content(path, params)
+        if not page:
+            return {"session": session, "page": {}, "layout": {}, "tables": {}}
+        tables_url = []
+        content = page.get("content", {})
+        if isinstance(content, dict) and isinstance(content.get("schema"), dict):
+            tables_url = list(dict.fromkeys(
+                self.find_tables_action_url(content['schema'].get("components", []), [])))
+        # each table runs on its own copy of the session, its breadcrumb and state are not kept
+        tables_session = [self.session.copy(deep=True) for url in tables_url]
+        layout_service = ServiceMain.new(request=self.request)
+        res = await asyncio.gather(
+            layout_service.service_get_layout(""),
+            *[self.get_bundle_table(url, table_session) for url, table_session in zip(tables_url, tables_session)]
+        )
+        return {
+            "session": session,
+            "page": page,
+            "layout": res[0],
+            "tables": dict(zip(tables_url, res[1:]))
+        }
+
     async def service_get_schema(self, model_name):
         logger.debug(f"service_get_schema by name {model_name}")
         await self.make_settings()
@@ -168,14 +244,13 @@ class ServiceBase(ServiceMain):
         # TODO add check rules for model
         await self.make_settings()
         model_data = await self.mdata.gen_model(data['model_name'])
-        list_to_save = []
+        updates = {}
         for record_data in data['columns']:
-            record = await self.mdata.by_name(model_data, record_data['key'])
-            record.list_order = record_data['value']
+            to_set = {"list_order": record_data['value']}
             if not data['model_name'] == "component":
-                record.data_value['list_order'] = record_data['value']
-            list_to_save.append(record)
-        await self.mdata.save_all(list_to_save, remove_meta=False)
+                to_set['data_value.list_order'] = record_data['value']
+            updates[record_data['key']] = to_set
+        await self.mdata.bulk_update(model_data, updates)
         return {"status": "ok"}
 
     async def service_get_schemas_by_type(self, schema_type="form", query={}, fields=[], additional_key=[]):
@@ -352,33 +427,32 @@ class ServiceBase(ServiceMain):
             url = f"{url}/{path_value}"
         cache = await get_cache()
         editing = self.session.app.get("builder")
-        memcache = await cache.get(self.app_code, f"get_remote_data_select:{url}")
-        if memcache and not editing:
-            values = memcache.get("content", {}).get("data", [])
-            logger.info(values)
-            if len(values) > 0:
-                logger.info(f"cache usage")
-                return memcache
-        rec_cfg = await self.get_param(header_value_key)
-        headers = {}
-        if isinstance(rec_cfg, dict):
-            remote_data = await self.get_remote_data(headers, header_key, rec_cfg.get("key"), url)
-        else:
-            remote_data = await self.get_remote_data(headers, header_key, rec_cfg, url)
-        data = remote_data if isinstance(remote_data, list) else []
-        res = {
-            "content": {
-                "mode": "list",
-                "data": data
+
+        async def fetch():
+            rec_cfg = await self.get_param(header_value_key)
+            headers = {}
+            if isinstance(rec_cfg, dict):
+                remote_data = await self.get_remote_data(headers, header_key, rec_cfg.get("key"), url)
+            else:
+                remote_data = await self.get_remote_data(headers, header_key, rec_cfg, url)
+            data = remote_data if isinstance(remote_data, list) else []
+            return {
+                "content": {
+                    "mode": "list",
+                    "data": data
+                }
             }
-        }
-        if data and len(data) > 0:
-            await cache.set(self.app_code, f"get_remote_data_select:{url}", res, expire=1800)
-        return res
 
-    async def get_remote_data(self, headers={}, header_key="", header_value="", url=""):
+        if editing:
+            return await fetch()
+        return await cache.get_or_fetch(
+            self.app_code, f"get_remote_data_select:{url}", fetch, expire=1800,
+            stale=get_settings().remote_data_stale_seconds, cache_if=lambda res: len(res['content']['data']) > 0)
+
+    async def get_remote_data(self, headers=None, header_key="", header_value="", url=""):
         logger.info(f"server get_remote_data --> {url}, header_key:{header_key}, header_value:{header_value} ")
         await self.make_settings()
+        headers = dict(headers or {})
         if header_key and header_value:
             headers.update({
                 "Content-Type": "application/json",
@@ -389,10 +463,11 @@ class ServiceBase(ServiceMain):
                 "Content-Type": "application/json",
             })
 
-        async with httpx.AsyncClient(timeout=None) as client:
-            res = await client.get(
-                url=url, headers=headers
-            )
+        try:
+            res = await remote_client.get(url, headers=headers)
+        except UpstreamError as e:
+            logger.error(f"server get_remote_data --> {url} Error {e}")
+            return {}
         if res.status_code == 200:
             logger.info(f"server get_remote_data --> {url} SUCCESS ")
             datar = res.json()
@@ -406,11 +481,9 @@ class ServiceBase(ServiceMain):
             logger.info(f"server get_remote_data --> {url} Error {res.status_code} ")
             data = {}
 
-        # client.close()
         return data
 
-    async def export_data(self, model_name, datas, parent_name=""):
-        logger.info(f" model:{model_name}, query:{datas}, parent_name:{parent_name}")
+    async def prepare_export(self, model_name, datas):
         await self.make_settings()
         # data_mode = json | value
         data_mode = datas.get('data_mode', 'json')
@@ -433,18 +506,22 @@ class ServiceBase(ServiceMain):
         sort = self.mdata.eval_sort_str(schema.properties.get("sort", ''))
 
         if not data_mode == 'json':
-            data = await self.mdata.search_export(
-                data_model, fields=['data_value'], merge_field="data_value", query=query, parent=parent_name,
-                remove_keys=["_id", "id"], sort=sort
-            )
+            search = dict(
+                fields=['data_value'], merge_field="data_value", query=query,
+                remove_keys=["_id", "id"], sort=sort)
         else:
             if schema.sys:
                 to_rm = default_fields[:]
             else:
                 to_rm = []
             to_rm.append("_id")
-            data = await self.mdata.search_export(
-                data_model, fields=[], query=query, parent=parent_name, remove_keys=to_rm)
+            search = dict(fields=[], query=query, remove_keys=to_rm)
+        return data_model, schema, search
+
+    async def export_data(self, model_name, datas, parent_name=""):
+        logger.info(f" model:{model_name}, query:{datas}, parent_name:{parent_name}")
+        data_model, schema, search = await self.prepare_export(model_name, datas)
+        data = await self.mdata.search_export(data_model, parent=parent_name, **search)
         # logger.info(f"export {len(data)} lines")
         return {
             "content": {
@@ -455,12 +532,18 @@ class ServiceBase(ServiceMain):
             }
         }
 
-    async def update_record_user_data(self, record, uid):
-        logger.info(f"update {uid}")
+    async def get_user_role(self, uid):
         self.auth_service = ServiceAuth.new(
             public_endpoint=[], parent=self, request=self.request,
             pwd_context=self.pwd_context, req_id="")
-        user = await self.auth_service.session_service.user_role(uid)
+        return await self.auth_service.session_service.user_role(uid)
+
+    async def update_record_user_data(self, record, uid):
+        logger.info(f"update {uid}")
+        user = await self.get_user_role(uid)
+        return self.set_record_user_data(record, user)
+
+    def set_record_user_data(self, record, user):
         logger.info(f"record update {user.get('uid')}")
         record.owner_uid = user.get('uid')
         record.owner_name = user.get('full_name', "")
@@ -529,6 +612,72 @@ class ServiceBase(ServiceMain):
                 "model": model_name
             }
 
+    async def import_raw_data_list(self, model_name, records: list):
+        await self.make_settings()
+        if not self.session.is_admin:
+            return {
+                "status": "error",
+                "message": f"Admin Only",
+                "model": model_name
+            }
+        data_model = await self.mdata.gen_model(model_name)
+        # rows with owner_uid keep their owner, the others get the session user
+        to_save = {True: [], False: []}
+        to_save_rows = {True: [], False: []}
+        errors = []
+        users = {}
+        for row, record_data in enumerate(records):
+            try:
+                record = data_model(**record_data)
+            except ValidationError as e:
+                logger.error(f" Validation {e}")
+                errors.append({"row": row, "rec_name": record_data.get("rec_name", ""),
+                               "message": f"Errore validazione {e}"})
+                continue
+            create_add_user = True
+            uid = record_data.get("owner_uid")
+            if uid:
+                if uid not in users:
+                    users[uid] = await self.get_user_role(uid)
+                record = self.set_record_user_data(record, users[uid])
+                if not record.owner_uid:
+                    errors.append({"row": row, "rec_name": record.rec_name,
+                                   "message": f"Errore validazione {uid} "})
+                    continue
+                create_add_user = False
+            to_save[create_add_user].append(record)
+            to_save_rows[create_add_user].append(row)
+        saved = 0
+        for create_add_user, objects in to_save.items():
+            if not objects:
+                continue
+            res = await self.mdata.bulk_save_object(
+                self.session, objects, model_name=model_name, model=data_model,
+                create_add_user=create_add_user)
+            saved += res['saved']
+            for err in res['errors']:
+                err['row'] = to_save_rows[create_add_user][err['row']]
+                errors.append(err)
+        errors.sort(key=lambda x: x['row'])
+        return {
+            "status": "error" if errors else "ok",
+            "saved": saved,
+            "errors": errors,
+            "model": model_name
+        }
+
+    async def export_data_stream(self, model_name, datas, parent_name=""):
+        """
+        Export as NDJSON, the first line holds mode, model and schema, then one line for record
+        """
+        logger.info(f" model:{model_name}, query:{datas}, parent_name:{parent_name}")
+        data_model, schema, search = await self.prepare_export(model_name, datas)
+        head = {"mode": "list", "model": model_name, "schema": jsonable_encoder(schema or {})}
+        yield ujson.dumps(head, escape_forward_slashes=False, ensure_ascii=False) + "\n"
+        async for rows in self.mdata.iter_export(data_model, **search):
+            yield "".join(
+                ujson.dumps(row, escape_forward_slashes=False, ensure_ascii=False) + "\n" for row in rows)
+
     async def get_mail_template(self, model_name, template_name=""):
         logger.info(f" model:{model_name}, template_name:{template_name}")
         # data_mode = json |
@@ -627,6 +776,22 @@ class ServiceBase(ServiceMain):
         await self.make_settings()
         return await self.mdata.clean_expired_to_delete_record()
 
+    async def clean_report(self):
+        await self.make_settings()
+        return await self.mdata.get_clean_report()
+
+    async def index_ledger(self, reconcile=False):
+        logger.info(f"index ledger reconcile: {reconcile}")
+        await self.make_settings()
+        return await self.mdata.get_index_ledger(reconcile=reconcile)
+
+    async def cache_stats(self):
+        cache = await get_cache()
+        return cache.stats()
+
+    async def remote_stats(self):
+        return remote_client.stats()
+
     async def get_calendar_task(self, task_name) -> dict:
         await self.make_settings()
         try:
@@ -7,6 +7,7 @@ from os.path import isfile, join
 import ujson
 from ozon.settings import get_settings
 from .database.mongo_core import *
+from .database.cache.menu_cache import menu_cache
 from collections import OrderedDict
 from pathlib import Path
 from fastapi import Request
@@ -68,80 +69,134 @@ class MenuManagerBase(ServiceMenuManager):
             and_list = pre_list[:]
         return and_list
 
-    async def get_basic_menu_list(self, admin=False, parent=""):
-        menu_group_model = await self.mdata.gen_model("menu_group")
-        self.action_model = await self.mdata.gen_model("action")
-
-        menu_grops_list = await self.mdata.get_list_base(
-            menu_group_model, query=await self.qe.default_query(
-                menu_group_model,
-                {"$and": [{"admin": admin}, {"parent": parent}]}
-            )
+    def menu_cache_key(self, admin=False, parent=""):
+        user_function = self.session.user.get('user_function', "")
+        return (
+            f"{self.app_code}:{self.session.is_admin}:{user_function}:{self.session.is_public}:"
+            f"{admin}:{parent}"
         )
-        menu_groups = []
+
+    async def make_menu_pipeline(self, menu_group_model, admin=False, parent="") -> list:
+        """
+        One aggregation on menu_group with the actions needed by the dashboard:
+          - first_action: the first action of the group, its model is the card model
+          - sub_groups, sub_actions: sub menu groups and one of their actions
+          - card_actions: menu and window actions of the card model or group
+        """
+        sort = {"list_order": 1, "rec_name": -1}
+        group_q = await self.qe.default_query(
+            menu_group_model, {"$and": [{"admin": admin}, {"parent": parent}]})
+        action_q = await self.qe.default_query(
+            self.action_model, {"$and": await self.make_query_user([{"deleted": 0}])})
+        sub_group_q = await self.qe.default_query(
+            menu_group_model, {"$and": await self.make_query_user([{"deleted": 0}])})
+        card_q = await self.qe.default_query(self.action_model, {"$and": await self.make_query_user([
+            {"action_type": {"$in": ["menu", "window"]}},
+            {"component_type": {'$in': ["form", "resource", "layout"]}}
+        ])})
+        return [
+            {"$match": group_q},
+            {"$sort": sort},
+            {"$lookup": {
+                "from": "action",
+                "let": {"group": "$rec_name"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$menu_group", "$$group"]}}},
+                    {"$match": action_q},
+                    {"$sort": sort},
+                    {"$limit": 1},
+                    {"$project": {"model": 1}}
+                ],
+                "as": "first_action"
+            }},
+            {"$lookup": {
+                "from": "menu_group",
+                "let": {"group": "$rec_name"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$parent", "$$group"]}}},
+                    {"$match": sub_group_q},
+                    {"$project": {"rec_name": 1}}
+                ],
+                "as": "sub_groups"
+            }},
+            {"$lookup": {
+                "from": "action",
+                "let": {"groups": "$sub_groups.rec_name"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$in": ["$menu_group", "$$groups"]}}},
+                    {"$match": action_q},
+                    {"$limit": 1},
+                    {"$project": {"rec_name": 1}}
+                ],
+                "as": "sub_actions"
+            }},
+            {"$addFields": {"card_model": {"$arrayElemAt": ["$first_action.model", 0]}}},
+            {"$lookup": {
+                "from": "action",
+                "let": {"model": "$card_model", "group": "$rec_name"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$or": [
+                        {"$eq": ["$model", "$$model"]}, {"$eq": ["$menu_group", "$$group"]}]}}},
+                    {"$match": card_q},
+                    {"$sort": sort}
+                ],
+                "as": "card_actions"
+            }},
+        ]
+
+    async def build_menu_read_model(self, admin=False, parent="") -> list:
+        menu_group_model = await self.mdata.gen_model("menu_group")
+        groups = await self.mdata.aggregate_raw(
+            menu_group_model, await self.make_menu_pipeline(menu_group_model, admin=admin, parent=parent))
         menu_list = []
         model_done = []
-        logger.info(menu_list)
-        menu_g = {}
-        for i in menu_grops_list:
-            found_item = await self.mdata.get_list_base(
-                self.action_model, query=await self.qe.default_query(self.action_model, {
-                    "$and": await self.make_query_user([
-                        {"deleted": 0},
-                        {"menu_group": i['rec_name']}
-                    ])
-                })
-            )
-            if found_item:
-                if found_item[0]['model'] not in model_done:
-                    model_done.append(found_item[0]['model'])
+        for i in groups:
+            if i['first_action']:
+                model = i['first_action'][0].get('model')
+                if model not in model_done:
+                    model_done.append(model)
                     menu_list.append(
                         {
-                            "model": found_item[0]['model'],
+                            "model": model,
                             "menu_group": i['rec_name'],
-                            "label": i['label']
+                            "label": i['label'],
+                            "menu_actions": [a for a in i['card_actions'] if a['action_type'] == "menu"],
+                            "window_actions": [a for a in i['card_actions'] if a['action_type'] == "window"]
                         }
                     )
-            else:
-                # sub_menus = await self.mdata.count_by_filter(menu_group_model, {"parent": i['rec_name']})
-                sub_menus = await self.mdata.get_list_base(
-                    menu_group_model, query=await self.qe.default_query(menu_group_model, {
-                        "$and": await self.make_query_user([
-                            {"deleted": 0},
-                            {"parent": i['rec_name']}
-                        ])
-                    })
+            elif i['sub_groups'] and i['sub_actions']:
+                number = len(i['sub_groups'])
+                logger.info(f"sub_menu_s {number}")
+                menu_list.append(
+                    {
+                        "model": False,
+                        "menu_group": i['rec_name'],
+                        "label": i['label'],
+                        "dashboard": True,
+                        "content": f"/dashboard/{i['rec_name']}",
+                        "action_type": "window",
+                        "mode": "list",
+                        "number": number,
+                        "icon": "it-folder"
+                    }
                 )
-                if sub_menus:
-                    number = len(sub_menus)
-                    logger.info(f"sub_menu_s {number}")
-                    sub_menu_groups = [s['rec_name'] for s in sub_menus]
-                    sub_menu_items = await self.mdata.get_list_base(
-                        self.action_model, query=await self.qe.default_query(self.action_model, {
-                            "$and": await self.make_query_user([
-                                {"deleted": 0},
-                                {"menu_group": {"$in": sub_menu_groups}}
-                            ])
-                        })
-                    )
-                    logger.info(f"sub_menu_items {len(sub_menu_items)}")
-                    if sub_menu_items:
-                        menu_list.append(
-                            {
-                                "model": False,
-                                "menu_group": i['rec_name'],
-                                "label": i['label'],
-                                "dashboard": True,
-                                "content": f"/dashboard/{i['rec_name']}",
-                                "action_type": "window",
-                                "mode": "list",
-                                "number": number,
-                                "icon": "it-folder"
-                            }
-
-                        )
-
-        return menu_list[:]
+        return menu_list
+
+    async def get_menu_read_model(self, admin=False, parent="") -> list:
+        self.action_model = await self.mdata.gen_model("action")
+        key = self.menu_cache_key(admin=admin, parent=parent)
+        menu_list = await menu_cache.get(key)
+        if menu_list is False:
+            menu_list = await self.build_menu_read_model(admin=admin, parent=parent)
+            await menu_cache.set(key, menu_list)
+        return menu_list
+
+    async def get_basic_menu_list(self, admin=False, parent=""):
+        menu_list = await self.get_menu_read_model(admin=admin, parent=parent)
+        return [
+            {k: v for k, v in card.items() if k not in ["menu_actions", "window_actions"]}
+            for card in menu_list
+        ]
 
     async def make_main_menu(self) -> list:
         logger.debug(f"make_main_menu only admin")
@@ -170,6 +225,7 @@ class MenuManagerBase(ServiceMenuManager):
             else:
                 link = f"{card_btn.action_root_path}"
             number = 0
+            number_at = ""
             if card_btn.mode == "list":
                 # list_query
                 list_query = {}
@@ -177,7 +233,9 @@ class MenuManagerBase(ServiceMenuManager):
                     if card_btn.list_query:
                         list_query = ujson.loads(card_btn.list_query)
                     q = await self.qe.default_query(cc_model, list_query)
-                    number = await self.mdata.count_by_filter(cc_model, q)
+                    res = await self.mdata.count_cached(cc_model, q)
+                    number = res['count']
+                    number_at = res['at']
             return {
                 "model": card_btn.model,
                 "icon": card_btn.button_icon,
@@ -185,45 +243,22 @@ class MenuManagerBase(ServiceMenuManager):
                 "content": link,
                 "label": card_btn.title,
                 "mode": card_btn.mode,
-                "number": number
+                "number": number,
+                "number_at": number_at
             }.copy()
         return False
 
     async def make_dashboard_menu(self, parent=""):
         logger.info(f"make_dashboard_menu {parent}")
-        menu_list = await self.get_basic_menu_list(parent=parent)
-        logger.info(menu_list)
+        menu_list = await self.get_menu_read_model(parent=parent)
         list_cards = []
-        group = {}
         for card in menu_list:
             if card['model']:
                 c_model = await self.mdata.gen_model(card['model'])
                 if c_model:
-                    q_menu_user = await self.make_query_user([
-                        {"action_type": "menu"},
-                        {"component_type": {'$in': ["form", "resource", "layout"]}},
-                        {"$or": [{"model": card['model']}, {"menu_group": card['menu_group']}]}
-                    ])
-
-                    q_user = await self.make_query_user([
-                        {"action_type": "window"},
-                        {"component_type": {'$in': ["form", "resource", "layout"]}},
-                        {"$or": [{"model": card['model']}, {"menu_group": card['menu_group']}]}
-                    ])
-                    q_menu = await self.qe.default_query(self.action_model, {"$and": q_menu_user})
-                    q = await self.qe.default_query(self.action_model, {"$and": q_user})
-
-                    menu_list = await self.mdata.get_list_base(self.action_model, query=q_menu)
-                    act_list = await self.mdata.get_list_base(self.action_model, query=q)
-
                     card_buttons = []
 
-                    for rec_b in menu_list:
-                        item = await self.make_menu_item(card, rec_b.copy())
-                        if item:
-                            card_buttons.append(item)
-
-                    for rec_b in act_list:
+                    for rec_b in card['menu_actions'] + card['window_actions']:
                         item = await self.make_menu_item(card, rec_b.copy())
                         if item:
                             card_buttons.append(item)
@@ -329,13 +364,17 @@ class MenuManagerBase(ServiceMenuManager):
         list_buttons = []
         group = {}
         mg_done = []
+        # the menu actions of all the groups in one query
+        q_menu = await self.make_query_user([
+            {"action_type": "menu"},
+            {"menu_group": {"$in": [mnu['rec_name'] for mnu in list_actions]}}
+        ])
+        q_menud = await self.qe.default_query(self.action_model, {"$and": q_menu})
+        menu_by_group = {}
+        for rec in await self.mdata.get_list_base(self.action_model, query=q_menud):
+            menu_by_group.setdefault(rec['menu_group'], []).append(rec)
         for mnu in list_actions:
-            q_menu = await self.make_query_user([
-                {"action_type": "menu"},
-                {"menu_group": mnu['rec_name']}
-            ])
-            q_menud = await self.qe.default_query(self.action_model, {"$and": q_menu})
-            menu_list = await self.mdata.get_list_base(self.action_model, query=q_menud)
+            menu_list = menu_by_group.get(mnu['rec_name'], [])
             if menu_list:
                 val = mnu['label']
                 if not val:
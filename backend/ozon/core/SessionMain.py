@@ -6,6 +6,7 @@ from .BaseClass import BaseClass, PluginBase
 from fastapi.requests import Request
 from abc import ABC, abstractmethod
 from .database.mongo_core import *
+from .database.cache.session_store import session_store
 from .DateEngine import DateEngine
 import uuid
 
@@ -122,7 +123,7 @@ class SessionBase(SessionMain, BaseClass):
         await self.make_settings()
         self.app_code = self.request.headers.get('app_code', "")
         logger.info(f"token: {self.token} - app {self.app_code}")
-        self.session = await find_session_by_token(self.token)
+        self.session = await session_store.get(self.token)
         if self.session:
             await self.set_current_app()
             logger.info(f"check token --> find uid {self.session.uid}")
@@ -174,10 +175,10 @@ class SessionBase(SessionMain, BaseClass):
         return {}
 
     async def logout(self):
-        self.session = await find_session_by_token(self.token)
+        self.session = await session_store.get(self.token)
         self.session.active = False
         self.session.last_update = datetime.now().timestamp()
-        await save_record(self.session)
+        await session_store.save(self.session, flush=True)
         return self.session
 
     async def get_param(self, name: str) -> Any:
@@ -1,40 +1,290 @@
 from aioredis.client import Redis
-from typing import Any
+from typing import Any, Dict, List
+import asyncio
 import logging
+import time
+import uuid
+import json
+from collections import OrderedDict
+from functools import partial
 from typing import Tuple
-from .coder import PickleCoder
+from .coder import Coder, PickleCoder
 
-from aioredis import Redis
+logger = logging.getLogger(__name__)
 
 
-class RedisBackend:
-    def __init__(self, redis: Redis):
+class TieredCache:
+    """
+    Redis cache with a bounded in-process L1 of encoded values in front of it.
+    Sets and clears are published on the invalidate channel and the other workers
+    drop their L1 copy, the L1 ttl bounds the staleness if a message is missed.
+    """
+
+    channel = "ozon_cache_invalidate"
+    scan_count = 500
+    release_lua = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+
+    def __init__(self, redis: Redis, coder: Coder = PickleCoder, l1_size: int = 2048, l1_ttl: float = 5):
         self.redis = redis
-        self.coder = PickleCoder
+        self.coder = coder
+        self.l1 = OrderedDict()
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.metrics = {}
+        self.worker_id = uuid.uuid4().hex
+        self.listener = None
+        self.inflight = {}
+
+    def make_key(self, app_code: str, key: str) -> str:
+        return f"{app_code}:{key}"
+
+    def count(self, app_code: str, name: str, num=1):
+        ns = self.metrics.get(app_code)
+        if ns is None:
+            ns = self.metrics[app_code] = {
+                "l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0, "clears": 0, "fetches": 0, "stale_hits": 0}
+        ns[name] += num
+
+    def l1_get(self, full_key: str):
+        entry = self.l1.get(full_key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.l1[full_key]
+            return None
+        self.l1.move_to_end(full_key)
+        return entry[1]
+
+    def l1_set(self, full_key: str, blob: bytes, expire=None):
+        if not self.l1_size:
+            return
+        ttl = min(self.l1_ttl, expire) if expire else self.l1_ttl
+        self.l1[full_key] = (time.monotonic() + ttl, blob)
+        self.l1.move_to_end(full_key)
+        while len(self.l1) > self.l1_size:
+            self.l1.popitem(last=False)
+
+    def l1_drop(self, app_code: str = None, keys: list = None):
+        for full_key in keys or []:
+            self.l1.pop(full_key, None)
+        if app_code:
+            prefix = f"{app_code}:"
+            for full_key in [name for name in self.l1 if name.startswith(prefix)]:
+                del self.l1[full_key]
+
+    def invalidate_message(self, app_code: str = None, keys: list = None) -> str:
+        return json.dumps({"worker": self.worker_id, "ns": app_code, "keys": keys or []})
 
     async def get_with_ttl(self, app_code: str, key: str) -> Tuple[int, str]:
         async with self.redis.pipeline(transaction=True) as pipe:
             return await (pipe.ttl(f"{app_code}:{key}").get(f"{app_code}:{key}").execute())
 
     async def get(self, app_code: str, key: str) -> Any:
-        if await self.redis.exists(f"{app_code}:{key}") == 0:
+        full_key = self.make_key(app_code, key)
+        blob = self.l1_get(full_key)
+        if blob is not None:
+            self.count(app_code, "l1_hits")
+            return self.coder.decode(blob)
+        blob = await self.redis.get(full_key)
+        if blob is None:
+            self.count(app_code, "misses")
             return False
-        return self.coder.decode(await self.redis.get(f"{app_code}:{key}"))
+        self.count(app_code, "l2_hits")
+        self.l1_set(full_key, blob)
+        return self.coder.decode(blob)
+
+    async def mget(self, app_code: str, keys: List[str]) -> List[Any]:
+        """
+        values in the order of keys, False for the missing ones
+        """
+        res = [False] * len(keys)
+        todo = []
+        for i, key in enumerate(keys):
+            blob = self.l1_get(self.make_key(app_code, key))
+            if blob is None:
+                todo.append(i)
+            else:
+                res[i] = self.coder.decode(blob)
+        self.count(app_code, "l1_hits", len(keys) - len(todo))
+        if not todo:
+            return res
+        blobs = await self.redis.mget([self.make_key(app_code, keys[i]) for i in todo])
+        for i, blob in zip(todo, blobs):
+            if blob is None:
+                self.count(app_code, "misses")
+                continue
+            self.count(app_code, "l2_hits")
+            self.l1_set(self.make_key(app_code, keys[i]), blob)
+            res[i] = self.coder.decode(blob)
+        return res
 
     async def set(self, app_code: str, key: str, value: Any, expire: int = 60):
-        return await self.redis.set(f"{app_code}:{key}", PickleCoder.encode(value), ex=expire)
+        blobs = {self.make_key(app_code, key): self.coder.encode(value)}
+        return (await self.set_blobs(app_code, blobs, expire))[0]
+
+    async def set_blobs(self, app_code: str, blobs: Dict[str, bytes], expire: int) -> list:
+        full_keys = list(blobs)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for full_key, blob in blobs.items():
+                pipe.set(full_key, blob, ex=expire)
+            if self.l1_size:
+                pipe.publish(self.channel, self.invalidate_message(keys=full_keys))
+            res = await pipe.execute()
+        for full_key, blob in blobs.items():
+            self.l1_set(full_key, blob, expire)
+        self.count(app_code, "sets", len(full_keys))
+        return res[:len(full_keys)]
+
+    async def delete(self, app_code: str, keys: List[str]) -> int:
+        full_keys = [self.make_key(app_code, key) for key in keys]
+        if not full_keys:
+            return 0
+        self.l1_drop(keys=full_keys)
+        removed = await self.redis.unlink(*full_keys)
+        await self.publish(keys=full_keys)
+        return removed
+
+    async def get_or_fetch(
+            self, app_code: str, key: str, fetch, expire: int = 60, stale: int = 0, cache_if=None,
+            lock_timeout: int = 30) -> Any:
+        """
+        fetch: coroutine function computing the value on a miss, one fetch by key runs at a time
+        in the process and, with a Redis lock, across the workers.
+        stale: seconds after expire the old value is returned while it is refreshed in background
+        cache_if: the value is cached only if cache_if(value) is true
+        """
+        entry = await self.get(app_code, key)
+        if isinstance(entry, dict) and "fresh_until" in entry:
+            if entry["fresh_until"] > time.time():
+                return entry["value"]
+            self.count(app_code, "stale_hits")
+            self.start_fetch(app_code, key, fetch, expire, stale, cache_if, lock_timeout)
+            return entry["value"]
+        task = self.start_fetch(app_code, key, fetch, expire, stale, cache_if, lock_timeout)
+        # the fetch goes on for the other waiters if this one is cancelled
+        blob = await asyncio.shield(task)
+        return self.coder.decode(blob)["value"]
+
+    def start_fetch(self, app_code: str, key: str, fetch, expire, stale, cache_if, lock_timeout) -> asyncio.Task:
+        full_key = self.make_key(app_code, key)
+        task = self.inflight.get(full_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.fetch_locked(app_code, key, fetch, expire, stale, cache_if, lock_timeout))
+            self.inflight[full_key] = task
+            task.add_done_callback(partial(self.fetch_done, full_key))
+        return task
+
+    def fetch_done(self, full_key: str, task: asyncio.Task):
+        self.inflight.pop(full_key, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"cache fetch {full_key} error: {task.exception()}")
+
+    async def fetch_locked(self, app_code: str, key: str, fetch, expire, stale, cache_if, lock_timeout) -> bytes:
+        full_key = self.make_key(app_code, key)
+        lock_key = f"lock:{full_key}"
+        token = uuid.uuid4().hex
+        locked = await self.redis.set(lock_key, token, nx=True, ex=lock_timeout)
+        if not locked:
+            blob = await self.wait_fetched(full_key, lock_key, lock_timeout)
+            if blob is not None:
+                return blob
+            # the holder did not cache a value, fetch without the lock
+        try:
+            self.count(app_code, "fetches")
+            value = await fetch()
+            blob = self.coder.encode({"value": value, "fresh_until": time.time() + expire})
+            if cache_if is None or cache_if(value):
+                await self.set_blobs(app_code, {full_key: blob}, expire + stale)
+            return blob
+        finally:
+            if locked:
+                await self.redis.eval(self.release_lua, 1, lock_key, token)
+
+    async def wait_fetched(self, full_key: str, lock_key: str, lock_timeout: int):
+        """
+        wait for the fetch of another worker, None if the lock is released or expires
+        without a fresh value
+        """
+        deadline = time.monotonic() + lock_timeout
+        delay = 0.05
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                blob, holder = await pipe.get(full_key).exists(lock_key).execute()
+            entry = self.coder.decode(blob) if blob is not None else None
+            if isinstance(entry, dict) and entry.get("fresh_until", 0) > time.time():
+                return blob
+            if not holder:
+                return None
+        return None
 
     async def clear(self, app_code: str = None, key: str = None) -> int:
+        """
+        app_code: remove all the keys of the namespace with SCAN, key: remove the key
+        """
         if app_code:
-            lua = f"for i, name in ipairs(redis.call('KEYS', '{app_code}:*')) do redis.call('DEL', name); end"
-            return await self.redis.eval(lua, numkeys=0)
+            self.l1_drop(app_code=app_code)
+            # keys are unlinked after the scan, deleting while scanning may skip keys
+            names = [name async for name in self.redis.scan_iter(match=f"{app_code}:*", count=self.scan_count)]
+            removed = 0
+            for i in range(0, len(names), self.scan_count):
+                removed += await self.redis.unlink(*names[i:i + self.scan_count])
+            self.count(app_code, "clears")
+            await self.publish(app_code=app_code)
+            return removed
         elif key:
-            return await self.redis.delete(key)
+            self.l1_drop(keys=[key])
+            removed = await self.redis.delete(key)
+            await self.publish(keys=[key])
+            return removed
+
+    async def publish(self, app_code: str = None, keys: list = None):
+        if self.l1_size:
+            await self.redis.publish(self.channel, self.invalidate_message(app_code=app_code, keys=keys))
+
+    def on_invalidate(self, data: bytes):
+        msg = json.loads(data)
+        if msg.get("worker") != self.worker_id:
+            self.l1_drop(app_code=msg.get("ns"), keys=msg.get("keys"))
+
+    async def listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.on_invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"cache invalidate listener error: {e}")
+                # messages may be lost while disconnected
+                self.l1.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+    async def start(self):
+        if self.l1_size and not self.listener:
+            self.listener = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self.listener:
+            self.listener.cancel()
+            self.listener = None
+        self.l1.clear()
+
+    def stats(self) -> dict:
+        return {"l1_keys": len(self.l1), "l1_size": self.l1_size, "namespaces": {
+            name: dict(ns) for name, ns in self.metrics.items()}}
 
 
 class OzonCache:
     client: Redis = None
-    cache: RedisBackend = None
+    cache: TieredCache = None
 
 
 ioredis = OzonCache()
@@ -44,5 +294,5 @@ async def get_redis() -> Redis:
     return ioredis.client
 
 
-async def get_cache() -> RedisBackend:
+async def get_cache() -> TieredCache:
     return ioredis.cache
@@ -0,0 +1,31 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import logging
+from .cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTags:
+    """
+    Version by model of the caches tagged with it, read by the web-client from the
+    same Redis. Each write increments the version of the model and of the any tag,
+    entries keyed with older versions are not read again and expire.
+    """
+
+    prefix = "cache_tag"
+    any_tag = "*"
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:{tag}"
+
+    async def model_changed(self, model_name: str):
+        try:
+            redis = await get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                await pipe.incr(self.tag_key(model_name)).incr(self.tag_key(self.any_tag)).execute()
+        except Exception as e:
+            logger.error(f"cache tags version error: {e}")
+
+
+cache_tags = CacheTags()
@@ -0,0 +1,61 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import hashlib
+import json
+import logging
+from datetime import datetime
+import config
+from .cache import get_cache, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CountCache:
+    """
+    Counts by model and normalised query. Each model has a version in Redis
+    that the write hooks increment, counts of older versions are not read
+    again and expire with count_cache_seconds.
+    """
+
+    prefix = "count"
+
+    def __init__(self):
+        self.expire = 0
+
+    def version_key(self, model: str) -> str:
+        return f"{self.prefix}_version:{model}"
+
+    def make_key(self, model: str, version: str, query: dict) -> str:
+        digest = hashlib.md5(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{model}:{version}:{digest}"
+
+    async def get_count(self, model: str, query: dict, counter) -> dict:
+        """
+        counter: coroutine function that counts the records on a miss
+        return count and the datetime it was computed at
+        """
+        if not self.expire:
+            self.expire = config.SettingsApp().count_cache_seconds
+        try:
+            redis = await get_redis()
+            cache = await get_cache()
+            version = await redis.get(self.version_key(model))
+            key = self.make_key(model, version.decode() if version else "0", query)
+            res = await cache.get(self.prefix, key)
+        except Exception as e:
+            logger.error(f"count cache get error: {e}")
+            return {"count": await counter(), "at": datetime.now().isoformat()}
+        if res is False:
+            res = {"count": await counter(), "at": datetime.now().isoformat()}
+            await cache.set(self.prefix, key, res, expire=self.expire)
+        return res
+
+    async def model_changed(self, model_name: str):
+        try:
+            redis = await get_redis()
+            await redis.incr(self.version_key(model_name))
+        except Exception as e:
+            logger.error(f"count cache version error: {e}")
+
+
+count_cache = CountCache()
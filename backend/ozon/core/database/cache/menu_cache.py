@@ -0,0 +1,51 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import logging
+import config
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+
+class MenuCache:
+    """
+    Menu read models by role, all dropped when an action or a menu_group changes.
+    """
+
+    prefix = "menu"
+    models = ["action", "menu_group"]
+
+    def __init__(self):
+        self.expire = 0
+
+    async def get(self, key: str):
+        try:
+            cache = await get_cache()
+            return await cache.get(self.prefix, key)
+        except Exception as e:
+            logger.error(f"menu cache get error: {e}")
+            return False
+
+    async def set(self, key: str, data):
+        if not self.expire:
+            self.expire = config.SettingsApp().menu_cache_seconds
+        try:
+            cache = await get_cache()
+            await cache.set(self.prefix, key, data, expire=self.expire)
+        except Exception as e:
+            logger.error(f"menu cache set error: {e}")
+
+    async def clear(self):
+        try:
+            cache = await get_cache()
+            await cache.clear(app_code=self.prefix)
+        except Exception as e:
+            logger.error(f"menu cache clear error: {e}")
+
+    async def model_changed(self, model_name: str):
+        if model_name in self.models:
+            logger.debug(f"menu cache clear, {model_name} changed")
+            await self.clear()
+
+
+menu_cache = MenuCache()
@@ -0,0 +1,167 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import asyncio
+import logging
+from datetime import datetime
+import bson
+import config
+from pymongo import UpdateOne
+from .cache import get_cache, get_redis
+from ..mongodb.mongodb import db
+from ..mongodb.base_model import Session
+from ..mongodb.mongo_base import make_save_update, clean_session
+from ..mongodb.mongo_session import find_session_by_token
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """
+    Hot sessions are served from Redis with ttl aligned to expire_datetime.
+    New sessions are written to Mongo at once, the tokens of the changed ones are kept
+    in a Redis set and flushed in batches from the Redis copy by any worker, so pending
+    changes survive the worker. Mongo is read again when the copy is not active.
+    """
+
+    prefix = "session"
+    dirty_key = "session_dirty"
+
+    def __init__(self):
+        self.flusher = None
+        self.flush_seconds = 5
+        self.flush_batch = 500
+
+    def make_ttl(self, session: Session) -> int:
+        expire = session.expire_datetime
+        if isinstance(expire, str):
+            expire = datetime.fromisoformat(expire)
+        return int((expire - datetime.now()).total_seconds())
+
+    async def get(self, token: str):
+        if not token:
+            return False
+        try:
+            cache = await get_cache()
+            data = await cache.get(self.prefix, token)
+        except Exception as e:
+            logger.error(f"session store get error: {e}")
+            data = False
+        if data and data.get("active") and data.get("login_complete"):
+            session = Session(**data)
+            session._stored = True
+            return session
+        session = await find_session_by_token(token)
+        if session:
+            session._stored = True
+            await self.cache_session(session)
+        return session
+
+    async def cache_session(self, session: Session, dirty=False):
+        ttl = self.make_ttl(session)
+        if ttl <= 0 or not session.token:
+            return
+        try:
+            cache = await get_cache()
+            await cache.set(self.prefix, session.token, session.get_dict(), expire=ttl)
+            if dirty:
+                redis = await get_redis()
+                await redis.sadd(self.dirty_key, session.token)
+        except Exception as e:
+            logger.error(f"session store set error: {e}")
+
+    async def save(self, session: Session, flush=False):
+        if session.active and session._stored and not flush:
+            await self.cache_session(session, dirty=True)
+            return
+        coll = db.engine.get_collection(Session.str_name())
+        await coll.bulk_write([self.make_update(session.get_dict(), upsert=not session._stored)])
+        session._stored = True
+        if session.active:
+            await self.cache_session(session)
+        else:
+            # logout and expiry, evicted after the write so the other workers read it from Mongo
+            await self.evict([session.token])
+
+    def make_update(self, data: dict, upsert=False) -> UpdateOne:
+        # only new sessions are inserted, a session removed from Mongo is not written again
+        domain = {"_id": bson.ObjectId(data['id'])}
+        return UpdateOne(domain, make_save_update(data, domain), upsert=upsert)
+
+    async def flush(self):
+        done = 0
+        try:
+            redis = await get_redis()
+            cache = await get_cache()
+        except Exception as e:
+            logger.error(f"session store flush error: {e}")
+            return done
+        coll = db.engine.get_collection(Session.str_name())
+        while True:
+            tokens = await redis.spop(self.dirty_key, self.flush_batch)
+            if not tokens:
+                break
+            tokens = [token.decode() if isinstance(token, bytes) else token for token in tokens]
+            # expired or evicted sessions are not in Redis anymore
+            todo = [data for data in await cache.mget(self.prefix, tokens) if data]
+            try:
+                if todo:
+                    await coll.bulk_write([self.make_update(data) for data in todo], ordered=False)
+                done += len(todo)
+            except Exception as e:
+                logger.error(f"session store flush error: {e}")
+                await redis.sadd(self.dirty_key, *[data['token'] for data in todo])
+                break
+            if len(tokens) < self.flush_batch:
+                break
+        logger.debug(f"session store flushed {done} sessions")
+        return done
+
+    async def evict(self, tokens: list):
+        tokens = [token for token in tokens if token]
+        if not tokens:
+            return
+        try:
+            cache = await get_cache()
+            redis = await get_redis()
+            await cache.delete(self.prefix, tokens)
+            await redis.srem(self.dirty_key, *tokens)
+        except Exception as e:
+            logger.error(f"session store evict error: {e}")
+
+    async def evict_query(self, query: dict):
+        coll = db.engine.get_collection(Session.str_name())
+        await self.evict(await coll.distinct("token", query))
+
+    async def evict_docs(self, docs: list):
+        await self.evict([doc.get("token") for doc in docs])
+
+    async def clean(self, date_expire, batch_size=1000) -> int:
+        return await clean_session(date_expire, batch_size=batch_size, on_batch=self.evict_docs)
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"session store flusher error: {e}")
+
+
+session_store = SessionStore()
+
+
+async def init_session_store():
+    settings = config.SettingsApp()
+    session_store.flush_seconds = settings.session_flush_seconds
+    session_store.flush_batch = settings.session_flush_batch
+    if not session_store.flusher:
+        session_store.flusher = asyncio.create_task(session_store.run_flusher())
+        logger.info("session store flusher started")
+
+
+async def stop_session_store():
+    if session_store.flusher:
+        session_store.flusher.cancel()
+        session_store.flusher = None
+    await session_store.flush()
+    logger.info("session store stopped")
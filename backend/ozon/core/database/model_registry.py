@@ -0,0 +1,121 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import asyncio
+import logging
+import ujson
+import config
+from .cache.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledModel:
+    def __init__(self, model_name: str, version: str, mm):
+        self.model_name = model_name
+        self.version = version
+        self.model = mm.model
+        self.unique_fields = mm.unique_fields[:]
+        self.no_clone_field_keys = mm.no_clone_field_keys.copy()
+        self.computed_fields = mm.computed_fields.copy()
+        self.create_task_action = mm.create_task_action.copy()
+
+
+class ModelRegistry:
+    """
+    Per worker registry of the models generated from components,
+    key is the component rec_name, version is the component update_datetime.
+    Workers are kept in sync through Redis pub/sub on component write.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.listener = None
+        self.channel = ""
+
+    @staticmethod
+    def make_version(component) -> str:
+        if not component.update_datetime:
+            return ""
+        return str(component.update_datetime)
+
+    def get(self, model_name: str):
+        return self.models.get(model_name)
+
+    def add(self, model_name: str, component, mm) -> CompiledModel:
+        compiled = CompiledModel(model_name, self.make_version(component), mm)
+        self.models[model_name] = compiled
+        logger.debug(f"registry add {model_name} version: {compiled.version}")
+        return compiled
+
+    def invalidate(self, model_name: str, version: str = ""):
+        compiled = self.models.get(model_name)
+        if not compiled:
+            return False
+        if version and compiled.version == version:
+            return False
+        self.models.pop(model_name, None)
+        logger.info(f"registry invalidate {model_name} version: {compiled.version} -> {version}")
+        return True
+
+    def clear(self):
+        self.models = {}
+
+    async def publish_invalidate(self, model_name: str, version: str = ""):
+        self.invalidate(model_name, version)
+        redis = await get_redis()
+        if not redis or not self.channel:
+            return
+        try:
+            await redis.publish(
+                self.channel, ujson.dumps({"model": model_name, "version": version}))
+        except Exception as e:
+            logger.error(f"registry publish {model_name} error: {e}")
+
+    def handle_message(self, message):
+        if not message or not message.get("type") == "message":
+            return
+        data = message.get("data")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        try:
+            msg = ujson.loads(data)
+        except ValueError as e:
+            logger.error(f"registry invalid message {data}: {e}")
+            return
+        self.invalidate(msg.get("model", ""), msg.get("version", ""))
+
+    async def listen(self):
+        while True:
+            try:
+                redis = await get_redis()
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                logger.info(f"registry listen on {self.channel}")
+                async for message in pubsub.listen():
+                    self.handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # the local state may be stale while the channel is down
+                logger.error(f"registry listener error: {e}, retry")
+                self.clear()
+                await asyncio.sleep(5)
+
+
+model_registry = ModelRegistry()
+
+
+async def init_model_registry():
+    settings = config.SettingsApp()
+    model_registry.channel = f"{settings.app_code}:model_registry"
+    if not model_registry.listener:
+        model_registry.listener = asyncio.create_task(model_registry.listen())
+        logger.info("model registry listener started")
+
+
+async def stop_model_registry():
+    if model_registry.listener:
+        model_registry.listener.cancel()
+        model_registry.listener = None
+    model_registry.clear()
+    logger.info("model registry stopped")
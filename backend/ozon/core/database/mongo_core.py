@@ -3,7 +3,11 @@
 from .mongodb.base_model import *
 from .mongodb.mongo_base import *
 from .mongodb.mongo_session import *
+from .mongodb.mongo_index import (
+    index_ledger, ensure_model_indexes, ensure_ttl_indexes, make_ttl_indexes, make_index_name)
+from .mongodb.mongo_sequence import sequence_allocator, reserve_sequence, next_sequence
 from .create_model import ModelMaker
+from .model_registry import model_registry
 
 
 
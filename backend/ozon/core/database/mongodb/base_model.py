@@ -3,7 +3,7 @@
 from typing import List, Optional, Dict, Any, Literal, Union
 
 from .bson_types import *
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from fastapi.encoders import jsonable_encoder
 from slugify import slugify
 from datetime import date, datetime, time, timedelta
@@ -108,7 +108,8 @@ class CoreModel(BaseModel):
         return {"_id": bson.ObjectId(self.id)}.copy()
 
     def get_dict_diff(self, to_compare_dict, ignore_fields=[], remove_ignore_fileds=True):
-        original_dict = self.dict().copy()
+        # compared in the json form of get_dict, as to_compare_dict
+        original_dict = self.get_dict()
         if ignore_fields and remove_ignore_fileds:
             [original_dict.pop(key) for key in ignore_fields if key in original_dict]
         diff = {k: v for k, v in to_compare_dict.items() if k in original_dict and not original_dict[k] == v}
@@ -277,6 +278,8 @@ class Session(CoreModel):
     active: bool = True
     default: bool = True
     demo: bool = False
+    # read from the session store, already written in Mongo
+    _stored: bool = PrivateAttr(default=False)
 
 
 def update_model(source, object_o: BasicModel, pop_form_newobject=[], model=None):
@@ -2,13 +2,16 @@
 # See LICENSE file for full licensing details.
 import json
 import sys
+import base64
+import binascii
 import config
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import bson
 import logging
 import pymongo
-from pymongo import ReadPreference
+from pymongo import ReadPreference, ReturnDocument, UpdateOne, InsertOne, ReplaceOne
+from bson.codec_options import TypeDecoder, TypeRegistry
 from .mongodb import get_database, db
 from .bson_types import *
 from .base_model import default_list_metadata_fields, default_list_metadata_fields_update
@@ -23,19 +26,43 @@ logger = logging.getLogger(__name__)
 # TODO handle update schema to test
 
 
-## TODO helper function
+class ObjectIdDecoder(TypeDecoder):
+    bson_type = bson.objectid.ObjectId
+
+    def transform_bson(self, value):
+        return str(value)
+
+
+class Decimal128Decoder(TypeDecoder):
+    bson_type = bson.decimal128.Decimal128
+
+    def transform_bson(self, value):
+        return float(value.to_decimal())
+
+
+# ObjectId and Decimal128 decoded to json types by the bson C extension,
+# datetime is a native type and is left to _data_helper
+json_type_registry = TypeRegistry([ObjectIdDecoder(), Decimal128Decoder()])
+
+json_types = {str, int, float, bool, type(None)}
+
+
+def get_json_collection(model: str):
+    coll = db.engine.get_collection(model)
+    return coll.with_options(
+        codec_options=coll.codec_options.with_options(type_registry=json_type_registry))
+
+
 def _data_helper(d):
+    # a new container is built, json scalars are copied without a call
+    if isinstance(d, dict):
+        return {k: v if type(v) in json_types else _data_helper(v) for k, v in d.items()}
+    if isinstance(d, list):  # For those db functions which return list
+        return [v if type(v) in json_types else _data_helper(v) for v in d]
     if isinstance(d, bson.objectid.ObjectId) or isinstance(d, datetime):
         return str(d)
     if isinstance(d, bson.decimal128.Decimal128):
         return float(d.to_decimal())
-    if isinstance(d, list):  # For those db functions which return list
-        return [_data_helper(x) for x in d]
-
-    if isinstance(d, dict):
-        for k, v in d.items():
-            d.update({k: _data_helper(v)})
-
     return d
 
 
@@ -71,6 +98,41 @@ def get_data_list(
     return new_list
 
 
+def path_projection(keys: list) -> dict:
+    # a path and its subpath can't be projected together
+    return {k: 1 for k in keys if not any(k.startswith(f"{parent}.") for parent in keys)}
+
+
+def make_projection(fields=[], merge_field="", row_action="", additional_key=[], remove_keys=[]):
+    """
+    Mongo projection with only the keys get_data_list needs to build the rows,
+    None if the whole document is required.
+    """
+    if fields:
+        keys = [k for k in fields if not k == "row_action"]
+        if merge_field:
+            keys.append(merge_field)
+        if row_action:
+            keys.append("rec_name")
+        if additional_key:
+            keys.append(additional_key[1])
+        return path_projection(keys)
+    needed = ["rec_name"] + additional_key[1:2]
+    exclude = {k: 0 for k in remove_keys if k not in needed}
+    return exclude or None
+
+
+def make_columns_projection(columns: list) -> dict:
+    """
+    Projection for table rows, a column is read from data_value or from the record
+    """
+    keys = ["rec_name"]
+    for col in columns:
+        if col and not col == "row_action":
+            keys += [col, f"data_value.{col}"]
+    return path_projection(keys)
+
+
 def get_bj_list_data(model, list_data):
     res = []
     for i in list_data:
@@ -139,26 +201,48 @@ async def search_distinct(model: Type[ModelType], distinct="rec_name", clausole=
     return values
 
 
-async def raw_search_by_filter(model: str, domain: dict, sort: list = [], limit=0, skip=0):
+async def raw_search_by_filter(
+        model: str, domain: dict, sort: list = [], limit=0, skip=0, projection=None, json_ready=False):
+    """
+    json_ready: ObjectId and Decimal128 are decoded as str and float
+    """
     logger.debug(
         f"search_by_filter: schema:{model}, domain:{domain}, sort:{sort}, limit:{limit}, skip:{skip}")
-    coll = db.engine.get_collection(model)
+    coll = get_json_collection(model) if json_ready else db.engine.get_collection(model)
     res = []
     if limit > 0:
-        datas = coll.find(domain).sort(sort).skip(skip).limit(limit)
+        datas = coll.find(domain, projection).sort(sort).skip(skip).limit(limit)
     elif sort:
-        datas = coll.find(domain).sort(sort)
+        datas = coll.find(domain, projection).sort(sort)
     else:
-        datas = coll.find(domain)
+        datas = coll.find(domain, projection)
     if datas:
         res = [document for document in await datas.to_list(length=None)]
     return res
 
 
-async def search_by_filter(model: Type[ModelType], domain: dict, sort: list = [], limit=0, skip=0):
+async def iter_by_filter(
+        model: str, domain: dict, sort: list = [], projection=None, batch_size=500, json_ready=False):
+    """
+    Async generator on the find cursor, documents are fetched in batches of batch_size
+    """
+    logger.debug(f"iter_by_filter: schema:{model}, domain:{domain}, sort:{sort}")
+    coll = get_json_collection(model) if json_ready else db.engine.get_collection(model)
+    cursor = coll.find(domain, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    async for document in cursor:
+        yield document
+
+
+async def search_by_filter(
+        model: Type[ModelType], domain: dict, sort: list = [], limit=0, skip=0, projection=None,
+        json_ready=False):
     logger.debug(
         f"search_by_filter: schema:{model}, domain:{domain}, sort:{sort}, limit:{limit}, skip:{skip}")
-    return await raw_search_by_filter(model.str_name(), domain=domain, sort=sort, limit=limit, skip=skip)
+    return await raw_search_by_filter(
+        model.str_name(), domain=domain, sort=sort, limit=limit, skip=skip, projection=projection,
+        json_ready=json_ready)
 
 
 async def raw_find_one(model: str, domain: dict):
@@ -191,6 +275,12 @@ async def aggregate(model: Type[ModelType], pipeline: dict, sort: list = [], lim
     return datas
 
 
+async def raw_aggregate(model: str, pipeline: list, json_ready=False) -> list:
+    logger.debug(f"raw_aggregate: schema:{model}, pipeline:{pipeline}")
+    coll = get_json_collection(model) if json_ready else db.engine.get_collection(model)
+    return await coll.aggregate(pipeline).to_list(length=None)
+
+
 async def count_by_filter(model: str, domain: dict) -> int:
     logger.debug(f"count_by_filter:{model}  - {domain}")
     coll = db.engine.get_collection(model)
@@ -201,6 +291,63 @@ async def count_by_filter(model: str, domain: dict) -> int:
     return int(val)
 
 
+async def estimated_count(model: str) -> int:
+    # from the collection metadata, the query is not applied
+    coll = db.engine.get_collection(model)
+    return int(await coll.estimated_document_count())
+
+
+## keyset pagination
+
+def keyset_sort(sort: list) -> list:
+    # _id makes the order total, so a page can start right after the last record
+    if not any(key == "_id" for key, direction in sort):
+        sort = sort + [("_id", sort[-1][1] if sort else 1)]
+    return sort
+
+
+def get_path_value(document: dict, key: str):
+    val = document
+    for part in key.split("."):
+        if not isinstance(val, dict):
+            return None
+        val = val.get(part)
+    return val
+
+
+def encode_cursor(sort: list, document: dict) -> str:
+    values = [get_path_value(document, key) for key, direction in sort]
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(sort: list, cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError) as e:
+        logger.warning(f"invalid cursor {cursor} - {e}")
+        return []
+    if not isinstance(values, list) or not len(values) == len(sort):
+        logger.warning(f"cursor {cursor} does not match sort {sort}")
+        return []
+    return [
+        bson.ObjectId(val) if key == "_id" and bson.ObjectId.is_valid(val) else val
+        for (key, direction), val in zip(sort, values)
+    ]
+
+
+def make_keyset_query(sort: list, values: list) -> dict:
+    """
+    Records after values in sort order:
+    f1 > v1 or (f1 == v1 and f2 > v2) or ... ($lt for descending keys)
+    """
+    clauses = []
+    for i, (key, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[key] = {"$gt" if direction > 0 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
 async def search_all(model: Type[ModelType], sort: list = [], limit=0, skip=0) -> List[ModelType]:
     datas = await search_by_filter(model, {}, sort=sort)
     return datas
@@ -354,61 +501,220 @@ async def search_user_by_token(model: Type[ModelType], token: str):
         return False
 
 
+def get_save_domain(record) -> dict:
+    if getattr(record, "rec_name", ""):
+        return {"rec_name": record.rec_name}
+    return record.id_domain()
+
+
+def make_save_update(candidate: dict, domain: dict, remove_meta=True) -> dict:
+    """
+    Upsert update for candidate, if remove_meta the fields in default_list_metadata_fields_update
+    are only written on insert, as get_dict_diff ignores them on update.
+    """
+    to_set = candidate.copy()
+    on_insert = {}
+    if remove_meta:
+        on_insert = {k: to_set.pop(k) for k in default_list_metadata_fields_update if k in to_set}
+    if "_id" not in domain:
+        on_insert["_id"] = bson.ObjectId(candidate['id'])
+    update = make_diff_update(to_set)
+    if on_insert:
+        update["$setOnInsert"] = on_insert
+    return update
+
+
+def make_diff_update(to_set: dict) -> dict:
+    ttl_dates, to_unset = make_ttl_dates(to_set)
+    update = {"$set": {**to_set, **ttl_dates}}
+    if to_unset:
+        update["$unset"] = to_unset
+    return update
+
+
+def make_ttl_dates(candidate: dict) -> tuple:
+    """
+    Dates of the TTL indexes, the model fields are stored as timestamp and iso string:
+    purge_at of the soft deleted records and expire_at of the sessions.
+    Return the dates to set and the ones to unset.
+    """
+    to_set = {}
+    to_unset = {}
+    deleted = candidate.get("deleted")
+    if deleted is not None:
+        if float(str(deleted)) > 0:
+            to_set["purge_at"] = datetime.fromtimestamp(float(str(deleted)), timezone.utc)
+        else:
+            to_unset["purge_at"] = ""
+    if isinstance(candidate.get("expire_datetime"), str):
+        try:
+            # naive datetimes are local time
+            to_set["expire_at"] = datetime.fromisoformat(candidate['expire_datetime']).astimezone(timezone.utc)
+        except ValueError:
+            logger.warning(f"expire_at not set, expire_datetime {candidate['expire_datetime']} is not iso")
+    return to_set, to_unset
+
+
+async def find_saved(coll, record) -> tuple:
+    """
+    Stored document of record by rec_name, else by id for a renamed record,
+    with the domain to update it.
+    """
+    domains = [record.id_domain()]
+    if getattr(record, "rec_name", ""):
+        domains.insert(0, {"rec_name": record.rec_name})
+    docs = await coll.find({"$or": domains}).to_list(length=2)
+    for domain in domains:
+        for doc in docs:
+            if all(doc.get(k) == v for k, v in domain.items()):
+                return doc, domain
+    return None, domains[0]
+
+
 async def save_record(record, remove_meta=True):
     logger.debug(f" model {type(record)}")
     model = type(record)
-
-    original = False
-    filter_key = {}
+    coll = db.engine.get_collection(model.str_name())
     candidate = record.get_dict()
-    if hasattr(record, "rec_name"):
-        original = await search_by_name(model, record.rec_name)
-        filter_key = {"rec_name": record.rec_name}
-
+    original, domain = await find_saved(coll, record)
     if not original:
-        logger.debug(f"cand_model: {model} Candidate ID: {record.id}")
-        original = await search_by_id(model, record.id)
-        filter_key = record.id_domain()
-
+        # a concurrent insert of the same rec_name is updated by the upsert
+        obj = await coll.find_one_and_update(
+            domain, make_save_update(candidate, domain, remove_meta),
+            upsert=True, return_document=ReturnDocument.AFTER)
+        return model(**obj)
+    to_save = model(**original).get_dict_diff(candidate, default_list_metadata_fields_update, remove_meta)
+    if not to_save:
+        return model(**original)
+    obj = await coll.find_one_and_update(domain, make_diff_update(to_save), return_document=ReturnDocument.AFTER)
+    logger.debug(f" executed update c ID: {candidate['id']}")
+    return model(**obj) if obj else False
+
+
+def make_bulk_op(record, mode="upsert", remove_meta=True, original=None):
+    """
+    original: stored document of record, in upsert mode only the changed fields are
+    written as in save_record, None if nothing changed
+    """
+    candidate = record.get_dict()
+    if mode in ["insert", "replace"]:
+        # the whole document is written, a purge_at to unset is not in it
+        candidate.update(make_ttl_dates(candidate)[0])
+    if mode == "insert":
+        candidate['_id'] = bson.ObjectId(candidate['id'])
+        return InsertOne(candidate)
+    domain = get_save_domain(record)
+    if mode == "replace":
+        return ReplaceOne(domain, candidate, upsert=True)
     if original:
-        return await update_record(model, original, candidate, filter_key, remove_meta)
-    else:
-        return await insert_record(model, candidate)
-
-
-async def update_record(
-        model: Type[ModelType], original: BasicModel, candidate: dict, domain: dict, remove_meta: bool):
-    coll = db.engine.get_collection(model.str_name())
-    to_save = original.get_dict_diff(candidate, default_list_metadata_fields_update, remove_meta)
-    if to_save:
-        result_save = await coll.update_one(domain, {"$set": to_save})
-        result = False
-        if result_save:
-            if to_save.get("id"):
-                to_save.pop("id")
-            logger.debug(f" executed update to {result_save.modified_count} records c ID: {candidate['id']}")
-            result = await find_one(model, domain)
-        return result
-    else:
-        return original
+        to_save = type(record)(**original).get_dict_diff(candidate, default_list_metadata_fields_update, remove_meta)
+        if not to_save:
+            return None
+        return UpdateOne({"_id": original["_id"]}, make_diff_update(to_save))
+    return UpdateOne(domain, make_save_update(candidate, domain, remove_meta), upsert=True)
+
+
+async def bulk_write_ops(model: str, ops: list, chunk_size=1000) -> dict:
+    """
+    Execute ops with unordered bulk_write in chunks of chunk_size,
+    errors are returned by position of the op in ops.
+    """
+    coll = db.engine.get_collection(model)
+    saved = 0
+    errors = {}
+    for start in range(0, len(ops), chunk_size):
+        chunk = ops[start:start + chunk_size]
+        try:
+            await coll.bulk_write(chunk, ordered=False)
+            saved += len(chunk)
+        except pymongo.errors.BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            for err in write_errors:
+                errors[start + err['index']] = err
+            saved += len(chunk) - len(write_errors)
+            logger.warning(f"bulk_write {model}: {len(write_errors)} errors on {len(chunk)} ops")
+    return {"saved": saved, "errors": errors}
+
+
+async def bulk_save_records(records: list, mode="upsert", remove_meta=True, chunk_size=1000) -> dict:
+    """
+    upsert: the stored records are read by chunks and only their changed fields are written,
+    insert and replace write the whole documents, as for an import
+    """
+    if not records:
+        return {"saved": 0, "errors": {}}
+    model = type(records[0])
+    if not mode == "upsert":
+        ops = [make_bulk_op(rec, mode=mode, remove_meta=remove_meta) for rec in records]
+        return await bulk_write_ops(model.str_name(), ops, chunk_size=chunk_size)
+    ops = []
+    rows = []
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        docs = await find_stored_docs(chunk)
+        for row, rec in enumerate(chunk, start):
+            op = make_bulk_op(rec, remove_meta=remove_meta, original=get_stored_doc(docs, rec))
+            if op is not None:
+                ops.append(op)
+                rows.append(row)
+    res = await bulk_write_ops(model.str_name(), ops, chunk_size=chunk_size)
+    # unchanged records are saved
+    return {
+        "saved": res['saved'] + len(records) - len(ops),
+        "errors": {rows[index]: err for index, err in res['errors'].items()}
+    }
 
 
-async def insert_record(model: Type[ModelType], data_dict: dict):
-    coll = db.engine.get_collection(model.str_name())
-    result_save = await coll.insert_one(data_dict)
-    result = False
-    if result_save:
-        logger.debug(f" inserted record id: {result_save.inserted_id} ")
-        result = await find_one(model, {"_id": bson.ObjectId(result_save.inserted_id)})
-    return result
+async def bulk_update_records(model: str, updates: dict, chunk_size=1000) -> dict:
+    """
+    updates: {rec_name: {field: value}}
+    """
+    ops = [UpdateOne({"rec_name": rec_name}, make_diff_update(to_set)) for rec_name, to_set in updates.items()]
+    return await bulk_write_ops(model, ops, chunk_size=chunk_size)
 
 
 async def save_all(list_data, remove_meta=True):
-    updated_list = []
-    for rec in list_data:
-        new_rec = await save_record(rec, remove_meta=remove_meta)
-        updated_list.append(new_rec)
-    return updated_list
+    res = await bulk_save_records(list_data, remove_meta=remove_meta)
+    for index, err in res['errors'].items():
+        logger.error(f"save_all: {list_data[index].rec_name} not saved - {err.get('errmsg')}")
+    saved = [rec for index, rec in enumerate(list_data) if index not in res['errors']]
+    return await find_saved_all(saved)
+
+
+async def find_stored_docs(records: list) -> dict:
+    """
+    Stored documents of records by rec_name and by id, read with one query
+    """
+    if not records:
+        return {}
+    coll = db.engine.get_collection(type(records[0]).str_name())
+    names = [rec.rec_name for rec in records if getattr(rec, "rec_name", "")]
+    domains = [{"_id": {"$in": [bson.ObjectId(rec.id) for rec in records]}}]
+    if names:
+        domains.append({"rec_name": {"$in": names}})
+    docs = {}
+    async for doc in coll.find({"$or": domains}):
+        docs[str(doc["_id"])] = doc
+        if doc.get("rec_name"):
+            docs[doc["rec_name"]] = doc
+    return docs
+
+
+def get_stored_doc(docs: dict, record):
+    # by rec_name, else by id for a renamed record, as find_saved
+    return docs.get(getattr(record, "rec_name", "") or record.id) or docs.get(record.id)
+
+
+async def find_saved_all(records: list) -> list:
+    """
+    Stored documents of records, in the order of records, by rec_name or by id
+    """
+    if not records:
+        return []
+    model = type(records[0])
+    docs = await find_stored_docs(records)
+    stored = [get_stored_doc(docs, rec) for rec in records]
+    return [model(**doc) for doc in stored if doc]
 
 
 ## delete handler
@@ -421,20 +727,19 @@ async def delete_record(record):
 
 
 async def set_to_delete_records(model: Type[ModelType], query={}):
-    # coll = db.engine.get_collection(model.str_name())
-    records = await search_by_filter(model, query)
+    coll = db.engine.get_collection(model.str_name())
     settings = config.SettingsApp()
-    for rec in records:
-        delete_at_datetime = datetime.now() + timedelta(days=settings.delete_record_after_days)
-        rec.deleted = delete_at_datetime.timestamp()
-        await engine.save(rec)
+    delete_at_datetime = datetime.now() + timedelta(days=settings.delete_record_after_days)
+    await coll.update_many(query, {"$set": {
+        "deleted": delete_at_datetime.timestamp(),
+        "purge_at": delete_at_datetime.astimezone(timezone.utc)
+    }})
     return True
 
 
 async def delete_records(model, query={}):
     coll = db.engine.get_collection(model.str_name())
-    # records = await search_by_filter(model, query)
-    coll.delete_many(query)
+    await coll.delete_many(query)
     return True
 
 
@@ -445,34 +750,79 @@ async def set_to_delete_record(schema: Type[ModelType], rec):
     return await save_record(rec, remove_meta=False)
 
 
-async def retrieve_all_to_delete(model: Type[ModelType]):
+def to_delete_query() -> dict:
     curr_timestamp = datetime.now().timestamp()
-    q = {"$and": [{"deleted": {"$gt": 0}}, {"deleted": {"$lt": curr_timestamp}}]}
-    res = await search_by_filter(model, q)
+    return {"$and": [{"deleted": {"$gt": 0}}, {"deleted": {"$lt": curr_timestamp}}]}
+
+
+async def retrieve_all_to_delete(model: Type[ModelType]):
+    res = await search_by_filter(model, to_delete_query())
     return res
 
 
-async def erese_all_to_delete_record(model: Type[ModelType]):
-    res = await retrieve_all_to_delete(model)
-    coll = db.engine.get_collection(model.str_name())
-    for rec in res:
-        if isinstance(rec, dict):
-            name = rec['rec_name']
-        else:
-            name = rec.rec_name
-        await coll.delete_one({"rec_name": name})
-    return f"removed {len(res)} records"
-
-
-async def clean_session(date_expire):
-    res_to_expire = await search_by_filter(Session, {"expire_datetime": {"$lt": date_expire}})
-    coll = db.engine.get_collection("session")
-    for item in res_to_expire:
-        await coll.delete_one({"_id": item["_id"]})
-    res = await search_by_filter(Session, {"$or": [{"active": False}, {"is_public": True}]})
-    for rec in res:
-        await coll.delete_one({"_id": rec["_id"]})
-    return f"removed {len(res) + len(res_to_expire)} records"
+async def delete_many_batched(collection_name: str, query: dict, batch_size=1000, fields=[], on_batch=None) -> int:
+    """
+    delete_many by batches of _id, each batch is a short write
+    on_batch: coroutine function called with the docs of each batch deleted, read with fields
+    """
+    coll = db.engine.get_collection(collection_name)
+    removed = 0
+    projection = dict.fromkeys(["_id", *fields], 1)
+    while True:
+        docs = [doc async for doc in coll.find(query, projection).limit(batch_size)]
+        ids = [doc["_id"] for doc in docs]
+        if not ids:
+            return removed
+        res = await coll.delete_many({"_id": {"$in": ids}})
+        removed += res.deleted_count
+        if on_batch:
+            await on_batch(docs)
+        if len(ids) < batch_size or not res.deleted_count:
+            return removed
+
+
+async def erese_all_to_delete_record(collection_name: str, batch_size=1000) -> int:
+    return await delete_many_batched(collection_name, to_delete_query(), batch_size=batch_size)
+
+
+async def set_purge_at(collection_name: str, batch_size=1000) -> int:
+    """
+    purge_at of the records soft deleted before it was written on save,
+    converted from deleted as on save
+    """
+    coll = db.engine.get_collection(collection_name)
+    query = {"deleted": {"$gt": 0}, "purge_at": {"$exists": False}}
+    modified = 0
+    while True:
+        docs = [doc async for doc in coll.find(query, {"_id": 1, "deleted": 1}).limit(batch_size)]
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": make_ttl_dates({"deleted": doc["deleted"]})[0]})
+               for doc in docs]
+        if not ops:
+            return modified
+        res = await coll.bulk_write(ops, ordered=False)
+        modified += res.modified_count
+        if len(ops) < batch_size or not res.modified_count:
+            return modified
+
+
+async def has_soft_deleted(collection_name: str) -> bool:
+    coll = db.engine.get_collection(collection_name)
+    return await coll.find_one({"deleted": {"$gt": 0}}, {"_id": 1}) is not None
+
+
+async def count_to_delete(collection_name: str) -> dict:
+    coll = db.engine.get_collection(collection_name)
+    return {
+        "to_delete": await coll.count_documents(to_delete_query()),
+        "scheduled": await coll.count_documents({"deleted": {"$gt": datetime.now().timestamp()}}),
+        "without_purge_at": await coll.count_documents({"deleted": {"$gt": 0}, "purge_at": {"$exists": False}}),
+    }
+
+
+async def clean_session(date_expire, batch_size=1000, on_batch=None) -> int:
+    # sessions saved before expire_at was written are not removed by the TTL index
+    query = {"$or": [{"expire_datetime": {"$lt": date_expire}}, {"active": False}, {"is_public": True}]}
+    return await delete_many_batched("session", query, batch_size=batch_size, fields=["token"], on_batch=on_batch)
 
 
 ## TODO handle archiviations
@@ -0,0 +1,101 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import logging
+import pymongo
+from pymongo import IndexModel
+from .mongodb import db
+
+logger = logging.getLogger(__name__)
+
+# filter and sort used by QueryEngine.default_query and the default list sort,
+# unique indexes only for the unique_fields of the model
+default_indexes = [
+    {"keys": [("deleted", 1), ("active", 1), ("list_order", 1), ("rec_name", -1)], "unique": False},
+    # TTL, soft deleted records are removed by Mongo at purge_at
+    {"keys": [("purge_at", 1)], "unique": False, "expire_after": 0},
+]
+
+# system collections without rec_name
+system_indexes = {
+    "session": [
+        {"keys": [("token", 1), ("active", 1), ("login_complete", 1)], "unique": False},
+        # TTL, expired sessions are removed by Mongo at expire_at
+        {"keys": [("expire_at", 1)], "unique": False, "expire_after": 0},
+    ]
+}
+
+
+def make_index_name(keys: list) -> str:
+    return "_".join([f"{k}_{v}" for k, v in keys])
+
+
+class IndexLedger:
+    """
+    Index already ensured for each collection, loaded from Mongo the first time
+    a collection is reconciled, only the missing indexes are then created.
+    """
+
+    def __init__(self):
+        self.collections = {}
+
+    async def load(self, collection_name: str) -> dict:
+        coll = db.engine.get_collection(collection_name)
+        info = await coll.index_information()
+        self.collections[collection_name] = {
+            name: {"key": list(val.get("key", [])), "unique": val.get("unique", False)}
+            for name, val in info.items()
+        }
+        return self.collections[collection_name]
+
+    async def ensure(self, collection_name: str, indexes: list) -> list:
+        if collection_name not in self.collections:
+            await self.load(collection_name)
+        ensured = self.collections[collection_name]
+        coll = db.engine.get_collection(collection_name)
+        created = []
+        for index in indexes:
+            name = make_index_name(index['keys'])
+            if name in ensured:
+                continue
+            try:
+                options = {"expireAfterSeconds": index['expire_after']} if "expire_after" in index else {}
+                await coll.create_indexes([IndexModel(index['keys'], name=name, unique=index['unique'], **options)])
+                ensured[name] = {"key": index['keys'], "unique": index['unique']}
+                created.append(name)
+                logger.info(f"create index {collection_name} {name}")
+            except pymongo.errors.PyMongoError as e:
+                logger.error(f"Error create index {collection_name} {name} - {e}")
+        return created
+
+    def get_ledger(self) -> dict:
+        return {k: v.copy() for k, v in self.collections.items()}
+
+    def clear(self, collection_name: str = ""):
+        if collection_name:
+            self.collections.pop(collection_name, None)
+        else:
+            self.collections = {}
+
+
+index_ledger = IndexLedger()
+
+
+def make_model_indexes(model_name: str, unique_fields: list = []) -> list:
+    if model_name in system_indexes:
+        return system_indexes[model_name][:]
+    indexes = default_indexes[:]
+    for field in unique_fields:
+        indexes.append({"keys": [(field, 1)], "unique": True})
+    return indexes
+
+
+async def ensure_model_indexes(model_name: str, unique_fields: list = []) -> list:
+    return await index_ledger.ensure(model_name, make_model_indexes(model_name, unique_fields))
+
+
+def make_ttl_indexes(model_name: str) -> list:
+    return [index for index in make_model_indexes(model_name) if "expire_after" in index]
+
+
+async def ensure_ttl_indexes(model_name: str) -> list:
+    return await index_ledger.ensure(model_name, make_ttl_indexes(model_name))
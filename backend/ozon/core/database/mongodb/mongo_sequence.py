@@ -0,0 +1,78 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import logging
+import config
+from pymongo import ReturnDocument
+from .mongodb import db
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceAllocator:
+    """
+    list_order sequences stored in the counters collection, one document for model.
+    Values are reserved with a single $inc, bulk inserts reserve a block for all
+    the records. With sequence_block_size above 1 next_value serves the single
+    inserts from a block reserved by the worker, so they contend less on the counter
+    but the list_order of records saved by different workers interleaves.
+    """
+
+    collection = "counters"
+
+    def __init__(self):
+        self.blocks = {}
+        self.seeded = set()
+        self.block_size = 0
+
+    async def seed(self, model: str):
+        # align the counter to the records already stored, once for worker
+        count = await db.engine.get_collection(model).count_documents({"deleted": 0})
+        coll = db.engine.get_collection(self.collection)
+        await coll.update_one({"_id": model}, {"$max": {"seq": count}}, upsert=True)
+        self.seeded.add(model)
+
+    async def reserve(self, model: str, size=1) -> int:
+        if model not in self.seeded:
+            await self.seed(model)
+        coll = db.engine.get_collection(self.collection)
+        res = await coll.find_one_and_update(
+            {"_id": model}, {"$inc": {"seq": size}}, upsert=True, return_document=ReturnDocument.AFTER)
+        logger.debug(f"reserve sequence {model} {res['seq'] - size} - {res['seq']}")
+        return res['seq'] - size
+
+    async def next_value(self, model: str) -> int:
+        block = self.blocks.get(model)
+        if block and block[0] < block[1]:
+            block[0] += 1
+            return block[0] - 1
+        if not self.block_size:
+            self.block_size = config.SettingsApp().sequence_block_size
+        if self.block_size <= 1:
+            return await self.reserve(model)
+        start = await self.reserve(model, self.block_size)
+        block = self.blocks.get(model)
+        if not block or block[0] >= block[1]:
+            self.blocks[model] = [start + 1, start + self.block_size]
+        return start
+
+    def clear(self, model: str = ""):
+        if model:
+            self.blocks.pop(model, None)
+            self.seeded.discard(model)
+        else:
+            self.blocks = {}
+            self.seeded = set()
+
+
+sequence_allocator = SequenceAllocator()
+
+
+async def reserve_sequence(model: str, size=1) -> int:
+    """
+    Reserve size consecutive values of the model list_order sequence, return the first one.
+    """
+    return await sequence_allocator.reserve(model, size)
+
+
+async def next_sequence(model: str) -> int:
+    return await sequence_allocator.next_value(model)
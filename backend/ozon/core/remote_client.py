@@ -0,0 +1,207 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import time
+import random
+import asyncio
+import logging
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from urllib.parse import urlsplit
+import httpx
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamUnavailable(UpstreamError):
+    pass
+
+
+class ResponseTooLarge(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Open after max_failures consecutive failures, after reset_seconds one request
+    is let through and closes it again on success.
+    """
+
+    def __init__(self, max_failures: int, reset_seconds: float):
+        self.max_failures = max_failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.max_failures:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.trial = False
+
+    def failure(self):
+        self.failures += 1
+        self.trial = False
+        if self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+
+
+class RemoteClient:
+    """
+    Outbound http requests to the upstream services, with a pooled client, a circuit
+    breaker and metrics by host. Idempotent requests are retried with jittered backoff.
+    """
+
+    retry_status = [502, 503, 504]
+
+    def __init__(self):
+        self.settings = None
+        self.clients = {}
+        self.breakers = {}
+        self.metrics = {}
+
+    def setup(self):
+        if not self.settings:
+            self.settings = config.SettingsApp()
+
+    def get_host(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_client(self, host: str) -> httpx.AsyncClient:
+        client = self.clients.get(host)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.settings.remote_max_connections,
+                max_keepalive_connections=self.settings.remote_max_keepalive_connections
+            )
+            timeout = httpx.Timeout(
+                self.settings.remote_read_timeout, connect=self.settings.remote_connect_timeout)
+            # the client is shared by all users, cookies are never stored
+            client = httpx.AsyncClient(
+                limits=limits, timeout=timeout, cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])))
+            self.clients[host] = client
+        return client
+
+    def get_breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(
+                self.settings.remote_breaker_failures, self.settings.remote_breaker_reset_seconds)
+        return breaker
+
+    def count(self, host: str, name: str, num=1):
+        host_metrics = self.metrics.get(host)
+        if host_metrics is None:
+            host_metrics = self.metrics[host] = {
+                "requests": 0, "errors": 0, "retries": 0, "rejected": 0, "too_large": 0, "time_ms": 0}
+        host_metrics[name] += num
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        raise UpstreamUnavailable if the circuit of the host is open or all the attempts failed,
+        ResponseTooLarge over remote_max_bytes, UpstreamError on the other http errors
+        """
+        self.setup()
+        host = self.get_host(url)
+        breaker = self.get_breaker(host)
+        attempts = 1 + (self.settings.remote_retries if method.upper() in ["GET", "HEAD"] else 0)
+        error = None
+        for attempt in range(attempts):
+            if not breaker.allow():
+                self.count(host, "rejected")
+                raise UpstreamUnavailable(f"{host} circuit open")
+            if attempt:
+                self.count(host, "retries")
+                await asyncio.sleep(random.uniform(0, self.settings.remote_backoff * 2 ** attempt))
+            self.count(host, "requests")
+            start = time.monotonic()
+            try:
+                res = await asyncio.wait_for(
+                    self.send(host, method, url, **kwargs), self.settings.remote_total_timeout)
+            except ResponseTooLarge:
+                self.count(host, "too_large")
+                breaker.success()
+                raise
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                error = e
+                res = None
+            except httpx.HTTPError as e:
+                # decoding, redirects and protocol errors are not retried
+                self.count(host, "errors")
+                breaker.failure()
+                raise UpstreamError(f"{url}: {e}") from e
+            except httpx.InvalidURL as e:
+                raise UpstreamError(f"{url}: {e}") from e
+            finally:
+                # a trial ended by cancellation or by an unexpected error goes to the next request
+                breaker.trial = False
+                self.count(host, "time_ms", int((time.monotonic() - start) * 1000))
+            if res is not None and res.status_code not in self.retry_status:
+                breaker.success()
+                return res
+            self.count(host, "errors")
+            breaker.failure()
+            if res is not None and attempt == attempts - 1:
+                return res
+            logger.warning(f"remote {method} {url} attempt {attempt + 1} failed: {error or res.status_code}")
+        raise UpstreamUnavailable(f"{url}: {error}")
+
+    async def send(self, host: str, method: str, url: str, **kwargs) -> httpx.Response:
+        max_bytes = self.settings.remote_max_bytes
+        client = self.get_client(host)
+        async with client.stream(method, url, **kwargs) as res:
+            if int(res.headers.get("content-length") or 0) > max_bytes:
+                raise ResponseTooLarge(f"{url} response over {max_bytes} bytes")
+            content = bytearray()
+            async for chunk in res.aiter_bytes():
+                content.extend(chunk)
+                if len(content) > max_bytes:
+                    raise ResponseTooLarge(f"{url} response over {max_bytes} bytes")
+        # content is decoded, the limit applies to the decoded size
+        headers = [(k, v) for k, v in res.headers.raw if k.lower() not in [b"content-length", b"content-encoding"]]
+        return httpx.Response(res.status_code, headers=headers, content=bytes(content), request=res.request)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients = {}
+
+    def stats(self) -> dict:
+        return {host: dict(host_metrics, circuit=self.get_breaker(host).state)
+                for host, host_metrics in self.metrics.items()}
+
+
+remote_client = RemoteClient()
+
+
+async def init_remote_client():
+    remote_client.setup()
+    logger.info("remote client ready")
+
+
+async def stop_remote_client():
+    await remote_client.close()
+    logger.info("remote client closed")
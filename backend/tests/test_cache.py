@@ -0,0 +1,139 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import asyncio
+import time
+import unittest
+from functools import partial
+import fakeredis
+import fakeredis.aioredis
+from ozon.core.database.cache.cache import TieredCache
+
+
+class TestTieredCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.aioredis.FakeRedis(server=self.server)
+        self.cache = TieredCache(self.redis, l1_ttl=60)
+
+    async def asyncTearDown(self):
+        await self.cache.stop()
+        await self.redis.close()
+
+    async def test_get_miss_returns_false(self):
+        self.assertIs(await self.cache.get("ns", "missing"), False)
+        await self.cache.set("ns", "zero", 0)
+        self.assertEqual(await self.cache.get("ns", "zero"), 0)
+        self.assertEqual(self.cache.stats()["namespaces"]["ns"]["misses"], 1)
+
+    async def test_mget(self):
+        await self.cache.set("ns", "a", {"v": 1})
+        self.cache.l1.clear()
+        await self.cache.set("ns", "b", {"v": 2})
+        self.assertEqual(await self.cache.mget("ns", ["a", "x", "b"]), [{"v": 1}, False, {"v": 2}])
+
+    async def test_cross_worker_invalidation(self):
+        other_redis = fakeredis.aioredis.FakeRedis(server=self.server)
+        other = TieredCache(other_redis, l1_ttl=60)
+        await self.cache.start()
+        await asyncio.sleep(0.05)
+        try:
+            await self.cache.set("ns", "key", "old")
+            self.assertEqual(await self.cache.get("ns", "key"), "old")
+            self.assertIn("ns:key", self.cache.l1)
+            await other.set("ns", "key", "new")
+            for i in range(20):
+                if "ns:key" not in self.cache.l1:
+                    break
+                await asyncio.sleep(0.05)
+            self.assertEqual(await self.cache.get("ns", "key"), "new")
+            await other.delete("ns", ["key"])
+            for i in range(20):
+                if "ns:key" not in self.cache.l1:
+                    break
+                await asyncio.sleep(0.05)
+            self.assertIs(await self.cache.get("ns", "key"), False)
+        finally:
+            await other_redis.close()
+
+    async def test_namespace_clear(self):
+        for i in range(1200):
+            await self.cache.set("ns", f"key{i}", i)
+        await self.cache.set("other", "key", "kept")
+        self.assertEqual(await self.cache.clear(app_code="ns"), 1200)
+        self.assertEqual(self.cache.l1_get("ns:key1"), None)
+        self.assertIs(await self.cache.get("ns", "key1"), False)
+        self.assertEqual(await self.cache.get("other", "key"), "kept")
+
+
+class TestGetOrFetch(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.aioredis.FakeRedis(server=self.server)
+        self.redis.eval = self.release
+        self.cache = TieredCache(self.redis)
+        self.calls = 0
+
+    async def asyncTearDown(self):
+        await self.redis.close()
+
+    async def release(self, script, numkeys, key, token):
+        # fakeredis runs Lua only with lupa
+        if await self.redis.get(key) == token.encode():
+            return await self.redis.delete(key)
+        return 0
+
+    async def fetch(self, value="value", delay=0.05):
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return value
+
+    async def test_concurrent_misses_fetch_once(self):
+        res = await asyncio.gather(*[
+            self.cache.get_or_fetch("ns", "key", self.fetch, expire=60) for i in range(10)])
+        self.assertEqual(res, ["value"] * 10)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.inflight, {})
+        self.assertIs(await self.redis.exists("lock:ns:key"), 0)
+
+    async def test_waits_for_lock_holder(self):
+        await self.redis.set("lock:ns:key", "other")
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            other = TieredCache(fakeredis.aioredis.FakeRedis(server=self.server))
+            await other.set("ns", "key", {"value": "other", "fresh_until": time.time() + 60})
+            await self.redis.delete("lock:ns:key")
+
+        res, _ = await asyncio.gather(
+            self.cache.get_or_fetch("ns", "key", self.fetch, expire=60), other_worker())
+        self.assertEqual(res, "other")
+        self.assertEqual(self.calls, 0)
+
+    async def test_fetches_when_lock_released_without_value(self):
+        await self.redis.set("lock:ns:key", "other")
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await self.redis.delete("lock:ns:key")
+
+        res, _ = await asyncio.gather(
+            self.cache.get_or_fetch("ns", "key", self.fetch, expire=60), other_worker())
+        self.assertEqual(res, "value")
+        self.assertEqual(self.calls, 1)
+
+    async def test_stale_value_is_returned_and_refreshed(self):
+        self.assertEqual(await self.cache.get_or_fetch("ns", "key", self.fetch, expire=0, stale=60), "value")
+        res = await self.cache.get_or_fetch(
+            "ns", "key", partial(self.fetch, "new"), expire=60, stale=60)
+        self.assertEqual(res, "value")
+        self.assertEqual(self.cache.stats()["namespaces"]["ns"]["stale_hits"], 1)
+        await asyncio.gather(*self.cache.inflight.values())
+        res = await self.cache.get_or_fetch("ns", "key", partial(self.fetch, "other"), expire=60)
+        self.assertEqual(res, "new")
+        self.assertEqual(self.calls, 2)
+
+    async def test_cache_if(self):
+        self.assertEqual(await self.cache.get_or_fetch("ns", "key", partial(self.fetch, []), cache_if=bool), [])
+        self.assertIs(await self.cache.get("ns", "key"), False)
@@ -0,0 +1,64 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import unittest
+from datetime import datetime
+from unittest import mock
+import bson
+from ozon.core.database.mongodb import mongo_base
+from ozon.core.database.mongodb.base_model import Component
+
+
+class FakeCursor:
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self.iter_docs()
+
+    async def iter_docs(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query):
+        names = [domain["rec_name"]["$in"] for domain in query["$or"] if "rec_name" in domain]
+        return FakeCursor([doc for doc in self.docs if names and doc["rec_name"] in names[0]])
+
+
+def make_component(rec_name, title):
+    return Component(rec_name=rec_name, title=title, create_datetime=datetime(2022, 1, 1))
+
+
+def stored(record):
+    doc = record.get_dict()
+    doc["_id"] = bson.ObjectId(doc["id"])
+    return doc
+
+
+class TestBulkSaveRecords(unittest.IsolatedAsyncioTestCase):
+
+    async def test_upsert_writes_changed_fields(self):
+        changed = make_component("changed", "old")
+        same = make_component("same", "same")
+        coll = FakeCollection([stored(changed), stored(same)])
+        db = mock.Mock()
+        db.engine.get_collection.return_value = coll
+        changed.title = "new"
+        records = [make_component("new", "new"), same, changed]
+        with mock.patch.object(mongo_base, "db", db), \
+                mock.patch.object(mongo_base, "bulk_write_ops", mock.AsyncMock(
+                    return_value={"saved": 1, "errors": {1: {"errmsg": "failed"}}})) as write:
+            res = await mongo_base.bulk_save_records(records)
+        ops = write.call_args[0][1]
+        self.assertEqual(len(ops), 2)
+        self.assertTrue(ops[0]._upsert)
+        self.assertEqual(ops[1]._filter, {"_id": bson.ObjectId(changed.id)})
+        self.assertEqual(ops[1]._doc["$set"], {"title": "new"})
+        self.assertFalse(ops[1]._upsert)
+        self.assertEqual(res, {"saved": 2, "errors": {2: {"errmsg": "failed"}}})
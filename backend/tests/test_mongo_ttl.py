@@ -0,0 +1,117 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+import bson
+from ozon.core.database.mongodb import mongo_base
+from ozon.core.database.mongodb.base_model import Component
+from ozon.core.database.mongodb.mongo_base import make_bulk_op, make_save_update, make_ttl_dates, set_purge_at
+
+
+class FakeCursor:
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def limit(self, size):
+        self.docs = self.docs[:size]
+        return self
+
+    def __aiter__(self):
+        return self.iter_docs()
+
+    async def iter_docs(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    def find(self, query, projection=None):
+        return FakeCursor([
+            dict(doc) for doc in self.docs.values() if float(str(doc["deleted"])) > 0 and "purge_at" not in doc])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.docs[op._filter["_id"]].update(op._doc["$set"])
+        return mock.Mock(modified_count=len(ops))
+
+
+class TestTtlDates(unittest.TestCase):
+
+    def test_purge_at_set_and_unset(self):
+        deleted = datetime(2030, 1, 2, tzinfo=timezone.utc).timestamp()
+        to_set, to_unset = make_ttl_dates({"deleted": deleted})
+        self.assertEqual(to_set, {"purge_at": datetime(2030, 1, 2, tzinfo=timezone.utc)})
+        self.assertEqual(to_unset, {})
+        to_set, to_unset = make_ttl_dates({"deleted": 0})
+        self.assertEqual(to_set, {})
+        self.assertEqual(to_unset, {"purge_at": ""})
+
+    def test_expire_at(self):
+        expire = datetime(2030, 1, 2, 10, 30)
+        to_set, to_unset = make_ttl_dates({"expire_datetime": expire.isoformat()})
+        self.assertEqual(to_set["expire_at"], expire.astimezone(timezone.utc))
+
+    def test_expire_at_skipped_on_bad_date(self):
+        self.assertEqual(make_ttl_dates({"expire_datetime": "not a date"}), ({}, {}))
+
+    def test_save_update(self):
+        doc_id = str(bson.ObjectId())
+        update = make_save_update({"id": doc_id, "rec_name": "a", "deleted": 0}, {"rec_name": "a"})
+        self.assertEqual(update["$unset"], {"purge_at": ""})
+        self.assertNotIn("purge_at", update["$set"])
+        update = make_save_update({"id": doc_id, "rec_name": "a", "deleted": 1893456000.0}, {"rec_name": "a"})
+        self.assertEqual(update["$set"]["purge_at"], datetime(2030, 1, 1, tzinfo=timezone.utc))
+        self.assertNotIn("$unset", update)
+
+
+class TestSetPurgeAt(unittest.IsolatedAsyncioTestCase):
+
+    async def test_old_timestamps_are_converted(self):
+        docs = [
+            {"_id": 1, "deleted": 1893456000.0},
+            {"_id": 2, "deleted": bson.Decimal128("1893456000.5")},
+            {"_id": 3, "deleted": 0},
+            {"_id": 4, "deleted": 1893456000, "purge_at": "kept"},
+        ]
+        coll = FakeCollection(docs)
+        db = mock.Mock()
+        db.engine.get_collection.return_value = coll
+        with mock.patch.object(mongo_base, "db", db):
+            self.assertEqual(await set_purge_at("component", batch_size=1), 2)
+        self.assertEqual(coll.docs[1]["purge_at"], datetime(2030, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(coll.docs[2]["purge_at"], datetime(2030, 1, 1, 0, 0, 0, 500000, tzinfo=timezone.utc))
+        self.assertNotIn("purge_at", coll.docs[3])
+        self.assertEqual(coll.docs[4]["purge_at"], "kept")
+
+
+class TestBulkTtlDates(unittest.TestCase):
+
+    def make_record(self, deleted):
+        return Component(rec_name="a", deleted=deleted, create_datetime=datetime.now())
+
+    def test_insert_and_replace(self):
+        for mode in ["insert", "replace"]:
+            op = make_bulk_op(self.make_record(1893456000.0), mode=mode)
+            self.assertEqual(op._doc["purge_at"], datetime(2030, 1, 1, tzinfo=timezone.utc))
+            op = make_bulk_op(self.make_record(0), mode=mode)
+            self.assertNotIn("purge_at", op._doc)
+
+    def test_upsert(self):
+        op = make_bulk_op(self.make_record(1893456000.0))
+        self.assertEqual(op._doc["$set"]["purge_at"], datetime(2030, 1, 1, tzinfo=timezone.utc))
+
+    def test_bulk_update(self):
+        updates = {"a": {"deleted": 1893456000.0}, "b": {"deleted": 0}, "c": {"list_order": 2}}
+        with mock.patch.object(mongo_base, "bulk_write_ops", mock.AsyncMock()) as write:
+            asyncio.run(mongo_base.bulk_update_records("component", updates))
+        ops = write.call_args[0][1]
+        self.assertEqual(ops[0]._doc["$set"]["purge_at"], datetime(2030, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(ops[1]._doc["$unset"], {"purge_at": ""})
+        self.assertEqual(ops[2]._doc, {"$set": {"list_order": 2}})
@@ -0,0 +1,26 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import unittest
+from unittest import mock
+from ozon.core import QueryEngine as query_module
+from ozon.core.QueryEngine import QueryEngineBase
+from ozon.core.database.mongodb.base_model import Component
+
+
+class TestCompileQuery(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.qe = QueryEngineBase.create(mock.Mock(uid="user1"))
+        query_module.query_templates.clear()
+
+    def test_literals_share_the_template(self):
+        template = self.qe.compile_query({"type": "form", "owner_uid": "_user_uid", "tags": {"$in": ["a", "b"]}})
+        other = self.qe.compile_query({"type": "resource", "owner_uid": "_user_uid", "tags": {"$in": ["c"]}})
+        self.assertIs(template, other)
+        self.assertEqual(len(query_module.query_templates), 1)
+        self.assertIsNot(self.qe.compile_query({"type": "_user_uid", "owner_uid": "x", "tags": {"$in": []}}), template)
+
+    async def test_default_query_binds_the_query_values(self):
+        await self.qe.default_query(Component, {"type": "form", "owner_uid": "_user_uid"})
+        q = await self.qe.default_query(Component, {"type": "resource", "owner_uid": "_user_uid"})
+        self.assertEqual(q, {"type": "resource", "owner_uid": "user1", "deleted": 0, "active": True})
@@ -0,0 +1,50 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import unittest
+import httpx
+from ozon.core.remote_client import RemoteClient, UpstreamError, UpstreamUnavailable
+
+
+class Settings:
+    remote_max_connections = 10
+    remote_max_keepalive_connections = 5
+    remote_read_timeout = 5
+    remote_connect_timeout = 5
+    remote_total_timeout = 5
+    remote_retries = 0
+    remote_backoff = 0
+    remote_breaker_failures = 1
+    remote_breaker_reset_seconds = 0
+    remote_max_bytes = 1024 * 1024
+
+
+class TestRemoteClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.responses = []
+        self.client = RemoteClient()
+        self.client.settings = Settings()
+        self.client.clients["http://upstream"] = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    def handler(self, request):
+        return self.responses.pop(0)
+
+    async def test_decoding_error_in_half_open_trial(self):
+        self.responses = [
+            httpx.Response(503),
+            httpx.Response(200, headers={"content-encoding": "gzip"}, stream=httpx.ByteStream(b"not gzip")),
+            httpx.Response(200, content=b"ok"),
+        ]
+        res = await self.client.get("http://upstream/data")
+        self.assertEqual(res.status_code, 503)
+        with self.assertRaises(UpstreamError) as err:
+            await self.client.get("http://upstream/data")
+        self.assertNotIsInstance(err.exception, UpstreamUnavailable)
+        breaker = self.client.get_breaker("http://upstream")
+        self.assertFalse(breaker.trial)
+        res = await self.client.get("http://upstream/data")
+        self.assertEqual(res.content, b"ok")
+        self.assertEqual(breaker.state, "closed")
@@ -0,0 +1,124 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+import fakeredis
+import fakeredis.aioredis
+from ozon.core.database.cache import session_store as store_module
+from ozon.core.database.cache.cache import TieredCache, ioredis
+from ozon.core.database.cache.session_store import SessionStore
+from ozon.core.database.mongodb.base_model import Session
+
+
+class FakeCollection:
+
+    def __init__(self):
+        self.ops = []
+        self.docs = {}
+
+    async def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+    async def distinct(self, field, query):
+        return [doc[field] for doc in self.docs.values() if all(doc.get(k) == v for k, v in query.items())]
+
+
+class FakeDb:
+
+    def __init__(self, coll):
+        self.engine = mock.Mock()
+        self.engine.get_collection.return_value = coll
+
+
+def make_session(token="tok", active=True, expire=timedelta(hours=1)):
+    return Session(
+        uid="user", token=token, active=active, login_complete=True,
+        create_datetime=datetime.now(), expire_datetime=datetime.now() + expire)
+
+
+class TestSessionStore(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+        self.cache = TieredCache(self.redis)
+        self.saved = (ioredis.client, ioredis.cache)
+        ioredis.client, ioredis.cache = self.redis, self.cache
+        self.coll = FakeCollection()
+        self.from_mongo = None
+        self.patches = [
+            mock.patch.object(store_module, "db", FakeDb(self.coll)),
+            mock.patch.object(store_module, "find_session_by_token", self.find_session_by_token),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.store = SessionStore()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        ioredis.client, ioredis.cache = self.saved
+        await self.redis.close()
+
+    async def find_session_by_token(self, token):
+        return self.from_mongo
+
+    async def test_new_session_is_inserted(self):
+        session = make_session()
+        await self.store.save(session)
+        self.assertEqual(len(self.coll.ops), 1)
+        self.assertTrue(self.coll.ops[0]._upsert)
+        self.assertTrue(session._stored)
+        cached = await self.store.get("tok")
+        self.assertEqual(cached.id, session.id)
+        self.assertTrue(cached._stored)
+
+    async def test_set_and_flush_existing_session(self):
+        session = make_session()
+        session._stored = True
+        session.app = {"breadcrumb": {"a": 1}}
+        await self.store.save(session)
+        self.assertEqual(self.coll.ops, [])
+        self.assertEqual(await self.redis.smembers(self.store.dirty_key), {b"tok"})
+        self.assertEqual(await self.store.flush(), 1)
+        op = self.coll.ops[0]
+        self.assertFalse(op._upsert)
+        self.assertEqual(op._doc["$set"]["app"], {"breadcrumb": {"a": 1}})
+        self.assertEqual(await self.redis.scard(self.store.dirty_key), 0)
+
+    async def test_flush_skips_evicted_session(self):
+        session = make_session()
+        session._stored = True
+        await self.store.save(session)
+        await self.store.evict(["tok"])
+        self.assertEqual(await self.store.flush(), 0)
+        self.assertEqual(self.coll.ops, [])
+
+    async def test_get_inactive_cached_session_reads_mongo(self):
+        await self.cache.set("session", "tok", make_session(active=False).get_dict(), expire=60)
+        self.assertIsNone(await self.store.get("tok"))
+        self.from_mongo = make_session()
+        session = await self.store.get("tok")
+        self.assertEqual(session.id, self.from_mongo.id)
+        self.assertTrue((await self.cache.get("session", "tok"))["active"])
+
+    async def test_logout_evicts_session(self):
+        session = make_session()
+        await self.store.save(session)
+        session.active = False
+        await self.store.save(session, flush=True)
+        self.assertFalse(self.coll.ops[-1]._upsert)
+        self.assertFalse(await self.cache.get("session", "tok"))
+
+    async def test_expired_session_is_not_cached(self):
+        session = make_session(expire=timedelta(seconds=-1))
+        session._stored = True
+        await self.store.save(session)
+        self.assertFalse(await self.cache.get("session", "tok"))
+        self.assertEqual(await self.redis.scard(self.store.dirty_key), 0)
+
+    async def test_evict_query(self):
+        await self.store.save(make_session())
+        self.coll.docs["1"] = {"token": "tok", "uid": "user"}
+        await self.store.evict_query({"uid": "user"})
+        self.assertFalse(await self.cache.get("session", "tok"))
@@ -15,7 +15,6 @@ import time as time_
 from settings import *
 import httpx
 
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse, JSONResponse
 
 from core.Gateway import Gateway
@@ -27,12 +26,15 @@ from core.ImportService import ImportService
 from core.SystemService import SystemService
 from core.ClientMiddleware import ClientMiddleware
 from core.OzonStaticFile import OzonStaticFile
-from fastapi.staticfiles import StaticFiles
 import ujson
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from core.cache.cache_utils import init_cache, stop_cache
 from core.cache.cache import get_cache
+from core.main.base.http_client import init_http_client, stop_http_client, http_pool_stats
+from core.themes.ThemeConfig import init_theme_registry
+from core.themes.template_cache import init_templates
+from core.main.pdf_renderer import init_pdf_renderer, stop_pdf_renderer
 
 from client_api import client_api
 from process_api import process_api
@@ -70,12 +72,17 @@ app = FastAPI(
 
 app.add_event_handler("startup", init_cache)
 app.add_event_handler("shutdown", stop_cache)
+app.add_event_handler("startup", init_http_client)
+app.add_event_handler("shutdown", stop_http_client)
+app.add_event_handler("startup", init_theme_registry)
+app.add_event_handler("startup", init_pdf_renderer)
+app.add_event_handler("shutdown", stop_pdf_renderer)
 
 app.add_middleware(
     ClientMiddleware
 )
 
-app.mount("/static", StaticFiles(directory=f"core/themes/{get_settings().theme}/static"), name="static")
+app.mount("/static", OzonStaticFile(directory=f"core/themes/{get_settings().theme}/static"), name="static")
 app.mount("/client", client_api)
 app.mount("/process", process_api)
 
@@ -85,7 +92,8 @@ async def service_status():
     """
     Ritorna lo stato del servizio
     """
-    return {"status": "live"}
+    cache = await get_cache()
+    return {"status": "live", "http_pool": http_pool_stats(), "cache": cache.stats() if cache else {}}
 
 
 @app.get("/favicon.ico", tags=["base"])
@@ -149,5 +157,6 @@ async def proxy_delete(request: Request, path: str):
 
 @app.on_event("startup")
 async def startup_event():
+    init_templates(templates.env)
     sys_service = SystemService.new(settings=get_settings(), templates=templates)
     await sys_service.check_and_init_service()
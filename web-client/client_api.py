@@ -130,6 +130,7 @@ async def client_data_table(
         "draw": data['draw'] + 1,
         "recordsTotal": res_content.get("content").get("recordsTotal"),
         "recordsFiltered": res_content.get("content").get("recordsFiltered"),
+        "cursor": res_content.get("content").get("cursor", ""),
         "data": data_list
     }
     return await gateway.complete_json_response(resp)
@@ -197,6 +198,38 @@ async def print_form(
     return response
 
 
+@client_api.post("/print/batch/{model}", tags=["base"])
+async def print_batch(
+        request: Request,
+        model: str
+):
+    """
+    Stampa in background i record in "records" in un unico documento, ritorna il job
+    """
+    gateway = Gateway.new(request=request, settings=get_settings(), templates=templates)
+    data = await gateway.load_post_request_data()
+    if isinstance(data, JSONResponse):
+        return data
+    if isinstance(data, dict):
+        data = data.get("records", [])
+    content_service = await gateway.empty_content_service()
+    return await content_service.print_batch(model, data)
+
+
+@client_api.get("/print/batch/{job_id}", tags=["base"])
+async def print_batch_result(
+        request: Request,
+        job_id: str
+):
+    """
+    Ritorna il documento del job di stampa o il suo stato
+    """
+    gateway = Gateway.new(request=request, settings=get_settings(), templates=templates)
+    await gateway.get_session()
+    content_service = await gateway.empty_content_service()
+    return await content_service.print_batch_result(job_id)
+
+
 # /client/export/
 
 @client_api.post("/export/{model}/{file_type}", tags=["base"])
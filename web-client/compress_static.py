@@ -0,0 +1,58 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+"""
+Write the .gz siblings, and the .br ones when brotli is installed, of the theme
+static files. OzonStaticFile serves them to the clients accepting the encoding.
+
+    python compress_static.py [directory]
+"""
+import gzip
+import os
+import sys
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+compress_ext = (".js", ".css", ".map", ".svg", ".json", ".html", ".txt", ".xml", ".ttf", ".eot")
+min_size = 1024
+
+
+def write_variant(path, ext, data):
+    variant = f"{path}{ext}"
+    if os.path.exists(variant) and os.path.getmtime(variant) >= os.path.getmtime(path):
+        return False
+    with open(variant, "wb") as f:
+        f.write(data)
+    return True
+
+
+def compress_static(directory):
+    done = 0
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(compress_ext):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                content = f.read()
+            if len(content) < min_size:
+                continue
+            data = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(data) < len(content) and write_variant(path, ".gz", data):
+                done += 1
+            if brotli:
+                data = brotli.compress(content, quality=11)
+                if len(data) < len(content) and write_variant(path, ".br", data):
+                    done += 1
+    return done
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        static_dir = sys.argv[1]
+    else:
+        static_dir = f"core/themes/{config.SettingsApp().theme}/static"
+    print(f"{compress_static(static_dir)} compressed files written in {static_dir}")
@@ -48,6 +48,24 @@ class SettingsApp(BaseSettings):
     builder_component_url: str = False
     basedir = file_dir
     theme: str = "italia"
+    theme_hot_reload: bool = False
+    templates_cache_size: int = 1000
+    templates_bytecode_cache: str = "ozon_jinja_cache"
+    str_templates_cache_size: int = 512
+    static_cache_size: int = 4096
+    static_stat_ttl: float = 60
+    cache_coder: str = "pickle"
+    cache_l1_size: int = 2048
+    cache_l1_ttl: float = 5
+    data_src_concurrency: int = 8
+    data_src_stale_seconds: int = 3600
+    data_src_cache_seconds: int = 86400
+    pdf_workers: int = 2
+    pdf_queue_size: int = 20
+    pdf_queue_timeout: float = 30
+    pdf_cache_dir: str = "ozon_pdf_cache"
+    pdf_cache_size_mb: int = 512
+    pdf_batch_max_records: int = 200
     report_footer_company: str = ""
     report_footer_title: str = ""
     report_footer_sub_title: str = ""
@@ -60,6 +78,12 @@ class SettingsApp(BaseSettings):
     admins: list = []
     demo: int = 0
     api_user_key: str = ""
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30
+    http_connect_timeout: float = 10
+    http_timeout: float = 0
+    http2: bool = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1,13 +1,16 @@
 # Copyright INRIM (https://www.inrim.eu)
 # See LICENSE file for full licensing details.
+import copy
 import json
+import asyncio
 import sys
 from typing import Optional
+from functools import partial
 
 import requests
 
 from fastapi import FastAPI, Request, Header, HTTPException, Depends
-from fastapi.responses import RedirectResponse, FileResponse
+from fastapi.responses import RedirectResponse, FileResponse, Response
 from .main.widgets_table_form import TableFormWidget
 from .main.widgets_table import TableWidget
 from .main.widgets_form import FormIoWidget
@@ -24,14 +27,15 @@ from .FormIoBuilder import FormIoBuilder
 import httpx
 import logging
 import ujson
-import pdfkit
+from .main.pdf_renderer import pdf_renderer, PdfQueueFull
 from html2docx import html2docx
-from datetime import datetime, timedelta
 import aiofiles
 import uuid
 from fastapi.concurrency import run_in_threadpool
 from aiopath import AsyncPath
 from core.cache.cache import get_cache
+from core.cache.cache_tags import cache_tags
+from starlette.background import BackgroundTask
 
 logger = logging.getLogger(__name__)
 
@@ -192,45 +196,70 @@ class ContentServiceBase(ContentService):
         editing = self.session.get('app').get("builder")
         if components_ext_data_src:
             cache = await get_cache()
+            limit = asyncio.Semaphore(self.local_settings.data_src_concurrency)
             for component in components_ext_data_src:
-                memc = await cache.get(
-                    "components_ext_data_src",
-                    f"{component.key}:{component.dataSrc}:{component.valueProperty}")
-                if memc and not editing:
-                    logger.info(f"use cache")
-                    component.raw = memc
+                if component.dataSrc == "url" and component.idPath:
+                    component.path_value = self.session.get(component.idPath, component.idPath)
+            versions = {}
+            if not editing:
+                versions = await cache_tags.versions(
+                    [tag for component in components_ext_data_src for tag in component.data_src_tags])
+
+            async def resolve(component):
+                async with limit:
+                    if editing:
+                        await self.fetch_data_src(component)
+                        return
+                    # lists tagged by model are kept until the model changes
+                    if component.data_src_tags:
+                        expire = self.local_settings.data_src_cache_seconds
+                    else:
+                        expire = 28800  # 8 hours
+                    values = await cache.get_or_fetch(
+                        "components_ext_data_src",
+                        f"{self.local_settings.app_code}:values:{component.data_src_key(versions)}",
+                        partial(self.fetch_data_src_values, component),
+                        expire=expire,
+                        stale=self.local_settings.data_src_stale_seconds,
+                        cache_if=lambda values: values)
+                    component.set_resource_values(values)
+
+            await asyncio.gather(*[resolve(component) for component in components_ext_data_src])
+
+    async def fetch_data_src_values(self, component):
+        # a stale refresh outlives the request, the live component is never touched
+        fetched = copy.copy(component)
+        fetched.raw = {**component.raw}
+        fetched.search_object = {**component.search_object, "values": {}}
+        await self.fetch_data_src(fetched)
+        return fetched.raw['data']['values']
+
+    async def fetch_data_src(self, component):
+        if component.dataSrc in ["resource", "form"]:
+            component.resources = await self.gateway.get_ext_submission(
+                component.resource_id, params=component.properties.copy())
+        elif component.dataSrc == "url":
+            if "http" not in component.url and "https" not in component.url:
+                url = f"{self.local_settings.service_url}{component.url}"
+                res = await self.gateway.get_remote_object(url, params=component.properties.copy())
+                if res.get("status") and res.get("status") == "error":
+                    component.resources = [{"rec_name": res.get("status"), "title": res.get("message")}]
                 else:
-                    if component.dataSrc in ["resource", "form"]:
-                        component.resources = await self.gateway.get_ext_submission(
-                            component.resource_id, params=component.properties.copy())
-                    elif component.dataSrc == "url":
-                        if component.idPath:
-                            component.path_value = self.session.get(component.idPath, component.idPath)
-                        if "http" not in component.url and "https" not in component.url:
-                            url = f"{self.local_settings.service_url}{component.url}"
-                            res = await self.gateway.get_remote_object(url, params=component.properties.copy())
-                            if res.get("status") and res.get("status") == "error":
-                                component.resources = [{"rec_name": res.get("status"), "title": res.get("message")}]
-                            else:
-                                component.resources = res.get("content", {}).get("data", [])[:]
-                        else:
-                            component.resources = await self.gateway.get_remote_data_select(
-                                component.url, component.path_value, component.header_key, component.header_value_key
-                            )
-                        if component.selectValues and component.valueProperty:
-                            if isinstance(component.resources, dict) and component.resources.get("result"):
-                                tmp_res = component.resources.copy()
-                                component.resources = []
-                                component.resources = tmp_res['result'].get(component.selectValues)
-                                component.selected_id = tmp_res['result'].get(component.valueProperty)
-                        elif component.selectValues and isinstance(component.resources, dict):
-                            component.resources = component.resources.get(component.selectValues)
-                    component.make_resource_list()
-                    if component.raw['data']['values']:
-                        await cache.set(
-                            "components_ext_data_src",
-                            f"{component.key}:{component.dataSrc}:{component.valueProperty}",
-                            component.raw, expire=28800)  # 8 hours
+                    component.resources = res.get("content", {}).get("data", [])[:]
+            else:
+                component.resources = await self.gateway.get_remote_data_select(
+                    component.url, component.path_value, component.header_key, component.header_value_key
+                )
+            if component.selectValues and component.valueProperty:
+                if isinstance(component.resources, dict) and component.resources.get("result"):
+                    tmp_res = component.resources.copy()
+                    component.resources = []
+                    component.resources = tmp_res['result'].get(component.selectValues)
+                    component.selected_id = tmp_res['result'].get(component.valueProperty)
+            elif component.selectValues and isinstance(component.resources, dict):
+                component.resources = component.resources.get(component.selectValues)
+        component.make_resource_list()
+        return component.raw
 
     async def create_folder(self, base_upload, model_data, sub_folder=""):
         form_upload = f"{base_upload}/{model_data}"
@@ -305,8 +334,7 @@ class ContentServiceBase(ContentService):
         return res
 
     # TODO from html2docx import html2docx https://pypi.org/project/html2docx/
-    async def print_form(self):
-        logger.info("print_form")
+    async def make_report(self):
         page = FormIoWidget.new(
             templates_engine=self.templates, session=self.session,
             request=self.request,
@@ -316,10 +344,6 @@ class ContentServiceBase(ContentService):
         )
         await run_in_threadpool(lambda: page.init_form(self.content.get('data').copy()))
         report_html = await run_in_threadpool(lambda: page.render_report_html())
-        dt_report = datetime.now().strftime(
-            self.local_settings.server_datetime_mask
-        )
-        file_report = f"/tmp/{page.title}_{dt_report}.pdf"
         options = {
             'page-size': 'A4',
             'margin-top': '3mm',
@@ -334,10 +358,78 @@ class ContentServiceBase(ContentService):
             'quiet': ''
         }
         options = await run_in_threadpool(lambda: page.handle_header_footer(options))
-        # logger.info(options)
-        pkit = pdfkit.PDFKit(report_html, 'string', options=options)
-        await pkit.to_pdf(file_report)
-        return FileResponse(file_report)
+        return report_html, options
+
+    def report_key(self):
+        """
+        pdf cache key, by schema version, record version, report settings and user,
+        the report can show the fields of the user and its access rights
+        """
+        data = self.content.get('data', {})
+        schema = self.content.get('schema', {})
+        record_version = data.get("update_datetime") or data.get("create_datetime")
+        if not data.get("rec_name") or not record_version:
+            return ""
+        report_settings = {
+            k: v for k, v in self.app_settings.items() if k.startswith("report_") or k == "logo_img_url"}
+        return pdf_renderer.make_key(
+            schema.get("rec_name"), schema.get("update_datetime"),
+            data.get("data_model"), data.get("rec_name"), record_version, report_settings,
+            self.session.get("user", {}).get("uid"))
+
+    async def print_form(self):
+        logger.info("print_form")
+        key = self.report_key()
+        file_report = pdf_renderer.cached(key)
+        if not file_report:
+            report_html, options = await self.make_report()
+            try:
+                file_report = await pdf_renderer.render(report_html, options, key=key)
+            except PdfQueueFull:
+                raise HTTPException(status_code=503, detail="Troppe stampe in corso, riprovare")
+        return FileResponse(file_report, background=BackgroundTask(pdf_renderer.remove, file_report))
+
+    async def print_batch(self, model, rec_names: list):
+        """
+        render the reports of rec_names in one document in background, return the job
+        """
+        logger.info(f"print_batch {model} {len(rec_names)} records")
+        max_records = self.local_settings.pdf_batch_max_records
+        if not rec_names or len(rec_names) > max_records:
+            raise HTTPException(status_code=400, detail=f"Selezionare da 1 a {max_records} record")
+
+        async def make_sources(files):
+            # run by the pdf worker, the forms are built only when a render slot is free
+            options = {}
+            for rec_name in rec_names:
+                content_service = await self.gateway.content_service_from_record(model, rec_name=rec_name)
+                report_html, rec_options = await content_service.make_report()
+                if options:
+                    pdf_renderer.clean_options(rec_options)
+                else:
+                    options = rec_options
+                file_html = f"/tmp/report_{uuid.uuid4()}.html"
+                files.append(file_html)
+                async with aiofiles.open(file_html, "w") as f:
+                    await f.write(report_html)
+            return options
+
+        try:
+            job_id = await pdf_renderer.start_job(self.gateway.token, make_sources)
+        except PdfQueueFull:
+            raise HTTPException(status_code=503, detail="Troppe stampe in corso, riprovare")
+        return await self.gateway.complete_json_response({"status": "running", "job": job_id})
+
+    async def print_batch_result(self, job_id):
+        job = await pdf_renderer.get_job(job_id)
+        if not job or not job['owner'] == self.gateway.token:
+            raise HTTPException(status_code=404)
+        if job['status'] == "done":
+            data = await pdf_renderer.get_job_pdf(job_id)
+            if data is None:
+                raise HTTPException(status_code=404)
+            return Response(content=data, media_type="application/pdf")
+        return await self.gateway.complete_json_response({"status": job['status'], "message": job['error']})
 
     # TODO FIX fast search (24/01/2022)
     async def fast_search_eval(self, data, field) -> list:
@@ -473,7 +565,10 @@ class ContentServiceBase(ContentService):
         url = f"{self.local_settings.service_url}/layout"
         if name:
             url = f"{url}?name={name}"
-        schema_layout = await self.gateway.get_remote_object(url)
+        if not name and self.gateway.page_bundle.get("layout"):
+            schema_layout = self.gateway.page_bundle['layout']
+        else:
+            schema_layout = await self.gateway.get_remote_object(url)
         layout = LayoutWidget.new(
             templates_engine=self.templates, session=self.session, request=self.request,
             settings=self.app_settings.copy(),
@@ -516,9 +611,12 @@ class ContentServiceBase(ContentService):
 
     async def eval_table(self, table, parent=""):
         logger.info(f" table --> {table.action_url}")
-        table_content = await self.gateway.get_remote_object(
-            f"{self.local_settings.service_url}{table.action_url}", params={"container_act": "y"}
-        )
+        table_content = self.gateway.page_bundle.get("tables", {}).get(table.action_url)
+        # a table that failed in the bundle is requested again on its own
+        if not table_content or table_content.get("status") == "error":
+            table_content = await self.gateway.get_remote_object(
+                f"{self.local_settings.service_url}{table.action_url}", params={"container_act": "y"}
+            )
         table_config = TableWidget.new(
             templates_engine=self.templates, session=self.session,
             request=self.gateway.request, content=table_content.get('content'),
@@ -611,6 +709,10 @@ class ContentServiceBase(ContentService):
         data['fields'] = cols_list
         data['draw'] = submitted_data['draw']
         data['query'] = submitted_data.get('query', {})
+        # optional keyset pagination and count mode, see eval_list_mode in the backend
+        for key in ["pagination", "cursor", "count_mode"]:
+            if key in submitted_data:
+                data[key] = submitted_data[key]
         return data
 
     async def process_data_table(self, list_data, submitted_data):
@@ -36,7 +36,7 @@ class ExportServiceBase(ExportService):
 
     async def export_data(self, model, file_type, data, parent=""):
         logger.info(f"export_json_list {model}, {file_type}, {data['query']}")
-        url = f"{self.local_settings.service_url}/export_data/{model}"
+        url = f"{self.local_settings.service_url}/export_data/stream/{model}"
 
         self.session = await self.gateway.get_session()
 
@@ -44,16 +44,20 @@ class ExportServiceBase(ExportService):
         if not file_type == 'json':
             data['data_mode'] = 'value'
 
-        self.content_service = await self.gateway.post_remote_object(
-            url, data, params={"parent": parent}
-        )
+        # the first line is the export head with model and schema, then one line for record
+        lines = self.gateway.stream_remote_lines(url, data, params={"parent": parent})
+        try:
+            content = await lines.__anext__()
+        except StopAsyncIteration:
+            return {"status": "error", "msg": "Errore nell'esportazione"}
+        content['data'] = []
 
         page_export = TableWidgetExport.new(
             templates_engine=self.templates, session=self.session,
             settings=self.session.get('app', {}).get("settings", self.local_settings.dict()).copy(),
-            request=self.gateway.request, content=self.content_service.get('content').copy(),
+            request=self.gateway.request, content=content,
             file_type=file_type
         )
 
-        file_obj_response = await page_export.export_data()
+        file_obj_response = await page_export.export_stream(lines)
         return file_obj_response
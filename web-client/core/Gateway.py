@@ -7,9 +7,9 @@ from fastapi.responses import RedirectResponse, JSONResponse
 from .ContentService import ContentService
 from .main.base.base_class import BaseClass, PluginBase
 from .main.base.utils_for_service import requote_uri
+from .main.base.http_client import get_http_client
 from starlette.status import HTTP_302_FOUND, HTTP_303_SEE_OTHER
 from fastapi.concurrency import run_in_threadpool
-import httpx
 import logging
 import ujson
 import re
@@ -39,6 +39,7 @@ class GatewayBase(Gateway):
         self.local_settings = settings
         self.templates = templates
         self.session = {}
+        self.page_bundle = {}
         self.token = ""
         self.is_api = False
         self.params = self.request.query_params.__dict__['_dict'].copy()
@@ -258,11 +259,14 @@ class GatewayBase(Gateway):
         logger.info(f"server_get_action {self.request.url} - modal {modal} ")
         params = self.params.copy()
         cookies = self.cookies
-        await self.get_session(params=params)
         if not modal:
-            url = f"{self.local_settings.service_url}{self.request.scope['path']}"
-            server_response = await self.get_remote_object(url, params=params, cookies=cookies)
+            server_response = await self.get_page_bundle(params=params, cookies=cookies)
+            if not server_response:
+                await self.get_session(params=params)
+                url = f"{self.local_settings.service_url}{self.request.scope['path']}"
+                server_response = await self.get_remote_object(url, params=params, cookies=cookies)
         else:
+            await self.get_session(params=params)
             url = url_action
             server_response = {}
         if (
@@ -311,6 +315,20 @@ class GatewayBase(Gateway):
         self.session = res.copy()
         return res.copy()
 
+    async def get_page_bundle(self, params={}, cookies={}):
+        """
+        session, page content, layout and embedded tables of the requested page in one call,
+        return the page content or an empty dict if the backend can not bundle the page
+        """
+        url = f"{self.local_settings.service_url}/page_bundle"
+        res = await self.get_remote_object(
+            url, params={**params, "page_path": self.request.scope['path']}, cookies=cookies)
+        if not res.get("page"):
+            return {}
+        self.session = res['session'].copy()
+        self.page_bundle = res
+        return res['page']
+
     async def get_record(self, model, rec_name=""):
         url = f"{self.local_settings.service_url}/record/{model.strip()}"
         if rec_name.strip():
@@ -436,10 +454,10 @@ class GatewayBase(Gateway):
         # logger.info(f" request headers   {self.headers}")
         logger.info(f"get_remote_object --> {url}")
 
-        async with httpx.AsyncClient(timeout=None) as client:
-            res = await client.get(
-                url=requote_uri(url), params=params, headers=self.headers, cookies=cookies
-            )
+        client = get_http_client()
+        res = await client.get(
+            url=requote_uri(url), params=params, headers=self.headers, cookies=cookies
+        )
 
         if res.status_code == 200:
             req_id = res.headers.get("req_id")
@@ -464,10 +482,10 @@ class GatewayBase(Gateway):
 
         logger.info(f"get_remote_request --> {url}")
         logger.info(f" request updated headers before  {headers}")
-        async with httpx.AsyncClient(timeout=None) as client:
-            res = await client.get(
-                url=requote_uri(url), params=params, headers=headers, cookies=cookies
-            )
+        client = get_http_client()
+        res = await client.get(
+            url=requote_uri(url), params=params, headers=headers, cookies=cookies
+        )
         if res.status_code == 200:
             logger.info(f"SUCCESS SIMPLE REMOTE REQUEST --> {url}")
             result = res.json()
@@ -486,14 +504,14 @@ class GatewayBase(Gateway):
         if not cookies:
             cookies = self.request.cookies.copy()
         logger.info(f"post_remote_object --> {url} ")
-        async with httpx.AsyncClient(timeout=None) as client:
-            res = await client.post(
-                url=requote_uri(url),
-                json=data,
-                params=params,
-                headers=self.headers,
-                cookies=cookies
-            )
+        client = get_http_client()
+        res = await client.post(
+            url=requote_uri(url),
+            json=data,
+            params=params,
+            headers=self.headers,
+            cookies=cookies
+        )
         if res.status_code == 200:
             self.remote_req_id = res.headers.get("req_id")
             if res.headers.get("apitoken"):
@@ -507,20 +525,41 @@ class GatewayBase(Gateway):
         else:
             return {}
 
+    async def stream_remote_lines(self, url, data={}, params={}, cookies={}):
+        """
+        Post data and yield the json decoded lines of the response as they arrive
+        """
+        if self.local_settings.service_url not in url:
+            url = f"{self.local_settings.service_url}{url}"
+        if not cookies:
+            cookies = self.request.cookies.copy()
+        logger.info(f"stream_remote_lines --> {url} ")
+        client = get_http_client()
+        async with client.stream(
+                "POST", url=requote_uri(url), json=data, params=params,
+                headers=self.headers, cookies=cookies
+        ) as res:
+            if not res.status_code == 200:
+                logger.warning(f"stream_remote_lines --> {url} ERROR {res.status_code} ")
+                return
+            async for line in res.aiter_lines():
+                if line:
+                    yield ujson.loads(line)
+
     async def post_remote_request(
             self, url, data={}, headers={}, params={}, cookies={}, use_app=True):
         if use_app:
             headers = self.headers.copy()
         logger.info(f"post_remote_request --> {url}")
         logger.info(f" request headers   {headers}")
-        async with httpx.AsyncClient(timeout=None) as client:
-            res = await client.post(
-                url=requote_uri(url),
-                json=data,
-                params=params,
-                headers=headers,
-                cookies=cookies
-            )
+        client = get_http_client()
+        res = await client.post(
+            url=requote_uri(url),
+            json=data,
+            params=params,
+            headers=headers,
+            cookies=cookies
+        )
         if res.status_code == 200:
             logger.info(f"SUCCESS SIMPLE POST REMOTE REQUEST --> {url}")
             result = res.json()
@@ -540,14 +579,14 @@ class GatewayBase(Gateway):
         if not cookies:
             cookies = self.request.cookies.copy()
 
-        async with httpx.AsyncClient(timeout=None) as client:
-            res = await client.post(
-                url=requote_uri(url),
-                json=data,
-                params=params,
-                headers=self.headers,
-                cookies=cookies
-            )
+        client = get_http_client()
+        res = await client.post(
+            url=requote_uri(url),
+            json=data,
+            params=params,
+            headers=self.headers,
+            cookies=cookies
+        )
         if res.status_code == 200:
             logger.info(f"delete_remote_object --> {url}  success")
             self.remote_req_id = res.headers.get("req_id")
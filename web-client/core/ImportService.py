@@ -22,6 +22,7 @@ default_list_metadata_fields = [
     "id", "owner_name", "owner_sector", "owner_sector_id", "owner_function", 'update_datetime',
     'create_datetime', "owner_mail", "update_uid",
     "owner_function_type", "sys", "demo", "deleted", "list_order", "owner_personal_type", "owner_job_title"]
+import_chunk_size = 500
 
 
 # https://github.com/TonyGermaneri/canvas-datagrid
@@ -37,7 +38,6 @@ class ImportService(MailService):
     async def import_data(self, data_model, submit_data):
         logger.info(f" {data_model}")
         res_err = []
-        res_ok = []
         self.session = await self.gateway.get_session()
 
         schema_model = await self.gateway.get_remote_object(f"/schema_model/{data_model}")
@@ -68,6 +68,8 @@ class ImportService(MailService):
                     "error": 1,
                     "error_list": [server_response]
                 }
+        saved = 0
+        to_import = []
         for row in submit_data['data']:
             row_data = {}
             for k, v in row.items():
@@ -79,16 +81,28 @@ class ImportService(MailService):
                 import_data = row_data.copy()
             else:
                 import_data = await self.form_post_handler(row_data)
-            server_response = await self.gateway.post_remote_object(f"/import/{data_model}", data=import_data)
-
-            if "error" in server_response.get('status', ""):
+            to_import.append(import_data)
+        # rows are sent in chunks, the server saves each chunk with a bulk write
+        for start in range(0, len(to_import), import_chunk_size):
+            chunk = to_import[start:start + import_chunk_size]
+            server_response = await self.gateway.post_remote_object(f"/import/{data_model}", data=chunk)
+            if "errors" not in server_response:
                 res_err.append(server_response)
-            else:
-                res_ok.append(server_response)
+                continue
+            saved += server_response.get("saved", 0)
+            for err in server_response['errors']:
+                err['row'] = start + err['row']
+                res_err.append({
+                    "status": "error",
+                    "message": err['message'],
+                    "rec_name": err['rec_name'],
+                    "row": err['row'],
+                    "model": data_model
+                })
 
         response_import = {
             "status": "done",
-            "ok": len(res_ok),
+            "ok": saved,
             "error": len(res_err),
             "error_list": res_err[:]
         }
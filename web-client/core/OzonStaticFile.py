@@ -1,16 +1,22 @@
 import importlib.util
 import os
 import stat
+import time
 import typing
 from email.utils import parsedate
 
+from collections import OrderedDict
+from email.utils import formatdate
+from hashlib import md5
+from mimetypes import guess_type
+
 import anyio
+import config
 from fastapi.staticfiles import StaticFiles
 from starlette.datastructures import URL, Headers
 from starlette.exceptions import HTTPException
 from starlette.responses import FileResponse, RedirectResponse, Response
 from starlette.types import Receive, Scope, Send
-from core.cache.cache import get_cache
 import logging
 
 PathLike = typing.Union[str, "os.PathLike[str]"]
@@ -38,7 +44,76 @@ class NotModifiedResponse(Response):
         )
 
 
+class StaticEntry:
+    def __init__(self, full_path: str, stat_result: os.stat_result, variants: dict):
+        self.full_path = full_path
+        self.stat_result = stat_result
+        self.variants = variants
+        media_type = guess_type(full_path)[0] or "text/plain"
+        if media_type.startswith("text/"):
+            media_type = f"{media_type}; charset=utf-8"
+        self.media_type = media_type
+        etag_base = f"{stat_result.st_ino}-{stat_result.st_mtime_ns}-{stat_result.st_size}"
+        self.etag = f'"{md5(etag_base.encode()).hexdigest()}"'
+        self.last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.checked_at = time.monotonic()
+
+
+class StaticFileResponse(Response):
+    """
+    File body sent with the zero copy extension when the server supports it,
+    otherwise read in chunks, from offset for length bytes.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(
+            self, path: str, headers: dict, status_code: int = 200,
+            offset: int = 0, length: int = 0, method: str = "GET"
+    ) -> None:
+        self.path = path
+        self.status_code = status_code
+        self.offset = offset
+        self.length = length
+        self.send_header_only = method.upper() == "HEAD"
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.send_header_only or not self.length:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
 class OzonStaticFile:
+    # precompressed siblings written by compress_static.py, in order of preference
+    encodings = [("br", ".br"), ("gzip", ".gz")]
+
     def __init__(
             self,
             *,
@@ -52,6 +127,12 @@ class OzonStaticFile:
         self.all_directories = self.get_directories(directory, packages)
         self.html = html
         self.config_checked = False
+        # path -> StaticEntry, stat again after static_stat_ttl seconds
+        self.stat_cache = OrderedDict()
+        settings = config.SettingsApp()
+        self.cache_size = settings.static_cache_size
+        self.stat_ttl = settings.static_stat_ttl
+        self.revalidate = settings.theme_hot_reload
         if check_dir and directory is not None and not os.path.isdir(directory):
             raise RuntimeError(f"Directory '{directory}' does not exist")
 
@@ -107,63 +188,76 @@ class OzonStaticFile:
         """
         Returns an HTTP response, given the incoming path, method and request headers.
         """
-        cache = await get_cache()
-        memc = await cache.get("static", path)
-        if not memc:
-            if scope["method"] not in ("GET", "HEAD"):
-                raise HTTPException(status_code=405)
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
 
-            try:
-                full_path, stat_result = await anyio.to_thread.run_sync(
-                    self.lookup_path, path
-                )
-            except PermissionError:
-                raise HTTPException(status_code=401)
-            except OSError:
-                raise
+        entry = self.stat_cache.get(path)
+        if entry is not None and not self.revalidate and time.monotonic() - entry.checked_at < self.stat_ttl:
+            self.stat_cache.move_to_end(path)
+            return self.file_response(entry, scope)
+
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(
+                self.lookup_path, path
+            )
+        except PermissionError:
+            raise HTTPException(status_code=401)
+        except OSError:
+            raise
+
+        if stat_result and stat.S_ISREG(stat_result.st_mode):
+            # We have a static file to serve.
+            entry = await anyio.to_thread.run_sync(self.make_entry, full_path, stat_result)
+            self.cache_entry(path, entry)
+            return self.file_response(entry, scope)
+
+        elif stat_result and stat.S_ISDIR(stat_result.st_mode) and self.html:
+            # We're in HTML mode, and have got a directory URL.
+            # Check if we have 'index.html' file to serve.
+            index_path = os.path.join(path, "index.html")
+            full_path, stat_result = await anyio.to_thread.run_sync(
+                self.lookup_path, index_path
+            )
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                if not scope["path"].endswith("/"):
+                    # Directory URLs should redirect to always end in "/".
+                    url = URL(scope=scope)
+                    url = url.replace(path=url.path + "/")
+                    return RedirectResponse(url=url)
+                entry = await anyio.to_thread.run_sync(self.make_entry, full_path, stat_result)
+                return self.file_response(entry, scope)
 
+        if self.html:
+            # Check for '404.html' if we're in HTML mode.
+            full_path, stat_result = await anyio.to_thread.run_sync(
+                self.lookup_path, "404.html"
+            )
             if stat_result and stat.S_ISREG(stat_result.st_mode):
-                # We have a static file to serve.
-                res = self.file_response(full_path, stat_result, scope)
-                await cache.set("static", path, res, expire=28800)  # 8 hours
-                return res
-
-            elif stat_result and stat.S_ISDIR(stat_result.st_mode) and self.html:
-                # We're in HTML mode, and have got a directory URL.
-                # Check if we have 'index.html' file to serve.
-                index_path = os.path.join(path, "index.html")
-                full_path, stat_result = await anyio.to_thread.run_sync(
-                    self.lookup_path, index_path
-                )
-                if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
-                    if not scope["path"].endswith("/"):
-                        # Directory URLs should redirect to always end in "/".
-                        url = URL(scope=scope)
-                        url = url.replace(path=url.path + "/")
-                        res = RedirectResponse(url=url)
-                        await cache.set("static", path, res, expire=28800)  # 8 hours
-                        return res
-                    res = self.file_response(full_path, stat_result, scope)
-                    await cache.set("static", path, res, expire=28800)  # 8 hours
-                    return res
-
-            if self.html:
-                # Check for '404.html' if we're in HTML mode.
-                full_path, stat_result = await anyio.to_thread.run_sync(
-                    self.lookup_path, "404.html"
+                return FileResponse(
+                    full_path,
+                    stat_result=stat_result,
+                    method=scope["method"],
+                    status_code=404,
                 )
-                if stat_result and stat.S_ISREG(stat_result.st_mode):
-                    return FileResponse(
-                        full_path,
-                        stat_result=stat_result,
-                        method=scope["method"],
-                        status_code=404,
-                    )
-            raise HTTPException(status_code=404)
-        else:
-            # logger.info("static cache usage")
-            res = memc
-        return res
+        raise HTTPException(status_code=404)
+
+    def make_entry(self, full_path: str, stat_result: os.stat_result) -> StaticEntry:
+        variants = {}
+        for encoding, ext in self.encodings:
+            try:
+                variant_stat = os.stat(f"{full_path}{ext}")
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            # a variant older than the file is stale
+            if variant_stat.st_mtime >= stat_result.st_mtime:
+                variants[encoding] = (f"{full_path}{ext}", variant_stat)
+        return StaticEntry(full_path, stat_result, variants)
+
+    def cache_entry(self, path: str, entry: StaticEntry):
+        self.stat_cache[path] = entry
+        self.stat_cache.move_to_end(path)
+        if len(self.stat_cache) > self.cache_size:
+            self.stat_cache.popitem(last=False)
 
     def lookup_path(
             self, path: str
@@ -183,20 +277,102 @@ class OzonStaticFile:
 
     def file_response(
             self,
-            full_path: PathLike,
-            stat_result: os.stat_result,
+            entry: StaticEntry,
             scope: Scope,
-            status_code: int = 200,
     ) -> Response:
-        method = scope["method"]
         request_headers = Headers(scope=scope)
+        full_path, stat_result, etag = entry.full_path, entry.stat_result, entry.etag
+        range_header = request_headers.get("range", "")
+        headers = {
+            "content-type": entry.media_type,
+            "last-modified": entry.last_modified,
+            "accept-ranges": "bytes",
+        }
+        if entry.variants:
+            headers["vary"] = "Accept-Encoding"
+        encoding = None
+        if entry.variants and not range_header:
+            encoding = self.select_encoding(entry, request_headers.get("accept-encoding", ""))
+        if encoding:
+            full_path, stat_result = entry.variants[encoding]
+            etag = f'{entry.etag[:-1]}-{encoding}"'
+            headers["content-encoding"] = encoding
+        headers["etag"] = etag
+        if self.is_not_modified(Headers(headers), request_headers):
+            return NotModifiedResponse(Headers(headers))
 
-        response = FileResponse(
-            full_path, status_code=status_code, stat_result=stat_result, method=method
-        )
-        if self.is_not_modified(response.headers, request_headers):
-            return NotModifiedResponse(response.headers)
-        return response
+        size = stat_result.st_size
+        offset, length, status_code = 0, size, 200
+        if_range = request_headers.get("if-range", "")
+        if range_header and (not if_range or if_range == etag):
+            byte_range = self.parse_range(range_header, size)
+            if byte_range is None:
+                return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+            if byte_range:
+                offset, end = byte_range
+                length = end - offset + 1
+                status_code = 206
+                headers["content-range"] = f"bytes {offset}-{end}/{size}"
+        headers["content-length"] = str(length)
+        return StaticFileResponse(
+            full_path, headers, status_code=status_code, offset=offset, length=length, method=scope["method"])
+
+    def parse_accept_encoding(self, accept_encoding: str) -> dict:
+        """
+        q-value of each coding of the Accept-Encoding header, 1 if not given
+        """
+        qvalues = {}
+        for token in accept_encoding.split(","):
+            coding, *params = [part.strip() for part in token.split(";")]
+            if not coding:
+                continue
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            qvalues[coding.lower()] = q
+        return qvalues
+
+    def select_encoding(self, entry: StaticEntry, accept_encoding: str):
+        """
+        Encoding of the variant with the highest q-value, the order of encodings breaks ties,
+        None to send the file as it is.
+        """
+        qvalues = self.parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+        for encoding, ext in self.encodings:
+            q = qvalues.get(encoding, qvalues.get("*", 0.0))
+            if encoding in entry.variants and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def parse_range(self, range_header: str, size: int):
+        """
+        Single byte range of the Range header, False if the header is ignored
+        and None if the range is not satisfiable.
+        """
+        unit, _, ranges = range_header.partition("=")
+        if not unit.strip() == "bytes" or "," in ranges:
+            return False
+        start, _, end = ranges.strip().partition("-")
+        try:
+            if start:
+                start = int(start)
+                end = min(int(end), size - 1) if end else size - 1
+            elif end:
+                start = max(size - int(end), 0)
+                end = size - 1
+            else:
+                return False
+        except ValueError:
+            return False
+        if start > end or start >= size:
+            return None
+        return start, end
 
     async def check_config(self) -> None:
         """
@@ -0,0 +1,30 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import logging
+from .cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTags:
+    """
+    Version by model of the cached resource lists, the backend increments the version
+    of a model and of the any tag on each write of its records.
+    """
+
+    prefix = "cache_tag"
+    any_tag = "*"
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:{tag}"
+
+    async def versions(self, tags: list) -> dict:
+        tags = list(set(tags))
+        if not tags:
+            return {}
+        redis = await get_redis()
+        res = await redis.mget([self.tag_key(tag) for tag in tags])
+        return {tag: version.decode() if version else "0" for tag, version in zip(tags, res)}
+
+
+cache_tags = CacheTags()
@@ -1,7 +1,8 @@
 import aioredis
 import config
 import logging
-from .cache import ioredis, get_redis, RedisBackend
+from .cache import ioredis, get_redis, TieredCache
+from .coder import get_coder
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +16,11 @@ async def init_cache():
             "redis://redis_cache", encoding="utf8", decode_responses=False,
             socket_keepalive=True,
         )
-        ioredis.cache = RedisBackend(ioredis.client)
+        ioredis.cache = TieredCache(
+            ioredis.client, coder=get_coder(settings.cache_coder),
+            l1_size=settings.cache_l1_size, l1_ttl=settings.cache_l1_ttl
+        )
+        await ioredis.cache.start()
         logging.info("new Redis Cache created")
     else:
         logging.info("Redis Cache  exist")
@@ -23,6 +28,8 @@ async def init_cache():
 
 async def stop_cache():
     logger.info("stopping Redis Cache...")
+    if ioredis.cache:
+        await ioredis.cache.stop()
     redis = await get_redis()
     await redis.close()
     logger.info("stopped！")
@@ -4,6 +4,9 @@ import pickle  # nosec:B403
 from decimal import Decimal
 from typing import Any
 from fastapi.encoders import jsonable_encoder
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Coder:
@@ -24,3 +27,55 @@ class PickleCoder(Coder):
     @classmethod
     def decode(cls, value: Any):
         return pickle.loads(value)  # nosec:B403
+
+
+class MsgpackCoder(Coder):
+    """
+    msgpack, values not native to msgpack (datetime, ObjectId, ...) are stored as str
+    """
+
+    @classmethod
+    def encode(cls, value: Any):
+        import msgpack
+        return msgpack.packb(value, default=str, use_bin_type=True)
+
+    @classmethod
+    def decode(cls, value: Any):
+        import msgpack
+        return msgpack.unpackb(value, raw=False)
+
+
+class OrjsonCoder(Coder):
+    """
+    orjson, values not native to json (datetime, ObjectId, ...) are stored as str
+    """
+
+    @classmethod
+    def encode(cls, value: Any):
+        import orjson
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    @classmethod
+    def decode(cls, value: Any):
+        import orjson
+        return orjson.loads(value)
+
+
+coders = {
+    "pickle": (PickleCoder, "pickle"),
+    "msgpack": (MsgpackCoder, "msgpack"),
+    "orjson": (OrjsonCoder, "orjson"),
+}
+
+
+def get_coder(name: str):
+    """
+    coder by name, pickle if the name is unknown or its package is not installed
+    """
+    coder, module = coders.get(name, coders["pickle"])
+    try:
+        __import__(module)
+    except ImportError:
+        logger.warning(f"cache coder {name} not available, use pickle")
+        coder = PickleCoder
+    return coder
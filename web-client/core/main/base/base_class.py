@@ -3,7 +3,7 @@
 
 import ujson
 from fastapi import Request
-import httpx
+from .http_client import get_http_client
 import logging
 from typing import Any, Callable, Coroutine, Dict, List, Optional, Sequence, Type, Union
 import uuid
@@ -73,15 +73,15 @@ class BaseClass(dict):
 
     @classmethod
     async def get_remote_object_json(self, url, key, headers={}, params={}, cookies={}):
-        async with httpx.AsyncClient(timeout=None) as client:
-            headers.update({"authtoken": key})
-            req = await client.get(
-                url=url, params=params, headers=headers, cookies=cookies
-            )
-            if req.status_code == 200:
-                return proxy.json()
-            else:
-                err_msg = f"response {proxy.statuscode} for url {url}"
-                logger.error(f"{err_msg} params {params} headers {headers} cookies {headers}")
-                return ujson.dumps(
-                    {"error": err_msg, "code": req.status_code}, escape_forward_slashes=False, ensure_ascii=False)
+        client = get_http_client()
+        headers = {**headers, "authtoken": key}
+        req = await client.get(
+            url=url, params=params, headers=headers, cookies=cookies
+        )
+        if req.status_code == 200:
+            return req.json()
+        else:
+            err_msg = f"response {req.status_code} for url {url}"
+            logger.error(f"{err_msg} params {params} headers {headers} cookies {cookies}")
+            return ujson.dumps(
+                {"error": err_msg, "code": req.status_code}, escape_forward_slashes=False, ensure_ascii=False)
@@ -0,0 +1,80 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import httpx
+import config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OzonHttpClient:
+    client: httpx.AsyncClient = None
+    requests: int = 0
+
+
+remote_client = OzonHttpClient()
+
+
+def make_client(settings) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry
+    )
+    timeout = httpx.Timeout(settings.http_timeout or None, connect=settings.http_connect_timeout)
+    http2 = settings.http2
+    if http2:
+        try:
+            import h2
+        except ImportError:
+            logger.warning("http2 enabled but h2 is not installed, use http/1.1")
+            http2 = False
+    # the client is shared by all users, cookies are sent per request and never stored
+    return httpx.AsyncClient(
+        limits=limits, timeout=timeout, http2=http2,
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        event_hooks={"request": [count_request]}
+    )
+
+
+async def count_request(request):
+    remote_client.requests += 1
+
+
+async def init_http_client():
+    if not remote_client.client or remote_client.client.is_closed:
+        remote_client.client = make_client(config.SettingsApp())
+        logger.info("new http client created")
+
+
+async def stop_http_client():
+    if remote_client.client:
+        await remote_client.client.aclose()
+        remote_client.client = None
+        logger.info("http client closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    if not remote_client.client or remote_client.client.is_closed:
+        remote_client.client = make_client(config.SettingsApp())
+    return remote_client.client
+
+
+def http_pool_stats() -> dict:
+    stats = {"requests": remote_client.requests, "connections": 0, "idle": 0, "http2": 0}
+    if not remote_client.client:
+        return stats
+    # the pool is read from the httpx transport internals, they change between versions
+    try:
+        pool = getattr(remote_client.client._transport, "_pool", None)
+        for conn in getattr(pool, "connections", []):
+            stats["connections"] += 1
+            if conn.is_idle():
+                stats["idle"] += 1
+            if "HTTP/2" in conn.info():
+                stats["http2"] += 1
+    except Exception as e:
+        logger.warning(f"http pool stats error: {e}")
+        return {"requests": remote_client.requests, "connections": 0, "idle": 0, "http2": 0}
+    return stats
@@ -1,11 +1,11 @@
 # Copyright INRIM (https://www.inrim.eu)
 # See LICENSE file for full licensing details.
 import copy
-from copy import deepcopy
 from formiodata.builder import Builder
 from formiodata.form import Form
 import collections
 from . import custom_components
+from .schema_cache import get_schema_copy, schema_key, get_component_tree, set_component_tree
 
 import logging
 import uuid
@@ -51,14 +51,30 @@ class CustomBuilder(Builder):
         if self.form_data.get("rec_name", "") == "":
             self.new_record = True
         # logger.info(f"builder with security {self.security_headers}")
+        self.tree_key = None
+        if isinstance(schema_json, dict):
+            theme = getattr(self.theme_cfg, "theme", "")
+            self.tree_key = schema_key(schema_json, theme)
+            # the components of a cached tree are cloned, the schema is copied to build a new one
+            if not get_component_tree(self.tree_key):
+                schema_json = get_schema_copy(schema_json, theme=theme)
         super(CustomBuilder, self).__init__(schema_json, **kwargs)
 
     def load_components(self):
         self._raw_components = self.schema.get('components')
-        self.raw_components = deepcopy(self.schema.get('components'))
+        self.raw_components = self.schema.get('components')
         # schema_type = self.schema.get('type')
-        self.main = self.get_component_object(self.schema)
-        self.main.eval_components()
+        tree = get_component_tree(self.tree_key)
+        if tree:
+            tree.copy_to(self)
+        else:
+            self.main = self.get_component_object(self.schema)
+            self.main.eval_components()
+            if self.tree_key:
+                set_component_tree(self.tree_key, ComponentTree(self))
+        for component in self.components_logic:
+            if not component.type == "table":
+                component.compute_logic_and_condition()
         self.set_model_field()
 
     def load_data(self, data):
@@ -186,6 +202,37 @@ class CustomBuilder(Builder):
         return res.copy()
 
 
+class ComponentTree:
+    """
+    Components of a form version as built by eval_components, before the request
+    logic and the model fields. Each builder works on its own clone of the tree.
+    """
+
+    # builder attributes filled by eval_components
+    builder_attrs = [
+        "components", "table_colums", "tables", "filters", "filter_keys", "search_areas",
+        "components_ext_data_src", "components_logic", "html_components", "uploaders", "uploaders_keys"
+    ]
+
+    def __init__(self, builder):
+        self.tmpe = builder.tmpe
+        self.theme_cfg = builder.theme_cfg
+        self.is_mobile = False
+        self.security_headers = {}
+        self.authtoken = ""
+        ComponentTree.copy_tree(builder, self)
+
+    @staticmethod
+    def copy_tree(source, target):
+        clones = {}
+        target.main = source.main.clone(target, clones)
+        for name in ComponentTree.builder_attrs:
+            setattr(target, name, custom_components.clone_value(getattr(source, name), target, clones))
+
+    def copy_to(self, builder):
+        ComponentTree.copy_tree(self, builder)
+
+
 class CustomForm(Form):
 
     def load_components(self):
@@ -2,12 +2,15 @@
 # See LICENSE file for full licensing details.
 import json
 import math
+import hashlib
 from collections import OrderedDict
 
 from formiodata.components import Component
 from formiodata.utils import base64_encode_url, decode_resource_template, fetch_dict_get_value
 
 from .DateEngine import DateEngine
+from core.themes.template_cache import get_str_template
+from .schema_cache import copy_raw
 import copy
 from json_logic import jsonLogic
 import re
@@ -15,13 +18,14 @@ import collections
 
 import uuid
 import logging
-import jinja2
 import re
 
 logger = logging.getLogger(__name__)
 
 
 class CustomComponent:
+    # attributes a clone does not copy, set again by clone and init_request or shared by the builder
+    clone_shared = {"raw", "builder", "security_headers", "i18n", "resources", "resources_ext"}
 
     def __init__(self, raw, builder, **kwargs):
         # TODO or provide the Builder object?
@@ -29,11 +33,9 @@ class CustomComponent:
         # super().__init__(copy.deepcopy(raw), builder, **kwargs)
 
         # TODO i18n (language, translations)
-        self.raw = copy.deepcopy(raw)
+        self.raw = copy_raw(raw)
         self.builder = builder
-        self.tmpe = builder.tmpe
-        self.theme_cfg = builder.theme_cfg
-        self.is_mobile = builder.is_mobile
+        self.init_request()
         self.default_data = {
             self.key: ""
         }
@@ -60,9 +62,7 @@ class CustomComponent:
         self.parent_key = ""
         self.component_tmp = self.raw.get('type')
         self.unique = self.raw.get('unique')
-        self.security_headers = self.builder.security_headers.copy()
         self.req_id = ''
-        self.authtoken = self.builder.authtoken
         self.language = kwargs.get('language', 'it')
         self.i18n = kwargs.get('i18n', {})
         self.clean = re.compile('<.*?>')
@@ -78,6 +78,35 @@ class CustomComponent:
         if self.resources and isinstance(self.resources, str):
             self.resources = json.loads(self.resources)
 
+    def init_request(self):
+        # state taken from the builder of the request
+        self.tmpe = self.builder.tmpe
+        self.theme_cfg = self.builder.theme_cfg
+        self.is_mobile = self.builder.is_mobile
+        self.security_headers = self.builder.security_headers.copy()
+        self.authtoken = self.builder.authtoken
+
+    def clone(self, builder, clones: dict):
+        """
+        Copy of a built component for an other builder, the children and the state
+        containers are copied, the raw is shared unless the component logic changes it.
+        """
+        component = clones.get(id(self))
+        if component is not None:
+            return component
+        component = self.__class__.__new__(self.__class__)
+        clones[id(self)] = component
+        state = self.__dict__.copy()
+        for name, val in self.__dict__.items():
+            if isinstance(val, (CustomComponent, list, dict, set)) and name not in self.clone_shared:
+                state[name] = clone_value(val, builder, clones)
+        if self.has_logic or self.has_conditions:
+            state['raw'] = copy_raw(self.raw)
+        state['builder'] = builder
+        component.__dict__ = state
+        component.init_request()
+        return component
+
     def init_filter(self):
         self.search_object = {}
 
@@ -366,9 +395,10 @@ class CustomComponent:
         ):
             self.builder.filters.append(self)
             self.builder.filter_keys.append(self.key)
+        # the logic depends on the request, the builder computes it on its own copy
         if self.has_logic or self.has_conditions:
             self.builder.components_logic.append(self)
-        if not self.type == "table":
+        elif not self.type == "table":
             self.compute_logic_and_condition()
 
     def compute_data(self):
@@ -380,6 +410,19 @@ class CustomComponent:
             component.load_data()
 
 
+def clone_value(value, builder, clones: dict):
+    if isinstance(value, CustomComponent):
+        return value.clone(builder, clones)
+    if isinstance(value, list):
+        return [item.clone(builder, clones) if isinstance(item, CustomComponent) else item for item in value]
+    res = value.copy()
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, CustomComponent):
+                res[key] = item.clone(builder, clones)
+    return res
+
+
 # global
 class layoutComponent(CustomComponent):
     def eval_components(self):
@@ -629,6 +672,26 @@ class selectComponent(CustomComponent):
             self.header_key = self.raw.get('data', {}).get("headers", {})[0].get('key')
             self.header_value_key = self.raw.get('data', {}).get("headers", [])[0].get('value')
 
+    @property
+    def data_src_tags(self):
+        """
+        models the resource list is read from, for a local url without a model any model
+        """
+        if self.dataSrc in ["resource", "form"]:
+            return [self.resource_id]
+        if self.dataSrc == "url" and "http" not in self.url:
+            return [self.properties.get("model") or "*"]
+        return []
+
+    def data_src_key(self, versions: dict) -> str:
+        query = {
+            "resource": self.resource_id, "url": self.url, "path_value": self.path_value,
+            "properties": self.properties, "selectValues": self.selectValues, "template": self.raw.get("template")
+        }
+        digest = hashlib.md5(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()
+        tags = ",".join(f"{tag}.{versions.get(tag, '0')}" for tag in self.data_src_tags)
+        return f"{self.key}:{self.dataSrc}:{self.valueProperty}:{digest}:{tags}"
+
     def make_resource_list(self):
         resource_list = self.resources
         self.raw['data'] = {"values": []}
@@ -645,6 +708,10 @@ class selectComponent(CustomComponent):
                 "value": iid
             })
 
+    def set_resource_values(self, values: list):
+        self.raw['data'] = {"values": values}
+        self.search_object['values'].update({item['value']: item['label'] for item in values})
+
     @property
     def value_label(self):
         # value = self.raw['value']
@@ -1175,7 +1242,7 @@ class contentComponent(CustomComponent):
             self.builder.main.form_data[self.key] = ""
             context = {"form": form_o, "user": user_o, "app": data_o}
             val = self.raw.get('html', "")
-            template = jinja2.Template(val)
+            template = get_str_template(val)
             self.builder.main.form_data[self.key] = template.render(context)
 
 
@@ -1610,7 +1677,6 @@ class tableComponent(CustomComponent):
         self.meta_keys = []
         self.hide_keys = []
         self.columns = {}
-        self.responsive = self.is_mobile
         self.row_id = 0
         self.sort_dir = {
             1: "asc",
@@ -1621,6 +1687,10 @@ class tableComponent(CustomComponent):
         }
 
 
+    def init_request(self):
+        super().init_request()
+        self.responsive = self.is_mobile
+
     def make_config_new(self, component, disabled=False, cls_width=" "):
         cfg = super(tableComponent, self).make_config_new(
             component, disabled=disabled, cls_width=cls_width
@@ -0,0 +1,236 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import os
+import glob
+import uuid
+import json
+import asyncio
+import hashlib
+import tempfile
+import logging
+import pdfkit
+import aiofiles
+import config
+from fastapi.concurrency import run_in_threadpool
+from core.cache.cache import get_cache, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class PdfQueueFull(Exception):
+    pass
+
+
+class PdfRenderer:
+    """
+    wkhtmltopdf renders run by a bounded pool of workers fed by a queue, callers wait
+    for a free slot up to pdf_queue_timeout. Rendered pdf are kept in a content addressed
+    cache dir, the least recently used are removed over pdf_cache_size_mb.
+    The html of a batch is built by the worker that renders it, the batch pdf is kept
+    in Redis so any worker of the service can return it.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.workers = []
+        self.pending = {}
+        self.tasks = {}
+        self.job_expire = 3600
+        self.cache_dir = ""
+        self.max_bytes = 0
+        self.queue_timeout = 30
+        self.templates_hash = ""
+
+    async def start(self):
+        settings = config.SettingsApp()
+        self.cache_dir = settings.pdf_cache_dir
+        if not os.path.isabs(self.cache_dir):
+            self.cache_dir = os.path.join(tempfile.gettempdir(), self.cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = settings.pdf_cache_size_mb * 1024 * 1024
+        self.queue_timeout = settings.pdf_queue_timeout
+        self.templates_hash = self.make_templates_hash(settings.theme)
+        self.queue = asyncio.Queue(maxsize=settings.pdf_queue_size)
+        self.workers = [asyncio.create_task(self.worker()) for i in range(settings.pdf_workers)]
+        logger.info(f"pdf renderer started with {settings.pdf_workers} workers")
+
+    async def stop(self):
+        for task in self.workers:
+            task.cancel()
+        self.workers = []
+        logger.info("pdf renderer stopped")
+
+    def make_templates_hash(self, theme: str) -> str:
+        digest = hashlib.md5()
+        for name in sorted(glob.glob(f"{os.path.realpath('.')}/core/themes/{theme}/templates/reports/*")):
+            with open(name, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def make_key(self, *parts) -> str:
+        """
+        parts identify the pdf content, the report templates are always part of the key
+        """
+        return hashlib.sha256(
+            json.dumps([self.templates_hash, *parts], sort_keys=True, default=str).encode()).hexdigest()
+
+    def cached(self, key: str) -> str:
+        path = f"{self.cache_dir}/{key}.pdf"
+        if key and os.path.isfile(path):
+            os.utime(path)
+            return path
+        return ""
+
+    async def render(self, sources, options: dict, key="") -> str:
+        """
+        sources: html string or list of html files rendered in one document,
+        return the path of the pdf, cached under key if given
+        """
+        path = self.cached(key)
+        if path:
+            return path
+        if key and key in self.pending:
+            return await asyncio.shield(self.pending[key])
+        future = await self.submit(sources, options, key=key)
+        return await asyncio.shield(future)
+
+    async def submit(self, sources, options: dict, key="") -> asyncio.Future:
+        """
+        queue a render, raise PdfQueueFull if no slot is free within pdf_queue_timeout.
+        sources may be a coroutine function filling a list of html files and returning
+        the options, it is run by the worker.
+        """
+        future = asyncio.get_event_loop().create_future()
+        if key:
+            self.pending[key] = future
+        try:
+            await asyncio.wait_for(self.queue.put((key, sources, options, future)), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(key, None)
+            # for the callers waiting the same key
+            future.set_exception(PdfQueueFull())
+            future.exception()
+            raise PdfQueueFull()
+        return future
+
+    async def worker(self):
+        while True:
+            key, sources, options, future = await self.queue.get()
+            files = []
+            try:
+                if callable(sources):
+                    options = await sources(files)
+                    sources = files
+                path = await self.write_pdf(key, sources, options)
+                if not future.done():
+                    future.set_result(path)
+            except Exception as e:
+                logger.error(f"pdf render error: {e}", exc_info=True)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.pending.pop(key, None)
+                self.clean_options(options or {})
+                for name in files:
+                    if os.path.exists(name):
+                        os.remove(name)
+                self.queue.task_done()
+
+    async def write_pdf(self, key: str, sources, options: dict) -> str:
+        name = key or f"nocache_{uuid.uuid4()}"
+        path = f"{self.cache_dir}/{name}.pdf"
+        tmp_path = f"{self.cache_dir}/{name}.tmp{uuid.uuid4()}"
+        source_type = "string" if isinstance(sources, str) else "file"
+        try:
+            pkit = pdfkit.PDFKit(sources, source_type, options=options)
+            await pkit.to_pdf(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        await run_in_threadpool(self.evict)
+        return path
+
+    def clean_options(self, options: dict):
+        # header and footer are temp files written by FormIoWidget.handle_header_footer
+        for opt in ["header-html", "footer-html"]:
+            if options.get(opt) and os.path.exists(options[opt]):
+                os.remove(options[opt])
+
+    def evict(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pdf"):
+                stat_result = entry.stat()
+                files.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+                total += stat_result.st_size
+        if total <= self.max_bytes:
+            return
+        for mtime, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def remove(self, path: str):
+        if path and os.path.exists(path) and os.path.basename(path).startswith("nocache_"):
+            os.remove(path)
+
+    async def new_job(self, owner: str) -> str:
+        job_id = str(uuid.uuid4())
+        await self.set_job(job_id, {"status": "running", "owner": owner, "error": ""})
+        return job_id
+
+    async def set_job(self, job_id: str, job: dict):
+        # jobs are shared by the workers of the service
+        cache = await get_cache()
+        await cache.set("pdf_job", job_id, job, expire=self.job_expire)
+
+    async def get_job(self, job_id: str) -> dict:
+        cache = await get_cache()
+        return await cache.get("pdf_job", job_id) or {}
+
+    async def get_job_pdf(self, job_id: str):
+        redis = await get_redis()
+        return await redis.get(f"pdf_job_file:{job_id}")
+
+    async def run_job(self, job_id: str, owner: str, future: asyncio.Future):
+        path = ""
+        try:
+            path = await future
+            async with aiofiles.open(path, "rb") as f:
+                data = await f.read()
+            redis = await get_redis()
+            await redis.set(f"pdf_job_file:{job_id}", data, ex=self.job_expire)
+            await self.set_job(job_id, {"status": "done", "owner": owner, "error": ""})
+        except Exception as e:
+            logger.error(f"pdf batch {job_id} error: {e}", exc_info=True)
+            await self.set_job(job_id, {"status": "error", "owner": owner, "error": str(e)})
+        finally:
+            self.tasks.pop(job_id, None)
+            self.remove(path)
+
+    async def start_job(self, owner: str, make_sources) -> str:
+        """
+        make_sources: coroutine function filling the list of html files of the batch document,
+        returns the pdf options. Raise PdfQueueFull if the pool has no free slot.
+        """
+        future = await self.submit(make_sources, {})
+        job_id = await self.new_job(owner)
+        self.tasks[job_id] = asyncio.create_task(self.run_job(job_id, owner, future))
+        return job_id
+
+
+pdf_renderer = PdfRenderer()
+
+
+async def init_pdf_renderer():
+    await pdf_renderer.start()
+
+
+async def stop_pdf_renderer():
+    await pdf_renderer.stop()
@@ -0,0 +1,84 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import copy
+import pickle
+import threading
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pickled form schemas by (rec_name, update_datetime, theme), never handed out directly
+compiled_schemas = OrderedDict()
+compiled_schemas_size = 256
+# the forms are built in the threadpool too
+compiled_schemas_lock = threading.Lock()
+
+# built component trees by the same key, cloned by each builder
+component_trees = OrderedDict()
+component_trees_size = 256
+
+# keys holding the raw of child components, a component copies only its own level
+child_keys = ["components", "columns"]
+
+
+def schema_key(schema: dict, theme: str):
+    if not schema.get("rec_name") or not schema.get("update_datetime"):
+        return None
+    return (schema['rec_name'], str(schema['update_datetime']), theme)
+
+
+def get_schema_copy(schema: dict, theme="") -> dict:
+    """
+    Private copy of the form schema for a builder, built from the compiled schema
+    of the same version of the component.
+    """
+    key = schema_key(schema, theme)
+    blob = None
+    if key:
+        with compiled_schemas_lock:
+            blob = compiled_schemas.get(key)
+            if blob is not None:
+                compiled_schemas.move_to_end(key)
+    if blob is None:
+        blob = pickle.dumps(schema, protocol=pickle.HIGHEST_PROTOCOL)
+        if key:
+            with compiled_schemas_lock:
+                compiled_schemas[key] = blob
+                if len(compiled_schemas) > compiled_schemas_size:
+                    compiled_schemas.popitem(last=False)
+    return pickle.loads(blob)
+
+
+def get_component_tree(key):
+    if not key:
+        return None
+    with compiled_schemas_lock:
+        tree = component_trees.get(key)
+        if tree is not None:
+            component_trees.move_to_end(key)
+    return tree
+
+
+def set_component_tree(key, tree):
+    if not key:
+        return tree
+    with compiled_schemas_lock:
+        tree = component_trees.setdefault(key, tree)
+        component_trees.move_to_end(key)
+        if len(component_trees) > component_trees_size:
+            component_trees.popitem(last=False)
+    return tree
+
+
+def copy_raw(raw: dict) -> dict:
+    """
+    Copy the raw of a component, child components raw are not copied because each
+    child copies its own when it is created.
+    """
+    own = {key: val for key, val in raw.items() if not (key in child_keys and isinstance(val, list))}
+    try:
+        own = pickle.loads(pickle.dumps(own, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        own = copy.deepcopy(own)
+    return raw.__class__((key, own[key] if key in own else raw[key][:]) for key in raw)
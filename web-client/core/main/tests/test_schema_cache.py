@@ -0,0 +1,33 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+from .base_test import CommonTestCase
+from core.main import schema_cache
+from core.main.builder_custom import CustomBuilder
+
+
+class SchemaCacheTestCase(CommonTestCase):
+
+    def _builder(self, security_headers):
+        return CustomBuilder(
+            self.schema, template_engine=self.templates,
+            disabled=False, settings=self.settings, context={}, authtoken=self.authtoken,
+            rec_name=self.rec_name, model=self.model, theme_cfg=self.theme_cfg, is_mobile=self.is_mobile,
+            editable_fields=self.editable_fields, security_headers=security_headers, action_url="/action"
+        )
+
+    def test_builders_clone_the_cached_tree(self):
+        schema_cache.component_trees.clear()
+        self.model = "action"
+        self.schema = self.get_schema_name()
+        self.schema['update_datetime'] = "2022-01-01T00:00:00"
+        first = self._builder({"req": "first"})
+        self.assertEqual(len(schema_cache.component_trees), 1)
+        second = self._builder({"req": "second"})
+        self.assertEqual(list(first.components), list(second.components))
+        for component in second.components.values():
+            self.assertIs(component.builder, second)
+            self.assertEqual(component.security_headers, {"req": "second"})
+            self.assertNotIn(component, first.components.values())
+        second.load_data({"rec_name": "second"})
+        first.load_data({"rec_name": "first"})
+        self.assertEqual(second.get_component_by_key("rec_name").value, "second")
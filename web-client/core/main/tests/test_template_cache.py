@@ -0,0 +1,20 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import unittest
+from unittest import mock
+from fastapi.templating import Jinja2Templates
+from core.themes.ThemeConfig import ThemeConfig
+from core.themes.template_cache import init_templates
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def test_runtime_lookup_hits_warmed_cache(self):
+        env = Jinja2Templates(directory="core/themes").env
+        init_templates(env)
+        theme_cfg = ThemeConfig.new(theme='italia')
+        with mock.patch.object(env.loader, "get_source", side_effect=AssertionError("template loaded again")):
+            template = env.get_template(theme_cfg.get_template("components", "alert_msg"))
+            page = env.get_template(theme_cfg.get_page_template("base"))
+        self.assertTrue(template.render(value="ok"))
+        self.assertTrue(page)
@@ -7,11 +7,12 @@ import sys
 from datetime import datetime
 
 from fastapi import Request
-from starlette.templating import Jinja2Templates, jinja2
+from starlette.templating import Jinja2Templates
 
 from .base.base_class import BaseClass
 from .DateEngine import DateEngine
 from core.themes.ThemeConfig import ThemeConfig
+from core.themes.template_cache import get_str_template
 
 import logging
 import copy
@@ -89,7 +90,7 @@ class WidgetsBase:
 
     def render_str_template(self, tmp: str, context: dict):
         logger.info("render_str_template")
-        template = jinja2.Template(tmp)
+        template = get_str_template(tmp)
         return template.render(context)
 
     def render_ajax_reload(self, link):
@@ -12,13 +12,88 @@ from .builder_custom import *
 from . import custom_components
 from .widgets_content import PageWidget
 from .base.base_class import BaseClass, PluginBase
+import os
+import csv
+import tempfile
 from io import BytesIO
 from collections import OrderedDict
-# import xlsxwriter
+import xlsxwriter
 import pandas as pd
+from starlette.background import BackgroundTask
+from fastapi.concurrency import run_in_threadpool
 
 logger = logging.getLogger(__name__)
 
+# rows kept in memory while streaming an export to file
+stream_chunk_size = 1000
+
+
+class JsonExportWriter:
+
+    def __init__(self, path, columns):
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write("[")
+        self.first = True
+
+    def write_rows(self, rows):
+        for row in rows:
+            if not self.first:
+                self.file.write(",")
+            self.file.write(ujson.dumps(row, escape_forward_slashes=False, ensure_ascii=False))
+            self.first = False
+
+    def close(self):
+        self.file.write("]")
+        self.file.close()
+
+
+class CsvExportWriter:
+
+    def __init__(self, path, columns):
+        self.keys = list(columns.keys())
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file, lineterminator="\n")
+        self.writer.writerow(list(columns.values()))
+
+    def write_rows(self, rows):
+        self.writer.writerows([[row.get(k) for k in self.keys] for row in rows])
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxExportWriter:
+    """
+    constant_memory flushes each row to the file once the next one is started
+    """
+
+    def __init__(self, path, columns):
+        self.keys = list(columns.keys())
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet()
+        self.worksheet.write_row(0, 0, list(columns.values()))
+        self.row = 1
+
+    def cell(self, value):
+        if isinstance(value, (list, dict)):
+            return str(value)
+        return value
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.worksheet.write_row(self.row, 0, [self.cell(row.get(k)) for k in self.keys])
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+export_writers = {
+    "json": JsonExportWriter,
+    "csv": CsvExportWriter,
+    "xls": XlsxExportWriter,
+}
+
 
 class TableWidgetExport(PluginBase):
     plugins = []
@@ -87,6 +162,45 @@ class TableWidgetExportBase(TableWidgetExport, PageWidget):
     async def export_data(self):
         return await getattr(self, f"export_{self.file_type}")()
 
+    async def write_chunk(self, writer, path, chunk):
+        if not writer:
+            keys_row = chunk[0].keys() if chunk else []
+            writer = await run_in_threadpool(
+                export_writers[self.file_type], path, self.get_columns(keys_row))
+        await run_in_threadpool(writer.write_rows, chunk)
+        return writer
+
+    async def export_stream(self, rows):
+        """
+        Write the rows of the async iterator to a temporary file in chunks
+        of stream_chunk_size, the file is removed once sent.
+        """
+        logger.info(f"Export Stream {self.file_type}")
+        dt_report = datetime.now().strftime(
+            self.settings['server_datetime_mask']
+        )
+        ext = "xlsx" if self.file_type == "xls" else self.file_type
+        file_name = f"{self.model}_{dt_report}.{ext}"
+        fd, path = tempfile.mkstemp(suffix=f".{ext}")
+        os.close(fd)
+        writer = None
+        chunk = []
+        try:
+            async for row in rows:
+                chunk.append(row)
+                if len(chunk) >= stream_chunk_size:
+                    writer = await self.write_chunk(writer, path, chunk)
+                    chunk = []
+            writer = await self.write_chunk(writer, path, chunk)
+            await run_in_threadpool(writer.close)
+        except Exception:
+            os.remove(path)
+            raise
+        logger.info(f"Make Export file Done: {file_name}")
+        media_type = 'text/plain' if self.file_type == "json" else None
+        return FileResponse(
+            path, filename=file_name, media_type=media_type, background=BackgroundTask(os.remove, path))
+
     async def export_json(self):
         logger.info("Export Json")
         dt_report = datetime.now().strftime(
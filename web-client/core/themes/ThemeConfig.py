@@ -1,8 +1,47 @@
 import os
 import sys
-
+import glob
+import logging
+from types import MappingProxyType
 import ujson
+import config
 from core.main.base.base_class import PluginBase
+from core.themes.template_cache import theme_path
+
+logger = logging.getLogger(__name__)
+
+
+class ThemeRegistry:
+    """
+    Theme json configs parsed once for process and shared by all widgets as read only views.
+    With hot_reload a theme is parsed again when one of its json files changes.
+    """
+
+    def __init__(self):
+        self.themes = {}
+        self.mtimes = {}
+        self.hot_reload = False
+
+    def theme_mtimes(self, theme: str) -> dict:
+        files = glob.glob(f"{os.path.realpath('.')}/core/themes/{theme}/*.json")
+        return {name: os.path.getmtime(name) for name in files}
+
+    def get(self, theme: str, loader) -> dict:
+        if theme in self.themes and self.hot_reload and not self.mtimes[theme] == self.theme_mtimes(theme):
+            logger.info(f"theme {theme} changed, reload")
+            self.themes.pop(theme)
+        if theme not in self.themes:
+            self.mtimes[theme] = self.theme_mtimes(theme)
+            self.themes[theme] = MappingProxyType(
+                {key: MappingProxyType(val) for key, val in loader().items()})
+        return self.themes[theme]
+
+    def clear(self):
+        self.themes = {}
+        self.mtimes = {}
+
+
+theme_registry = ThemeRegistry()
 
 
 class ThemeConfig(PluginBase):
@@ -24,19 +63,29 @@ class ThemeConfigBase(ThemeConfig):
     def init(self, theme):
         self.theme = theme
         self.local_path = os.path.realpath(".")
-        self.form_component_map = self.get_form_component_map()
-        self.form_component_default_cfg = self.get_form_component_default_cfg()
-        self.custom_builder_oject = self.get_custom_builder_oject()
-        self.alert_base = self.get_alert_base()
-        self.base_template_layout = self.get_base_template_layout()
+        cfg = theme_registry.get(theme, self.load_theme)
+        self.form_component_map = cfg['form_component_map']
+        self.form_component_default_cfg = cfg['form_component_default_cfg']
+        self.custom_builder_oject = cfg['custom_builder_oject']
+        self.alert_base = cfg['alert_base']
+        self.base_template_layout = cfg['base_template_layout']
         self.make_default_path()
 
+    def load_theme(self):
+        return {
+            "form_component_map": self.get_form_component_map(),
+            "form_component_default_cfg": self.get_form_component_default_cfg(),
+            "custom_builder_oject": self.get_custom_builder_oject(),
+            "alert_base": self.get_alert_base(),
+            "base_template_layout": self.get_base_template_layout()
+        }
+
     def make_default_path(self):
         self.path_obj = {}
-        self.path_obj['template'] = f"/{self.theme}/templates/"
-        self.path_obj['components'] = f"/{self.theme}/templates/components/"
-        self.path_obj['reports'] = f"/{self.theme}/templates/reports/"
-        self.path_obj['mail'] = f"/{self.theme}/templates/mail/"
+        self.path_obj['template'] = theme_path(self.theme)
+        self.path_obj['components'] = theme_path(self.theme, "components/")
+        self.path_obj['reports'] = theme_path(self.theme, "reports/")
+        self.path_obj['mail'] = theme_path(self.theme, "mail/")
 
     def get_template(self, path_tag, name):
         tname = self.form_component_map.get(name)
@@ -134,3 +183,10 @@ class ThemeConfigBase(ThemeConfig):
 
         to_update["selector"] = selector
         return to_update.copy()
+
+
+def init_theme_registry():
+    settings = config.SettingsApp()
+    theme_registry.hot_reload = settings.theme_hot_reload
+    ThemeConfig.new(theme=settings.theme)
+    logger.info(f"theme {settings.theme} loaded, hot reload {theme_registry.hot_reload}")
@@ -0,0 +1,70 @@
+# Copyright INRIM (https://www.inrim.eu)
+# See LICENSE file for full licensing details.
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+import jinja2
+from jinja2.utils import LRUCache
+import config
+
+logger = logging.getLogger(__name__)
+
+# compiled string templates (reports, content components) by content hash
+str_env = jinja2.Environment()
+str_templates = OrderedDict()
+str_templates_size = 512
+# the templates are rendered in the threadpool too
+str_templates_lock = threading.Lock()
+
+
+def theme_path(theme: str, folder: str = "") -> str:
+    return f"/{theme}/templates/{folder}"
+
+
+def init_templates(env: jinja2.Environment):
+    """
+    Theme templates are compiled at startup with a filesystem bytecode cache,
+    auto_reload only with theme_hot_reload
+    """
+    global str_templates_size
+    settings = config.SettingsApp()
+    str_templates_size = settings.str_templates_cache_size
+    env.auto_reload = settings.theme_hot_reload
+    env.cache = LRUCache(settings.templates_cache_size)
+    cache_dir = settings.templates_bytecode_cache
+    if cache_dir:
+        if not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(tempfile.gettempdir(), cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        env.bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+    start = time.monotonic()
+    # compiled under the names the theme loads them with, the env cache is keyed by name
+    root = theme_path(settings.theme)
+    names = [f"/{name}" for name in env.list_templates(extensions=["html"]) if f"/{name}".startswith(root)]
+    for name in names:
+        try:
+            env.get_template(name)
+        except jinja2.TemplateError as e:
+            logger.warning(f"template {name} not compiled: {e}")
+    logger.info(f"{len(names)} templates compiled in {time.monotonic() - start:.2f}s")
+
+
+def get_str_template(source: str) -> jinja2.Template:
+    key = hashlib.md5(source.encode()).hexdigest()
+    with str_templates_lock:
+        template = str_templates.get(key)
+        if template is not None:
+            str_templates.move_to_end(key)
+            return template
+    # compiled out of the lock, a concurrent compile of the same source is discarded
+    template = str_env.from_string(source)
+    with str_templates_lock:
+        template = str_templates.setdefault(key, template)
+        str_templates.move_to_end(key)
+        if len(str_templates) > str_templates_size:
+            str_templates.popitem(last=False)
+    return template
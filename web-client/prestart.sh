@@ -0,0 +1,3 @@
+#! /usr/bin/env sh
+# precompressed theme static assets, see compress_static.py
+python /app/compress_static.py